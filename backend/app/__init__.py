@@ -1,5 +1,8 @@
-from flask import Flask, jsonify, request
+import hmac
+
+from flask import Flask, Response, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 from flask_migrate import Migrate
 from flask_cors import CORS
 from .config import Config
@@ -18,17 +21,78 @@ def create_app():
          allow_headers=["Content-Type", "Authorization"],
          supports_credentials=True)
 
-    # Initialize DB
+    # Initialize DB, with checkout timing on the connection pool
+    from utils.instrumentation import configure_pool
+    configure_pool(app)
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # Per-request SQL query counts and timings, request latency and stage breakdown
+    from utils.instrumentation import init_query_counter, init_request_metrics
+    init_query_counter(app)
+    init_request_metrics(app)
+
+    # Verified-token and user caches used by require_auth
+    from utils.auth import configure_auth_cache
+    configure_auth_cache(app)
+
+    # Shared LLM client (model, retries, circuit breaker)
+    from utils.llm import init_llm_client
+    init_llm_client(app)
+
+    # Chat rate limits and the cap on concurrent LLM calls
+    from utils.rate_limit import init_rate_limiting
+    init_rate_limiting(app)
+
+    # Per-user memory of recent chat turns, for follow-up questions
+    from utils.conversation import init_conversation_store
+    init_conversation_store(app)
+
+    # Background, batched persistence of chat history
+    from utils.chat_writer import init_chat_writer
+    init_chat_writer(app)
+
     # Register routes
     from routes import api_bp
     app.register_blueprint(api_bp, url_prefix="/api")
 
+    # Bring a database created by an older version up to date; there are no tracked migrations
+    from utils.db_utils import ensure_catalog_schema
+    with app.app_context():
+        try:
+            ensure_catalog_schema()
+        except SQLAlchemyError as e:
+            print(f"Could not check the catalog schema: {e}")
+
+    # CLI: `flask load-data`, `flask rebuild-rollups`
+    from .commands import register_commands
+    register_commands(app)
+
     @app.route("/health", methods=["GET"])
     def health_check():
         return jsonify({"status": "ok"}), 200
+
+    # Scrapers authenticate with the metrics token; without one these endpoints stay off
+    metrics_token = app.config.get("METRICS_TOKEN")
+
+    def scraper_authorized():
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {metrics_token}")
+
+    if metrics_token:
+        @app.route("/health/pool", methods=["GET"])
+        def pool_health():
+            from utils.instrumentation import pool_stats
+            if not scraper_authorized():
+                return jsonify({"error": "Unauthorized"}), 401
+            return jsonify(pool_stats(db.engine)), 200
+
+    if app.config.get("METRICS_ENABLED", True) and metrics_token:
+        @app.route("/metrics", methods=["GET"])
+        def metrics():
+            from utils.instrumentation import component_stats, render_metrics
+            if not scraper_authorized():
+                return jsonify({"error": "Unauthorized"}), 401
+            return Response(render_metrics(component_stats(app)), mimetype="text/plain; version=0.0.4")
     
     # Handle OPTIONS requests globally
     @app.before_request
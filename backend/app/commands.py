@@ -0,0 +1,40 @@
+import json
+import os
+
+import click
+
+
+def register_commands(app):
+    """Add the `flask load-data` and `flask rebuild-rollups` maintenance commands"""
+
+    @app.cli.command("load-data")
+    @click.option("--sync", is_flag=True, help="Apply only the differences instead of replacing the catalog.")
+    @click.option("--products", "products_csv", default=lambda: os.getenv("PRODUCTS_CSV", "datasets/products.csv"),
+                  show_default="PRODUCTS_CSV or datasets/products.csv")
+    @click.option("--offers", "offers_csv", default=lambda: os.getenv("OFFERS_CSV", "datasets/offers.csv"),
+                  show_default="OFFERS_CSV or datasets/offers.csv")
+    @click.option("--warranty", "warranty_csv",
+                  default=lambda: os.getenv("WARRANTY_CSV", "datasets/warranty_info.csv"),
+                  show_default="WARRANTY_CSV or datasets/warranty_info.csv")
+    def load_data(sync, products_csv, offers_csv, warranty_csv):
+        """Load the catalog CSVs into the database."""
+        from app import db
+        from utils.db_utils import load_csv_to_db, sync_csv_to_db
+
+        if not os.path.exists(products_csv):
+            raise click.ClickException(f"CSV file not found: {products_csv}")
+        # Create DB tables if not exist
+        db.create_all()
+        if sync:
+            result = sync_csv_to_db(products_csv, offers_csv, warranty_csv)
+        else:
+            result = load_csv_to_db(products_csv, offers_csv, warranty_csv)
+        click.echo(json.dumps(result, indent=2, default=str))
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups():
+        """Recompute the daily chat rollup behind admin analytics from the full chat history."""
+        from utils.analytics import rebuild_chat_rollups
+
+        rebuild_chat_rollups()
+        click.echo("Chat rollups rebuilt")
@@ -12,8 +12,103 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool; size it for the worker's threads. Chat requests release
+    # their connection before calling the LLM, so it only covers DB work.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
     # Gemini / LLM
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+    # "gemini", or "stub" for an offline canned reply (load tests)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+    LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", 0))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))
+    # Retries with jittered exponential backoff, then the circuit breaker opens
+    # after LLM_BREAKER_THRESHOLD failed calls for LLM_BREAKER_RESET seconds
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 4))
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+    # Approximate token budget for the prompt; lowest-ranked facts are dropped past it
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+
+    # In-memory catalog snapshot. Every process polls the shared catalog version this
+    # often (seconds) so writes made by another worker or `flask load-data` reach it;
+    # 0 turns the poll off, which is only safe with a single process
+    CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "true").lower() == "true"
+    CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS") or 5)
+
+    # Product retrieval: "keyword" (BM25), "vector" or "hybrid" (both, fused by rank).
+    # Vectors are hashed TF-IDF of VECTOR_DIM buckets unless VECTOR_MODEL names a
+    # locally installed sentence-transformers model
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+    VECTOR_DIM = int(os.getenv("VECTOR_DIM", 384))
+    VECTOR_MODEL = os.getenv("VECTOR_MODEL", "")
+
+    # Rows per chunk when streaming CSVs into the database
+    CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", 10000))
+
+    # LLM response cache (set LLM_CACHE_PATH to keep entries across restarts)
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+    # Async chat pipeline (asgi.py): per-request timeout in seconds
+    CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", 30))
+
+    # LLM admission per process: at most LLM_MAX_CONCURRENCY calls in flight and
+    # LLM_MAX_QUEUE requests waiting up to LLM_QUEUE_TIMEOUT seconds; beyond that, 429
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 100))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 50))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 10))
+
+    # Chat rate limits: token buckets per user and per client IP (sustained rate per
+    # minute, burst size). Buckets are per process unless RATE_LIMIT_STORAGE_URL
+    # points at a Redis server shared by all workers
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", 30))
+    RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", 10))
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", 120))
+    RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", 40))
+    RATE_LIMIT_STORAGE_URL = os.getenv("RATE_LIMIT_STORAGE_URL", "")
+
+    # Chat history write-behind: turns are spooled to CHAT_SPOOL_DIR and inserted in
+    # batches of CHAT_FLUSH_BATCH_SIZE or every CHAT_FLUSH_INTERVAL seconds. On unless
+    # set; gunicorn.conf.py turns it off by default when running several workers
+    CHAT_WRITE_BEHIND = (os.getenv("CHAT_WRITE_BEHIND") or "true").lower() == "true"
+    CHAT_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", 100))
+    CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", 1.0))
+    CHAT_SPOOL_DIR = os.getenv("CHAT_SPOOL_DIR", "spool")
+    CHAT_SPOOL_FSYNC = os.getenv("CHAT_SPOOL_FSYNC", "false").lower() == "true"
+
+    # Conversation memory: the last CONVERSATION_TURNS turns per user (older ones
+    # summarized), dropped after CONVERSATION_TTL seconds idle. Kept per process
+    # unless CONVERSATION_STORAGE_URL points at a Redis server shared by the workers
+    CONVERSATION_MEMORY = (os.getenv("CONVERSATION_MEMORY") or "true").lower() == "true"
+    CONVERSATION_STORAGE_URL = os.getenv("CONVERSATION_STORAGE_URL", "")
+    CONVERSATION_TURNS = int(os.getenv("CONVERSATION_TURNS", 5))
+    CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", 1800))
+    CONVERSATION_MAX_USERS = int(os.getenv("CONVERSATION_MAX_USERS", 10000))
+
+    # require_auth caches: verified tokens live until their JWT exp, users for AUTH_USER_CACHE_TTL seconds
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+    AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 1000))
+    AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 60))
+
+    # GET /metrics (Prometheus text format) and the slow request log; requests taking at
+    # least SLOW_REQUEST_SECONDS are logged with their stage timings (0 turns the log off).
+    # /metrics and /health/pool are only served with METRICS_TOKEN set, to requests
+    # sending it as a Bearer token
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 0))
 
     # Simple API key for protecting chat in dev
     AUTH_API_KEY = os.getenv("AUTH_API_KEY", "dev-api-key")
\ No newline at end of file
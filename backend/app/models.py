@@ -1,4 +1,5 @@
 from . import db
+from sqlalchemy import func, literal_column
 from datetime import datetime
 
 class User(db.Model):
@@ -26,6 +27,15 @@ class Product(db.Model):
     description = db.Column(db.Text)
     specs = db.Column(db.JSON)
     stock = db.Column(db.Integer, default=0)
+    offers = db.relationship("Offer", backref="product", lazy=True)
+    warranties = db.relationship("WarrantyInfo", backref="product", lazy=True)
+
+    # B-tree indexes for the range filters chat retrieval pushes down
+    __table_args__ = (
+        db.Index("ix_products_price", price),
+        db.Index("ix_products_stock", stock),
+        db.Index("ix_products_category", category),
+    )
 
     def to_dict(self):
         return {
@@ -46,6 +56,10 @@ class Offer(db.Model):
     coupon_code = db.Column(db.String(50), nullable=False)
     valid_till = db.Column(db.Date, nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_offers_discount_product", discount_percentage, product_id),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -61,6 +75,12 @@ class WarrantyInfo(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
     warranty_period = db.Column(db.String(50), nullable=False)
     claim_process = db.Column(db.Text)
+    # warranty_period normalized to months, for range filters
+    warranty_months = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index("ix_warranty_months_product", warranty_months, product_id),
+    )
 
     def to_dict(self):
         return {
@@ -70,6 +90,15 @@ class WarrantyInfo(db.Model):
             "claim_process": self.claim_process
         }
 
+class CatalogVersion(db.Model):
+    """Single-row counter bumped on catalog writes so workers can detect stale caches"""
+    __tablename__ = "catalog_version"
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def chat_search_vector(query, response):
+    return func.to_tsvector(literal_column("'english'"), query + literal_column("' '") + response)
+
 class ChatHistory(db.Model):
     __tablename__ = "chat_history"
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +107,15 @@ class ChatHistory(db.Model):
     response = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves the newest-first, per-user history listing and its keyset pages
+        db.Index("ix_chat_history_user_created", user_id, created_at.desc(), id.desc()),
+        # GIN expression index behind history search on PostgreSQL, maintained by
+        # the database on insert. SQLite uses an FTS5 table (utils/history_search.py).
+        db.Index("ix_chat_history_fts", chat_search_vector(query, response),
+                 postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -85,4 +123,17 @@ class ChatHistory(db.Model):
             "query": self.query,
             "response": self.response,
             "created_at": self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def search_vector(cls):
+        """Text search document of a chat, as indexed by ix_chat_history_fts"""
+        return chat_search_vector(cls.query, cls.response)
+
+class ChatDailyRollup(db.Model):
+    """Per-day chat counts by dimension (intent, brand, category, model, query, user, chats)"""
+    __tablename__ = "chat_daily_rollup"
+    day = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
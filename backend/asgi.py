@@ -0,0 +1,185 @@
+"""ASGI entry point with an asyncio chat pipeline.
+
+POST /api/chat is handled natively on the event loop: the Gemini call is
+awaited instead of blocking a worker thread, so one process can keep many
+chats in flight. Every other route is served by the regular Flask app.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000, or with several
+workers: WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+"""
+import asyncio
+import json
+import math
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from routes.chat import BUSY_ERROR, FALLBACK_REPLY, gather_facts, build_prompt, save_chat
+from utils.auth import authenticate_token
+from utils.instrumentation import observe_request, span
+from utils.lifecycle import shutdown, warm_up
+from utils.llm import get_llm_client
+from utils.rate_limit import AsyncAdmissionControl, Overloaded, get_rate_limiter
+from utils.response_cache import get_response_cache, facts_product_ids
+
+CHAT_PATHS = ("/api/chat", "/api/chat/")
+
+
+class AsyncChatApp:
+    """Route async chat requests to the event loop and the rest to Flask"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        self.timeout = flask_app.config["CHAT_TIMEOUT"]
+        # In-flight LLM calls on the event loop, with a bounded wait queue
+        self.admission = AsyncAdmissionControl(
+            max_in_flight=flask_app.config["LLM_MAX_CONCURRENCY"],
+            max_queue=flask_app.config["LLM_MAX_QUEUE"],
+            queue_timeout=flask_app.config["LLM_QUEUE_TIMEOUT"],
+        )
+        flask_app.extensions["llm_async_admission"] = self.admission
+        with flask_app.app_context():
+            self.llm = get_llm_client()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in CHAT_PATHS:
+            return await self._chat(scope, receive, send)
+        return await self.wsgi_app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Already done in the master when a preloading gunicorn runs this app
+                await asyncio.to_thread(warm_up, self.flask_app)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # In-flight chats have finished by now; persist the queued history
+                await asyncio.to_thread(shutdown, self.flask_app)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _chat(self, scope, receive, send):
+        started = time.perf_counter()
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        client_ip = scope["client"][0] if scope.get("client") else None
+        chat_task = asyncio.ensure_future(self._run_chat(headers.get("authorization", ""), body, client_ip))
+        disconnect_task = asyncio.ensure_future(self._wait_for_disconnect(receive))
+
+        done, _ = await asyncio.wait({chat_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        if chat_task not in done:
+            # Client went away: stop waiting on the LLM and drop the turn
+            chat_task.cancel()
+            return
+        disconnect_task.cancel()
+
+        status, payload = chat_task.result()
+        await self._send_json(send, status, payload)
+        observe_request("POST", "/api/chat/", status, time.perf_counter() - started)
+
+    async def _run_chat(self, auth_header, body, client_ip=None):
+        if not auth_header.startswith("Bearer "):
+            return 401, {"error": "Authorization header required"}
+        try:
+            data = json.loads(body or b"{}") or {}
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            return 400, {"error": "message is required"}
+        message = data.get("message")
+
+        user_id, error, context = await asyncio.to_thread(
+            self._prepare, auth_header.split(" ")[1], message, client_ip
+        )
+        if error:
+            return error
+        intents, structured_facts, prompt, cache_key, ai_reply = context
+
+        if ai_reply is None:
+            try:
+                # The timeout covers both waiting for an LLM slot and the call itself
+                ai_reply = await asyncio.wait_for(self._generate(prompt), self.timeout)
+                await asyncio.to_thread(self._cache_reply, cache_key, ai_reply, structured_facts)
+            except asyncio.CancelledError:
+                raise
+            except Overloaded as e:
+                return 429, {"error": BUSY_ERROR, "retry_after": e.retry_after}
+            except Exception as e:
+                ai_reply = FALLBACK_REPLY
+
+        await asyncio.to_thread(self._save, user_id, message, ai_reply)
+        return 200, {"reply": ai_reply, "facts": structured_facts}
+
+    async def _generate(self, prompt):
+        with span("admission"):
+            slot = await self.admission.acquire_async()
+        with slot, span("llm"):
+            return await self.llm.generate_async(prompt)
+
+    def _prepare(self, token, message, client_ip=None):
+        """Authenticate and assemble facts; short DB work run off the event loop"""
+        with self.flask_app.app_context():
+            with span("auth"):
+                user, error = authenticate_token(token)
+            if error:
+                return None, (401, {"error": error}), None
+            limiter = get_rate_limiter()
+            with span("rate_limit"):
+                retry_after = limiter.check(user_id=user.id, ip=client_ip) if limiter is not None else 0
+            if retry_after:
+                return None, (429, {"error": "Too many requests", "retry_after": math.ceil(retry_after)}), None
+            if not message:
+                return None, (400, {"error": "message is required"}), None
+
+            intents, structured_facts, history = gather_facts(message, user.id)
+            with span("prompt"):
+                prompt = build_prompt(message, intents, structured_facts, history)
+            with span("cache"):
+                cache = get_response_cache()
+                cache_key = cache.make_key(message, structured_facts, history)
+                ai_reply = cache.get(cache_key)
+            return user.id, None, (intents, structured_facts, prompt, cache_key, ai_reply)
+
+    def _cache_reply(self, cache_key, ai_reply, structured_facts):
+        with self.flask_app.app_context():
+            get_response_cache().set(cache_key, ai_reply, facts_product_ids(structured_facts))
+
+    def _save(self, user_id, message, ai_reply):
+        with self.flask_app.app_context(), span("save"):
+            save_chat(user_id, message, ai_reply)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    @staticmethod
+    async def _send_json(send, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ]
+        if status == 429:
+            headers.append((b"retry-after", str(payload["retry_after"]).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+app = AsyncChatApp(create_app())
@@ -0,0 +1,276 @@
+"""Load test of the HTTP API against a synthetic catalog, with the LLM stubbed.
+
+Seeds --products products (through load_csv_to_db), --users users and their
+chat history into a scratch database, starts the app in a separate process
+on a threaded WSGI server and drives each endpoint for --duration seconds
+from --concurrency client threads. The load is closed-loop: every thread
+sends its next request as soon as the previous one returns. Reports p50,
+p95 and p99 latency and throughput per endpoint, plus the server's mean
+time per chat stage, and saves them as JSON.
+
+    python benchmarks/bench_api.py [--products 100000] [--concurrency 16] [--duration 15]
+        [--llm-latency 0.5] [--database-url postgresql://.../bench] [--output results/api.json]
+
+The tables of --database-url are dropped and recreated, so point it at a
+scratch database. With --url an already running server is measured
+instead; the benchmark users are then registered through the API.
+"""
+import argparse
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from harness import configure_environment, latency_summary, print_table, write_results
+from synthetic import SEARCH_TERMS, chat_message, seed_users_and_history, write_catalog_csvs
+
+PASSWORD = "benchmark"
+
+
+def chat(rng, ctx):
+    return "POST", "/api/chat/", {"message": chat_message(rng, ctx["products"])}
+
+
+def products_list(rng, ctx):
+    pages = max(1, min(ctx["products"] // 20, 500))
+    return "GET", f"/api/products/?page={rng.randint(1, pages)}&per_page=20", None
+
+
+def product_detail(rng, ctx):
+    return "GET", f"/api/products/{rng.randint(1, ctx['products'])}", None
+
+
+def history_search(rng, ctx):
+    return "GET", f"/api/chat-history/search?q={rng.choice(SEARCH_TERMS)}", None
+
+
+def analytics_overview(rng, ctx):
+    return "GET", "/api/admin/analytics/overview", None
+
+
+def analytics_user_behavior(rng, ctx):
+    return "GET", "/api/admin/analytics/user-behavior", None
+
+
+def analytics_product_insights(rng, ctx):
+    return "GET", "/api/admin/analytics/product-insights", None
+
+
+SCENARIOS = {
+    "chat": chat,
+    "products_list": products_list,
+    "product_detail": product_detail,
+    "history_search": history_search,
+    "analytics_overview": analytics_overview,
+    "analytics_user_behavior": analytics_user_behavior,
+    "analytics_product_insights": analytics_product_insights,
+}
+
+
+def seed(args):
+    """Create the schema and load the synthetic catalog, users and history; returns seeding timings"""
+    from app import create_app, db
+    from utils import load_csv_to_db
+    from utils.analytics import rebuild_chat_rollups
+
+    paths = write_catalog_csvs(os.path.join(args.work_dir, "catalog"), args.products, seed=args.seed)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        load_csv_to_db(paths["products"], paths["offers"], paths["warranty_info"])
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        emails = seed_users_and_history(db, args.users, args.history, args.products, PASSWORD, seed=args.seed)
+        rebuild_chat_rollups()
+        history_seconds = time.perf_counter() - started
+    writer = app.extensions.get("chat_writer")
+    if writer is not None:
+        writer.stop()
+    return emails, {"load_csv_s": round(load_seconds, 3), "seed_history_s": round(history_seconds, 3)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(port):
+    """Run the app on a threaded WSGI server (the --serve mode of this script)"""
+    import logging
+    from werkzeug.serving import make_server
+    from app import create_app
+    from utils import get_product_index
+
+    app = create_app()
+    with app.app_context():
+        get_product_index()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def start_server(port):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)])
+    import requests
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("benchmark server exited during startup")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("benchmark server did not start")
+
+
+def login_all(base_url, emails, register=False):
+    import requests
+    tokens = []
+    for email in emails:
+        if register:
+            requests.post(f"{base_url}/api/auth/register",
+                          json={"name": "Bench User", "email": email, "password": PASSWORD}, timeout=30)
+        response = requests.post(f"{base_url}/api/auth/login", json={"email": email, "password": PASSWORD},
+                                 timeout=30)
+        response.raise_for_status()
+        tokens.append(response.json()["token"])
+    return tokens
+
+
+def run_scenario(base_url, scenario, tokens, ctx, concurrency, duration, warmup, seed):
+    """Drive one scenario from `concurrency` threads; returns its latency summary"""
+    import requests
+
+    samples, statuses = [], Counter()
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {tokens[index % len(tokens)]}"
+        local_samples, local_statuses = [], Counter()
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            method, path, body = scenario(rng, ctx)
+            try:
+                status = session.request(method, base_url + path, json=body, timeout=120).status_code
+            except requests.RequestException:
+                status = "connection_error"
+            if started >= measure_from:
+                local_samples.append(time.perf_counter() - started)
+                local_statuses[status] += 1
+        with lock:
+            samples.extend(local_samples)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    errors = sum(count for status, count in statuses.items() if status == "connection_error" or status >= 400)
+    summary = latency_summary(samples, elapsed=duration, errors=errors)
+    summary["statuses"] = {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    return summary
+
+
+_STAGE_RE = re.compile(r'^chat_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.M)
+
+
+def stage_means(base_url):
+    """Mean milliseconds per chat stage, from the server's /metrics (authenticated with METRICS_TOKEN)"""
+    import requests
+    headers = {"Authorization": f"Bearer {os.environ.get('METRICS_TOKEN', '')}"}
+    try:
+        response = requests.get(f"{base_url}/metrics", headers=headers, timeout=10)
+        response.raise_for_status()
+        text = response.text
+    except requests.RequestException:
+        return {}
+    totals = {}
+    for kind, stage, value in _STAGE_RE.findall(text):
+        totals.setdefault(stage, {})[kind] = float(value)
+    return {stage: round(t["sum"] / t["count"] * 1000, 3) for stage, t in sorted(totals.items()) if t.get("count")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history", type=int, default=40, help="seeded chats per user")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the stub LLM takes per reply")
+    parser.add_argument("--database-url", help="scratch database (default: a temporary SQLite file)")
+    parser.add_argument("--url", help="measure this running server instead of starting one")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of scenarios")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the chat rate limits on")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".work"))
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "results", "api.json"))
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = None
+    seeding = {}
+    if args.url:
+        base_url = args.url.rstrip("/")
+        emails = [f"bench{i}@example.com" for i in range(args.users)]
+        tokens = login_all(base_url, emails, register=True)
+    else:
+        configure_environment(args.database_url, args.llm_latency, args.rate_limit)
+        emails, seeding = seed(args)
+        print(f"Seeded {args.products} products and {args.users * args.history} chats: {seeding}")
+        port = free_port()
+        server = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+        tokens = login_all(base_url, emails)
+
+    ctx = {"products": args.products}
+    results = {}
+    try:
+        for name in scenarios:
+            print(f"Running {name} ...", flush=True)
+            results[name] = run_scenario(base_url, SCENARIOS[name], tokens, ctx, args.concurrency,
+                                         args.duration, args.warmup, args.seed)
+        if "chat" in results:
+            results["chat"]["stage_mean_ms"] = stage_means(base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_table(results)
+    if seeding:
+        results["seed"] = seeding
+    params = {key: value for key, value in vars(args).items() if key not in ("serve", "work_dir", "output")}
+    write_results(args.output, "api", params, results)
+
+
+if __name__ == "__main__":
+    main()
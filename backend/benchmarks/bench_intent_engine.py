@@ -0,0 +1,125 @@
+"""Micro-benchmark for intent and entity detection.
+
+Compares the compiled single-pass engine with the per-vocabulary substring
+scans it replaced and prints messages/sec for each. The engine also parses
+the constraints of a message (prices, stock, warranty, discounts), which the
+legacy scans never did, so the legacy scans are also timed followed by
+parse_constraints on every message, which gives the same output.
+
+    python benchmarks/bench_intent_engine.py [--messages 50000] [--output results/intent_engine.json]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from harness import write_results
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constraints import parse_constraints  # noqa: E402
+from utils.intent_engine import (  # noqa: E402
+    BRANDS, CATEGORIES, INTENT_VOCABULARY, intent_engine
+)
+
+TEMPLATES = [
+    "Tell me about the {brand} {category}",
+    "Is there any discount on {brand} {category} model {n}?",
+    "What is the warranty on product id {n}",
+    "Compare {brand} vs {brand} {category}, which is better?",
+    "Show me cheap {category} in stock under {n}00",
+    "How do I claim a 2 year warranty for my {brand}?",
+    "Hi there, what can you do?",
+]
+
+# The literal warranty spellings the chat route used to look for
+LEGACY_WARRANTY_PERIODS = {
+    '2 year': ['2 year', '2-year'],
+    '1 year': ['1 year', '1-year'],
+    '6 month': ['6 month', '6-month'],
+}
+
+
+def legacy_analyze(message):
+    """The substring scans previously repeated per chat by the chat route and the analytics rollup"""
+    msg_lower = message.lower()
+    # routes/chat.py detect_intent_and_context
+    intents = []
+    product_id = None
+    if 'product id' in msg_lower or 'product-id' in msg_lower:
+        intents.append('product_id_lookup')
+        id_match = re.search(r'product.?id.?(\d+)', msg_lower)
+        if id_match:
+            product_id = int(id_match.group(1))
+    intents.extend(intent for intent, words in INTENT_VOCABULARY.items() if any(w in msg_lower for w in words))
+    if not intents and any(w in msg_lower for w in BRANDS + CATEGORIES + ['model']):
+        intents.append('product_search')
+    is_specific_model = 'model' in msg_lower and any(ch.isdigit() for ch in message)
+    has_brand = any(b in msg_lower for b in BRANDS)
+    has_category = any(c in msg_lower for c in CATEGORIES)
+    # routes/chat.py requested_warranty_period
+    period = next((p for p, spellings in LEGACY_WARRANTY_PERIODS.items() if any(s in msg_lower for s in spellings)), None)
+    # utils/analytics.py classify_query and chat_dimensions
+    if any(w in msg_lower for w in ['find', 'search', 'looking', 'tell me about']):
+        primary = 'product_search'
+    elif any(w in msg_lower for w in ['warranty', 'claim']):
+        primary = 'warranty'
+    elif any(w in msg_lower for w in ['offer', 'discount', 'coupon']):
+        primary = 'offer'
+    else:
+        primary = 'general'
+    brands = [b for b in BRANDS if b in msg_lower]
+    categories = [c for c in CATEGORIES if c in msg_lower]
+    models = []
+    if 'model' in msg_lower:
+        words = msg_lower.split()
+        models = [f"model {words[i + 1]}" for i, w in enumerate(words[:-1]) if w == 'model']
+    return (intents, product_id, is_specific_model, has_brand, has_category, period,
+            primary, brands, categories, models)
+
+
+def legacy_analyze_with_constraints(message):
+    """The legacy scans plus the constraint parsing the engine does"""
+    return legacy_analyze(message), parse_constraints(message)
+
+
+def make_messages(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(
+            brand=rng.choice(BRANDS).title(), category=rng.choice(CATEGORIES), n=rng.randint(1, 99)
+        )
+        for _ in range(count)
+    ]
+
+
+def measure(func, messages):
+    started = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - started
+    return len(messages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "results", "intent_engine.json"))
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    results = {}
+    for name, func in (("legacy_scans", legacy_analyze),
+                       ("legacy_scans_with_constraints", legacy_analyze_with_constraints),
+                       ("compiled_engine", intent_engine.analyze)):
+        func(messages[0])
+        results[name] = {"messages_per_sec": round(measure(func, messages))}
+        print(f"{name:32s} {results[name]['messages_per_sec']:>12,} messages/sec")
+    write_results(args.output, "intent_engine", {"messages": args.messages}, results)
+
+
+if __name__ == "__main__":
+    main()
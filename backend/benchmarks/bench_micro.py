@@ -0,0 +1,102 @@
+"""Micro-benchmarks of the chat hot path and the CSV loader on a synthetic catalog.
+
+Times, per call, intent detection (detect_intent_and_context), product
+retrieval (search_product_ids, the successor of build_product_query) and
+full fact gathering from the catalog snapshot and from the database, plus
+prompt building; and load_csv_to_db's throughput for the whole catalog.
+Results are saved as JSON for benchmarks/compare.py.
+
+    python benchmarks/bench_micro.py [--products 100000] [--calls 2000] [--output results/micro.json]
+"""
+import argparse
+import os
+import random
+import time
+
+from harness import configure_environment, percentile, write_results
+from synthetic import chat_message, write_catalog_csvs
+
+
+def time_calls(func, inputs):
+    """ops/sec and p50/p95/p99 microseconds of func over the inputs"""
+    durations = []
+    started = time.perf_counter()
+    for value in inputs:
+        call_started = time.perf_counter()
+        func(value)
+        durations.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    durations.sort()
+    return {
+        "calls": len(inputs),
+        "ops_per_sec": round(len(inputs) / elapsed, 1),
+        "p50_us": round(percentile(durations, 0.50) * 1e6, 1),
+        "p95_us": round(percentile(durations, 0.95) * 1e6, 1),
+        "p99_us": round(percentile(durations, 0.99) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=2000, help="messages per micro-benchmark")
+    parser.add_argument("--database-url", help="scratch database (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".work"))
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "results", "micro.json"))
+    args = parser.parse_args()
+
+    configure_environment(args.database_url, CHAT_WRITE_BEHIND="false")
+    from app import create_app, db
+    from utils import load_csv_to_db
+    from utils.intent_engine import _analyze_cached
+    from utils.catalog import get_catalog
+    from routes.chat import (build_prompt, detect_intent_and_context, extract_keywords, filtered_product_ids,
+                             gather_facts, search_product_ids)
+
+    paths = write_catalog_csvs(os.path.join(args.work_dir, "catalog"), args.products, seed=args.seed)
+    rng = random.Random(args.seed)
+    messages = [chat_message(rng, args.products) for _ in range(args.calls)]
+    results = {}
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        load_csv_to_db(paths["products"], paths["offers"], paths["warranty_info"])
+        elapsed = time.perf_counter() - started
+        results["load_csv_to_db"] = {"seconds": round(elapsed, 3),
+                                     "products_per_sec": round(args.products / elapsed, 1)}
+
+    with app.test_request_context():
+        # Warm the catalog snapshot and the search indexes
+        gather_facts(messages[0])
+
+        _analyze_cached.cache_clear()
+        results["detect_intent_and_context"] = time_calls(detect_intent_and_context, messages)
+
+        def retrieve(message):
+            intents, context = detect_intent_and_context(message)
+            constraints = context["constraints"]
+            allowed = filtered_product_ids(constraints, get_catalog())
+            return search_product_ids(extract_keywords(constraints.text), context, allowed)
+        results["search_product_ids"] = time_calls(retrieve, messages)
+
+        results["gather_facts_catalog"] = time_calls(gather_facts, messages)
+        facts = [(m, *gather_facts(m)) for m in messages]
+        results["build_prompt"] = time_calls(lambda item: build_prompt(*item), facts)
+
+        app.config["CATALOG_CACHE_ENABLED"] = False
+        results["gather_facts_db"] = time_calls(gather_facts, messages)
+        app.config["CATALOG_CACHE_ENABLED"] = True
+
+    for name, result in results.items():
+        print(f"{name:28s} " + "  ".join(f"{key}={value}" for key, value in result.items()))
+    write_results(args.output, "micro", {k: v for k, v in vars(args).items() if k not in ("work_dir", "output")},
+                  results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare two benchmark result files and flag regressions.
+
+Metrics ending in _ms, _us or _s are better lower; ones ending in _per_sec
+or _rps are better higher. Anything else (request counts, status codes)
+is shown for context only. Exits 1 when any metric got worse by more than
+--threshold percent, so it can gate a CI job.
+
+    python benchmarks/compare.py results/baseline.json results/api.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_ms", "_us", "_s")
+HIGHER_IS_BETTER = ("_per_sec", "_rps")
+
+
+def flatten(results, prefix=""):
+    """{"chat": {"p95_ms": 1}} -> {"chat.p95_ms": 1}, keeping numbers only"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(metric):
+    """-1 when lower is better, 1 when higher is better, 0 when neither"""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline, current, threshold):
+    """Rows of (metric, baseline, current, change %, regressed) for metrics in both runs"""
+    base, cur = flatten(baseline["results"]), flatten(current["results"])
+    rows = []
+    for metric in sorted(base.keys() & cur.keys()):
+        before, after = base[metric], cur[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        sign = direction(metric)
+        regressed = sign != 0 and -sign * change > threshold
+        rows.append((metric, before, after, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        parser.error(f"cannot compare a {baseline.get('benchmark')} run with a {current.get('benchmark')} run")
+    if baseline.get("params") != current.get("params"):
+        print("warning: the runs used different parameters")
+
+    print(f"baseline {baseline.get('revision')} ({baseline.get('created_at')}), "
+          f"current {current.get('revision')} ({current.get('created_at')})")
+    rows = compare(baseline, current, args.threshold)
+    for metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{metric:48s} {before:>12} {after:>12} {change:>+8.1f}%{flag}")
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
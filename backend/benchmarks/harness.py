@@ -0,0 +1,95 @@
+"""Shared helpers for the benchmarks: app setup, latency statistics and JSON results."""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def configure_environment(database_url=None, llm_latency=0.0, rate_limit=False, **overrides):
+    """Point the app at the benchmark database and the stub LLM; call before create_app().
+
+    Without a database URL a fresh SQLite file in a temporary directory is
+    used. Returns the database URL.
+    """
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    settings = {
+        "DATABASE_URL": database_url,
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": str(llm_latency),
+        "RATE_LIMIT_ENABLED": "true" if rate_limit else "false",
+        "CHAT_SPOOL_DIR": tempfile.mkdtemp(prefix="bench-spool-"),
+        "SLOW_REQUEST_SECONDS": "0",
+        "SECRET_KEY": "benchmark-signing-key-not-for-production",
+        "METRICS_TOKEN": "benchmark-metrics-token",
+    }
+    settings.update({key: str(value) for key, value in overrides.items()})
+    os.environ.update(settings)
+    return database_url
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(seconds, elapsed=None, errors=0):
+    """p50/p95/p99/mean/max in milliseconds, plus throughput when the wall time is given"""
+    values = sorted(seconds)
+    summary = {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path, benchmark, params, results):
+    """Save results as JSON with the revision and machine they came from"""
+    payload = {
+        "benchmark": benchmark,
+        "revision": _git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "params": params,
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+
+def print_table(results):
+    columns = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+    print(f"{'':32s}" + "".join(f"{c:>15s}" for c in columns))
+    for name, summary in results.items():
+        print(f"{name:32s}" + "".join(f"{summary.get(c, ''):>15}" for c in columns))
@@ -0,0 +1,134 @@
+"""Synthetic catalog, users and chat history for the benchmarks.
+
+Products, offers and warranties are written as CSVs with the same columns
+and value shapes as datasets/*.csv, so they go through the real loader.
+Everything is derived from a seed, so a run is reproducible.
+
+    python benchmarks/synthetic.py OUT_DIR [--products 100000]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+
+BRANDS = ["Apple", "Samsung", "Sony", "Bose", "Dell", "HP", "Lenovo", "Asus", "Xiaomi", "OnePlus",
+          "LG", "Acer", "JBL", "Google", "Microsoft"]
+CATEGORIES = ["Smartphone", "Laptop", "Headphones", "Smartwatch", "Tablet", "Television", "Camera", "Speaker"]
+COLORS = ["Black", "White", "Silver", "Red", "Blue", "Gray"]
+WARRANTY_PERIODS = ["6 Months", "1 Year", "2 Years", "3 Years"]
+
+CHAT_TEMPLATES = [
+    "Tell me about {brand} {category}",
+    "Any offers on {brand} {category}?",
+    "What is the warranty on product id {n}",
+    "Compare {brand} vs {other} {category}",
+    "Show me {category} under {price} in stock",
+    "Cheapest {category} with at least 2 years warranty",
+    "Is the {brand} {category} model {n} available?",
+    "what about its warranty?",
+    "Hi, what can you do?",
+]
+
+SEARCH_TERMS = ["warranty", "offer", "laptop", "headphones", "apple", "cheapest", "stock", "samsung"]
+
+
+def chat_message(rng, product_count):
+    brand, other = rng.sample(BRANDS, 2)
+    return rng.choice(CHAT_TEMPLATES).format(
+        brand=brand, other=other, category=rng.choice(CATEGORIES).lower(),
+        n=rng.randint(1, product_count), price=rng.choice([200, 500, 800, 1000, 1500]),
+    )
+
+
+def write_catalog_csvs(directory, products=100000, offer_ratio=0.35, seed=42):
+    """Write products.csv, offers.csv and warranty_info.csv; returns their paths"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f"{name}.csv") for name in ("products", "offers", "warranty_info")}
+
+    with open(paths["products"], "w", newline="", encoding="utf-8") as products_file, \
+            open(paths["warranty_info"], "w", newline="", encoding="utf-8") as warranty_file, \
+            open(paths["offers"], "w", newline="", encoding="utf-8") as offers_file:
+        product_writer = csv.writer(products_file)
+        warranty_writer = csv.writer(warranty_file)
+        offer_writer = csv.writer(offers_file)
+        product_writer.writerow(["id", "name", "category", "price", "description", "specs", "stock"])
+        warranty_writer.writerow(["id", "product_id", "warranty_period", "claim_process"])
+        offer_writer.writerow(["id", "product_id", "discount_percentage", "coupon_code", "valid_till"])
+
+        offer_id = 0
+        for product_id in range(1, products + 1):
+            brand, category = rng.choice(BRANDS), rng.choice(CATEGORIES)
+            name = f"{brand} {category} Model {product_id}"
+            warranty = rng.choice(WARRANTY_PERIODS)
+            specs = {"brand": brand, "category": category, "model": f"Model-{product_id}",
+                     "color": rng.choice(COLORS), "warranty_period": warranty}
+            product_writer.writerow([
+                product_id, name, category, round(rng.uniform(50, 2500), 2),
+                f"{name} is a high-quality {category.lower()} with excellent performance and reliability.",
+                json.dumps(specs), rng.randint(0, 50),
+            ])
+            warranty_writer.writerow([
+                product_id, product_id, warranty,
+                f"To claim warranty for {name}, contact our support team with your purchase receipt.",
+            ])
+            if rng.random() < offer_ratio:
+                offer_id += 1
+                discount = rng.choice([5, 10, 15, 20, 25, 30])
+                offer_writer.writerow([
+                    offer_id, product_id, discount, f"{brand[:3].upper()}{discount}OFF",
+                    (date(2025, 8, 1) + timedelta(days=rng.randint(0, 180))).isoformat(),
+                ])
+    return paths
+
+
+def seed_users_and_history(db, users=50, chats_per_user=40, product_count=100000, password="benchmark", seed=42):
+    """Insert benchmark users and their chat history spread over the last 30 days.
+
+    Must run inside an app context. Returns the users' emails; they all
+    share `password`.
+    """
+    import bcrypt
+    from app.models import ChatHistory, User
+
+    rng = random.Random(seed)
+    # One hash for everyone: bcrypt is deliberately slow
+    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+    emails = [f"bench{i}@example.com" for i in range(users)]
+    db.session.execute(User.__table__.insert(), [
+        {"name": f"Bench User {i}", "email": email, "password_hash": password_hash, "created_at": datetime.utcnow()}
+        for i, email in enumerate(emails)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.email.in_(emails))]
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "query": chat_message(rng, product_count),
+            "response": "[benchmark reply]",
+            "created_at": now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+        }
+        for user_id in user_ids
+        for _ in range(chats_per_user)
+    ]
+    for start in range(0, len(rows), 5000):
+        db.session.execute(ChatHistory.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+    return emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for name, path in write_catalog_csvs(args.out_dir, args.products, seed=args.seed).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Gunicorn settings for production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+The app is imported and warmed up (catalog snapshot, search indexes, intent
+matcher) once in the master, then forked, so workers share those structures
+copy-on-write and serve their first chat at full speed. On SIGTERM workers
+stop accepting connections, let in-flight chats finish for up to the chat
+timeout plus a margin, then flush queued chat history before exiting.
+Load the catalog beforehand with `flask load-data`.
+"""
+import gc
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _available_cores():
+    try:
+        # Honours CPU pinning in containers, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Empty values (as in .env.example) count as unset
+bind = os.getenv("BIND") or f"0.0.0.0:{os.getenv('PORT') or '5000'}"
+# Chat workers mostly wait on the LLM, so run more workers than cores and threads in each
+workers = int(os.getenv("WEB_CONCURRENCY") or 0) or 2 * _available_cores() + 1
+worker_class = os.getenv("WORKER_CLASS") or "gthread"
+threads = int(os.getenv("WEB_THREADS") or 8)
+preload_app = True
+
+# Queued chat turns are only visible to the worker that queued them, so with several
+# workers a history read served by another one would miss a user's latest turns.
+# Write chats synchronously unless write-behind is asked for explicitly.
+if workers > 1 and not os.getenv("CHAT_WRITE_BEHIND"):
+    os.environ["CHAT_WRITE_BEHIND"] = "false"
+# Likewise a follow-up ("what about its warranty?") served by another worker than
+# the earlier turns could not resolve them, unless conversations are kept in Redis
+if workers > 1 and not os.getenv("CONVERSATION_MEMORY") and not os.getenv("CONVERSATION_STORAGE_URL"):
+    os.environ["CONVERSATION_MEMORY"] = "false"
+# A catalog write only resets the snapshot of the worker that made it; the others
+# pick it up from the shared version row, so never let them skip polling it
+if workers > 1 and not float(os.getenv("CATALOG_VERSION_CHECK_SECONDS") or 0):
+    os.environ["CATALOG_VERSION_CHECK_SECONDS"] = "5"
+
+_chat_timeout = float(os.getenv("CHAT_TIMEOUT") or 30)
+# A worker busy on one request this long is considered stuck and restarted
+timeout = int(os.getenv("WORKER_TIMEOUT") or _chat_timeout + 30)
+# Time given to in-flight chats to complete on shutdown or reload
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT") or _chat_timeout + 5)
+keepalive = 5
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+
+
+def _flask_app(server):
+    # The preloaded callable: the Flask app, or AsyncChatApp wrapping it for asgi:app
+    app = server.app.wsgi()
+    return getattr(app, "flask_app", app)
+
+
+def when_ready(server):
+    from utils.lifecycle import warm_up
+    warm_up(_flask_app(server))
+
+
+def pre_fork(server, worker):
+    # Keep the collector from touching (and so copying) every object built during warm-up
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from utils.lifecycle import after_fork
+    after_fork(_flask_app(server))
+
+
+def worker_exit(server, worker):
+    from utils.lifecycle import shutdown
+    shutdown(_flask_app(server))
@@ -1,74 +1,81 @@
 from flask import Blueprint, jsonify
 from app import db
-from app.models import ChatHistory, User, Product
-from sqlalchemy import func, desc, text
+from app.models import ChatDailyRollup, User, Product
+from sqlalchemy import func, desc, case
 from datetime import datetime, timedelta
+from utils.analytics import ROLLUP_INTENTS
+from utils.catalog import get_catalog
+from utils.search_index import get_vocabulary
 
 admin_bp = Blueprint('admin_bp', __name__)
 
+# All endpoints read the chat_daily_rollup table, which is updated as each chat
+# is saved, so their cost depends on the number of days and distinct values
+# rather than on the size of the chat history. Rebuild it from the history with
+# `flask rebuild-rollups`.
+
+
+def rollup_totals(dimension, since=None):
+    """Sum rollup counts per value of a dimension, optionally from a given day"""
+    query = db.session.query(ChatDailyRollup.value, func.sum(ChatDailyRollup.count))\
+        .filter(ChatDailyRollup.dimension == dimension)
+    if since is not None:
+        query = query.filter(ChatDailyRollup.day >= since)
+    return {value: int(total) for value, total in query.group_by(ChatDailyRollup.value).all()}
+
+
+def per_user_totals():
+    """Subquery of all-time chat counts per user id"""
+    return db.session.query(
+        ChatDailyRollup.value.label('user_id'),
+        func.sum(ChatDailyRollup.count).label('chat_count')
+    ).filter(ChatDailyRollup.dimension == 'user')\
+     .group_by(ChatDailyRollup.value).subquery()
+
 
 @admin_bp.route('/analytics/overview', methods=['GET'])
 def get_system_analytics():
     """Get system-wide analytics for admin dashboard"""
     
+    today = datetime.utcnow().date()
+    month_ago = today - timedelta(days=30)
+    
     # Basic counts
     total_users = User.query.count()
-    total_chats = ChatHistory.query.count()
-    total_products = Product.query.count()
+    total_chats = rollup_totals('chats').get('', 0)
+    catalog = get_catalog()
+    total_products = len(catalog.products) if catalog is not None else Product.query.count()
     
     # Recent activity (last 30 days)
-    month_ago = datetime.utcnow() - timedelta(days=30)
-    recent_chats = ChatHistory.query.filter(ChatHistory.created_at >= month_ago).count()
-    new_users = User.query.filter(User.created_at >= month_ago).count()
+    recent_chats = rollup_totals('chats', since=month_ago).get('', 0)
+    new_users = User.query.filter(User.created_at >= datetime.utcnow() - timedelta(days=30)).count()
     
     # Most active users
-    active_users = db.session.query(
-        User.name, 
-        func.count(ChatHistory.id).label('chat_count')
-    ).join(ChatHistory).group_by(User.id, User.name)\
-     .order_by(desc('chat_count')).limit(10).all()
-    
-    # Popular queries (basic analysis)
-    recent_queries = ChatHistory.query.filter(
-        ChatHistory.created_at >= month_ago
-    ).all()
-    
-    intent_analysis = {'product_search': 0, 'warranty': 0, 'offer': 0, 'general': 0}
-    brand_mentions = {'apple': 0, 'samsung': 0, 'bose': 0, 'hp': 0, 'lenovo': 0}
-    
-    for chat in recent_queries:
-        query_lower = chat.query.lower()
-        
-        # Intent analysis
-        if any(word in query_lower for word in ['find', 'search', 'looking', 'tell me about']):
-            intent_analysis['product_search'] += 1
-        elif any(word in query_lower for word in ['warranty', 'claim']):
-            intent_analysis['warranty'] += 1
-        elif any(word in query_lower for word in ['offer', 'discount', 'coupon']):
-            intent_analysis['offer'] += 1
-        else:
-            intent_analysis['general'] += 1
-        
-        # Brand analysis
-        for brand in brand_mentions.keys():
-            if brand in query_lower:
-                brand_mentions[brand] += 1
-    
-
+    per_user = per_user_totals()
+    active_users = db.session.query(User.name, per_user.c.chat_count)\
+        .join(per_user, per_user.c.user_id == func.cast(User.id, db.String))\
+        .order_by(desc(per_user.c.chat_count)).limit(10).all()
+    
+    # Intent and brand analysis over the last 30 days
+    intents = rollup_totals('intent', since=month_ago)
+    intent_analysis = {intent: intents.get(intent, 0) for intent in ROLLUP_INTENTS}
+    brands = rollup_totals('brand', since=month_ago)
+    # Every brand in the catalog, plus mentioned brands that have since been removed
+    brand_mentions = {brand: brands.get(brand, 0) for brand in get_vocabulary().labels('brand')}
+    brand_mentions.update(brands)
+    
+    # Daily activity for the last 7 days in one grouped query
+    week_start = today - timedelta(days=6)
+    daily_counts = dict(
+        db.session.query(ChatDailyRollup.day, ChatDailyRollup.count)
+        .filter(ChatDailyRollup.dimension == 'chats', ChatDailyRollup.day >= week_start).all()
+    )
     daily_chats = []
     for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        count = ChatHistory.query.filter(
-            ChatHistory.created_at >= day_start,
-            ChatHistory.created_at < day_end
-        ).count()
-        
+        day = today - timedelta(days=i)
         daily_chats.append({
-            'date': day_start.strftime('%Y-%m-%d'),
-            'count': count
+            'date': day.strftime('%Y-%m-%d'),
+            'count': daily_counts.get(day, 0)
         })
     
     return jsonify({
@@ -79,7 +86,7 @@ def get_system_analytics():
             'recent_chats': recent_chats,
             'new_users': new_users
         },
-        'active_users': [{'name': name, 'chat_count': count} for name, count in active_users],
+        'active_users': [{'name': name, 'chat_count': int(count)} for name, count in active_users],
         'intent_analysis': intent_analysis,
         'brand_mentions': brand_mentions,
         'daily_activity': daily_chats
@@ -89,74 +96,52 @@ def get_system_analytics():
 def get_user_behavior():
     """Analyze user behavior patterns"""
     
-    # Average session length (chats per user)
-    user_chat_counts = db.session.query(
-        func.count(ChatHistory.id).label('chat_count')
-    ).join(User).group_by(User.id).all()
-    
-    avg_chats_per_user = sum([count[0] for count in user_chat_counts]) / len(user_chat_counts) if user_chat_counts else 0
+    # Average session length (chats per user) and engagement levels in one aggregate
+    per_user = per_user_totals()
+    avg_chats_per_user, high, medium, low = db.session.query(
+        func.avg(per_user.c.chat_count),
+        func.sum(case((per_user.c.chat_count > 10, 1), else_=0)),  # >10 chats
+        func.sum(case((per_user.c.chat_count.between(3, 10), 1), else_=0)),  # 3-10 chats
+        func.sum(case((per_user.c.chat_count < 3, 1), else_=0))  # 1-2 chats
+    ).one()
     
     # Most common query patterns
-    common_queries = db.session.query(
-        ChatHistory.query,
-        func.count(ChatHistory.id).label('frequency')
-    ).group_by(ChatHistory.query)\
-     .having(func.count(ChatHistory.id) > 1)\
-     .order_by(desc('frequency')).limit(20).all()
-    
-    # User engagement levels
-    engagement_levels = {
-        'high': 0,  # >10 chats
-        'medium': 0,  # 3-10 chats
-        'low': 0   # 1-2 chats
-    }
-    
-    for count in user_chat_counts:
-        if count[0] > 10:
-            engagement_levels['high'] += 1
-        elif count[0] >= 3:
-            engagement_levels['medium'] += 1
-        else:
-            engagement_levels['low'] += 1
+    query_total = func.sum(ChatDailyRollup.count)
+    common_queries = db.session.query(ChatDailyRollup.value, query_total.label('frequency'))\
+        .filter(ChatDailyRollup.dimension == 'query')\
+        .group_by(ChatDailyRollup.value)\
+        .having(query_total > 1)\
+        .order_by(desc('frequency')).limit(20).all()
     
     return jsonify({
-        'avg_chats_per_user': round(avg_chats_per_user, 2),
-        'common_queries': [{'query': q, 'frequency': f} for q, f in common_queries],
-        'engagement_levels': engagement_levels
+        'avg_chats_per_user': round(float(avg_chats_per_user or 0), 2),
+        'common_queries': [{'query': q, 'frequency': int(f)} for q, f in common_queries],
+        'engagement_levels': {
+            'high': int(high or 0),
+            'medium': int(medium or 0),
+            'low': int(low or 0)
+        }
     })
 
 @admin_bp.route('/analytics/product-insights', methods=['GET'])
 def get_product_insights():
     """Get insights about product queries and interests"""
     
-    # Most queried products/brands
-    recent_chats = ChatHistory.query.filter(
-        ChatHistory.created_at >= datetime.utcnow() - timedelta(days=30)
-    ).all()
+    month_ago = datetime.utcnow().date() - timedelta(days=30)
     
-    product_mentions = {}
-    category_mentions = {'laptop': 0, 'smartphone': 0, 'headphones': 0, 'smartwatch': 0}
+    # Most queried product models
+    model_total = func.sum(ChatDailyRollup.count)
+    top_products = db.session.query(ChatDailyRollup.value, model_total.label('mentions'))\
+        .filter(ChatDailyRollup.dimension == 'model', ChatDailyRollup.day >= month_ago)\
+        .group_by(ChatDailyRollup.value)\
+        .order_by(desc('mentions')).limit(10).all()
     
-    for chat in recent_chats:
-        query_lower = chat.query.lower()
-        
-        # Extract product model mentions
-        if 'model' in query_lower:
-            words = query_lower.split()
-            for i, word in enumerate(words):
-                if word == 'model' and i + 1 < len(words):
-                    model = f"model {words[i+1]}"
-                    product_mentions[model] = product_mentions.get(model, 0) + 1
-        
-        # Category analysis
-        for category in category_mentions.keys():
-            if category in query_lower:
-                category_mentions[category] += 1
-    
-    # Sort product mentions
-    top_products = sorted(product_mentions.items(), key=lambda x: x[1], reverse=True)[:10]
+    # Category analysis
+    categories = rollup_totals('category', since=month_ago)
+    category_mentions = {category: categories.get(category, 0) for category in get_vocabulary().labels('category')}
+    category_mentions.update(categories)
     
     return jsonify({
-        'top_product_models': [{'model': model, 'mentions': count} for model, count in top_products],
+        'top_product_models': [{'model': model, 'mentions': int(count)} for model, count in top_products],
         'category_interest': category_mentions
-    })
\ No newline at end of file
+    })
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import User
+from utils.auth import require_auth, auth_cache_stats
 
 auth_bp = Blueprint('auth_bp', __name__)
 
@@ -45,4 +46,10 @@ def login():
         'exp': datetime.utcnow() + timedelta(hours=24)
     }, current_app.config['SECRET_KEY'], algorithm='HS256')
     
-    return jsonify({'token': token, 'user': user.to_dict()}), 200
\ No newline at end of file
+    return jsonify({'token': token, 'user': user.to_dict()}), 200
+
+@auth_bp.route('/cache-stats', methods=['GET'])
+@require_auth
+def cache_stats():
+    """Hit rates of the token and user caches behind require_auth"""
+    return jsonify(auth_cache_stats()), 200
@@ -1,14 +1,37 @@
 import os
-import google.generativeai as genai
-from flask import Blueprint, request, jsonify, current_app
+import json
+import heapq
+import time
+from itertools import islice
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from app import db
 from app.models import ChatHistory, Product, Offer, WarrantyInfo
-from sqlalchemy import or_, and_
+from sqlalchemy import case, false, select
 
 from utils import require_auth
+from utils.search_index import get_product_index
+from utils.vector_index import reciprocal_rank_fusion
+from utils.response_cache import get_response_cache, facts_product_ids
+from utils.facts import product_fact_options, related_facts
+from utils.instrumentation import observe_fact_queries, query_count, record_stage, span
+from utils.catalog import get_catalog
+from utils.analytics import record_chat_rollup
+from utils.chat_writer import get_chat_writer
+from utils.intent_engine import analyze_message
+from utils.constraints import constraint_filters
+from utils.llm import get_llm_client
+from utils.prompt import build_prompt as compact_prompt
+from utils.conversation import get_conversation_store, referenced_product_ids
+from utils.rate_limit import Overloaded, get_llm_admission, get_rate_limiter, rate_limited, too_many_requests
 
 chat_bp = Blueprint("chat_bp", __name__)
 
+FALLBACK_REPLY = "Sorry, I couldn't contact the AI service right now."
+BUSY_ERROR = "The assistant is busy, please retry shortly"
+
+# Intents answered from a product search
+RETRIEVAL_INTENTS = {'product_search', 'general', 'pricing', 'availability', 'comparison'}
+
 def extract_keywords(message, exclude_words=None):
     """Extract meaningful keywords from message"""
     if exclude_words is None:
@@ -19,99 +42,155 @@ def extract_keywords(message, exclude_words=None):
 
 def detect_intent_and_context(message):
     """Advanced intent detection with context"""
-    msg_lower = message.lower()
-    
-    # Multi-intent detection
-    intents = []
-    context = {}
-    
-    # Check for product ID queries first
-    if 'product id' in msg_lower or 'product-id' in msg_lower:
-        intents.append('product_id_lookup')
-        # Extract product ID if present
-        import re
-        id_match = re.search(r'product.?id.?(\d+)', msg_lower)
-        if id_match:
-            context['product_id'] = int(id_match.group(1))
-    
-    # Primary intent detection
-    if any(word in msg_lower for word in ['warranty', 'claim', 'guarantee', 'repair', 'replace']):
-        intents.append('warranty')
-    if any(word in msg_lower for word in ['offer', 'discount', 'coupon', 'deal', 'sale', 'promo']):
-        intents.append('offer')
-    if any(word in msg_lower for word in ['find', 'search', 'looking', 'want', 'need', 'show', 'tell', 'about', 'info']):
-        intents.append('product_search')
-    if any(word in msg_lower for word in ['compare', 'vs', 'versus', 'difference', 'better']):
-        intents.append('comparison')
-    if any(word in msg_lower for word in ['price', 'cost', 'expensive', 'cheap', 'budget']):
-        intents.append('pricing')
-    if any(word in msg_lower for word in ['stock', 'available', 'inventory', 'in stock']):
-        intents.append('availability')
-    
+    analysis = analyze_message(message)
+    intents = list(analysis.intents)
+
     # Default to product search if no specific intent but has product mentions
-    product_indicators = ['bose', 'apple', 'samsung', 'lenovo', 'hp', 'asus', 'oneplus', 'xiaomi', 'jbl', 'sennheiser', 'garmin', 'fitbit', 'laptop', 'smartphone', 'headphones', 'smartwatch', 'model']
-    if not intents and any(word in msg_lower for word in product_indicators):
+    if not intents and (analysis.brands or analysis.categories or analysis.has_model):
         intents.append('product_search')
-    
-    # Context detection
-    context['is_specific_model'] = 'model' in msg_lower and any(char.isdigit() for char in message)
-    context['has_brand'] = any(brand in msg_lower for brand in ['bose', 'apple', 'samsung', 'lenovo', 'hp', 'asus', 'oneplus', 'xiaomi', 'jbl', 'sennheiser', 'garmin', 'fitbit'])
-    context['has_category'] = any(cat in msg_lower for cat in ['laptop', 'smartphone', 'headphones', 'smartwatch'])
-    
+
+    context = {
+        'is_specific_model': analysis.has_model and analysis.has_digit,
+        'has_brand': bool(analysis.brands),
+        'has_category': bool(analysis.categories),
+        'brands': analysis.brands,
+        'categories': analysis.categories,
+        'constraints': analysis.constraints,
+    }
+    if analysis.product_id is not None:
+        context['product_id'] = analysis.product_id
+
     return intents if intents else ['general'], context
 
-def build_product_query(keywords, context):
-    """Build optimized product query based on context"""
-    if not keywords:
-        return Product.query.limit(5)
+def ranked_product_query(product_ids):
+    """Query for the given product ids, preserving their ranking order"""
+    if not product_ids:
+        return Product.query.filter(false())
+    ranking = {pid: pos for pos, pid in enumerate(product_ids)}
+    return Product.query.filter(Product.id.in_(product_ids))\
+        .order_by(case(ranking, value=Product.id))
+
+def rank_product_ids(index, keywords, limit, allowed=None, pad=False):
+    """Keyword (BM25), vector or hybrid ranking, per RETRIEVAL_MODE.
+
+    With pad=True keyword search fills up with unmatched products from
+    `allowed`, e.g. the rest of a mentioned brand's range.
+    """
+    mode = current_app.config.get("RETRIEVAL_MODE", "hybrid")
+    keyword_ids = []
+    if mode != "vector" or index.vectors is None:
+        hits = index.search(keywords, limit=limit, allowed=allowed)
+        keyword_ids = [pid for pid, score in hits if pad or score > 0]
+    if mode == "keyword" or index.vectors is None:
+        return keyword_ids
+    vector_ids = [pid for pid, _ in index.vectors.search(" ".join(keywords), limit=limit, allowed=allowed)]
+    if mode == "vector":
+        return vector_ids
+    # Hybrid: exact term matches and semantic neighbours fused by rank
+    return reciprocal_rank_fusion(keyword_ids, vector_ids, limit=limit)
+
+def search_product_ids(keywords, context, allowed=None):
+    """Rank product ids for the keywords using the in-memory search indexes.
+
+    `allowed` limits the results to products that passed the numeric filters.
+    """
+    index = get_product_index()
     
-    # For specific model queries, use precise AND matching
+    # For specific model queries, use precise AND matching on names
     if context.get('is_specific_model'):
         # Filter out common words for model queries
         model_keywords = [k for k in keywords if k not in ['model', 'tell', 'about', 'me', 'info', 'information']]
         if model_keywords:
-            conditions = [Product.name.ilike(f"%{kw}%") for kw in model_keywords]
-            return Product.query.filter(and_(*conditions)).limit(3)
+            hits = index.search(model_keywords, fields=('name',), limit=3, require_all=True, allowed=allowed)
+            return [pid for pid, _ in hits]
     
-    # For brand + category queries, prioritize exact matches
-    if context.get('has_brand') and context.get('has_category'):
-        conditions = []
-        for kw in keywords:
-            conditions.extend([
-                Product.name.ilike(f"%{kw}%"),
-                Product.category.ilike(f"%{kw}%")
-            ])
-        return Product.query.filter(or_(*conditions)).limit(5)
+    # Brand and category mentions filter precisely on the products carrying them
+    if context.get('has_brand') or context.get('has_category'):
+        mentioned = None
+        for kind, labels in (('brand', context['brands']), ('category', context['categories'])):
+            if labels:
+                ids = index.vocabulary.product_ids(kind, labels)
+                mentioned = ids if mentioned is None else mentioned & ids
+        if mentioned:
+            limit = 5 if context.get('has_brand') and context.get('has_category') else 8
+            return rank_product_ids(index, keywords, limit, allowed=mentioned if allowed is None else mentioned & allowed,
+                                    pad=True)
     
-    # General search with OR logic
-    conditions = []
-    for kw in keywords:
-        conditions.extend([
-            Product.name.ilike(f"%{kw}%"),
-            Product.category.ilike(f"%{kw}%"),
-            Product.description.ilike(f"%{kw}%")
-        ])
-    return Product.query.filter(or_(*conditions)).limit(8)
+    # General search across all indexed fields
+    return rank_product_ids(index, keywords, 8, allowed=allowed)
 
-@chat_bp.route("/", methods=["POST"])
-@require_auth
-def chat():
-    data = request.json or {}
-    user_id = request.current_user.id
-    message = data.get("message")
-    if not message:
-        return jsonify({"error": "message is required"}), 400
+def filtered_product_ids(constraints, catalog):
+    """Ids of products meeting the message's numeric filters, or None when it states none"""
+    if not constraints.active:
+        return None
+    if catalog is not None:
+        return catalog.filter_ids(constraints)
+    return set(db.session.scalars(select(Product.id).where(*constraint_filters(constraints))))
+
+def load_products(product_ids, catalog, fact_options):
+    """Products for ranked ids by primary key, from the catalog snapshot or one query"""
+    if catalog is not None:
+        return [catalog.products_by_id[pid] for pid in product_ids if pid in catalog.products_by_id]
+    return ranked_product_query(product_ids).options(*fact_options).all()
+
+def unranked_products(constraints, allowed, catalog, fact_options, limit=5):
+    """Products for a message with no search terms: the filtered set, cheapest or priciest first when asked"""
+    descending = constraints.sort == 'price_desc'
+    if catalog is not None:
+        if constraints.sort:
+            ordered = catalog.by_price.ids[::-1] if descending else catalog.by_price.ids
+            if allowed is not None:
+                ordered = (pid for pid in ordered if pid in allowed)
+            ids = list(islice(ordered, limit))
+        elif allowed is not None:
+            ids = heapq.nsmallest(limit, allowed)
+        else:
+            return list(catalog.products[:limit])
+        return [catalog.products_by_id[pid] for pid in ids]
+    query = Product.query.filter(*constraint_filters(constraints)).options(*fact_options)
+    if constraints.sort:
+        query = query.order_by(Product.price.desc() if descending else Product.price)
+    else:
+        query = query.order_by(Product.id)
+    return query.limit(limit).all()
 
+def gather_facts(message, user_id=None):
+    """Detect intents for a message and collect the structured facts to answer it.
+
+    With a user id, follow-ups ("what about its warranty?") resolve to the
+    products of that user's earlier turns, and the turn is remembered.
+    Returns the intents, the facts and the summary of the earlier turns for
+    the prompt, which is '' unless the message referred back to them, so
+    new questions share response cache entries across conversations.
+    """
+    queries_before = query_count()
     # Advanced intent detection
-    intents, context = detect_intent_and_context(message)
-    keywords = extract_keywords(message)
+    with span("intent"):
+        intents, context = detect_intent_and_context(message)
+        constraints = context['constraints']
+        conversation_store = get_conversation_store() if user_id is not None else None
+        conversation = conversation_store.get(user_id) if conversation_store is not None else None
+        referenced, narrowed = referenced_product_ids(message, analyze_message(message), conversation)
+        # Summarized before this turn is added to it
+        history = conversation.summary() if referenced else ""
+    retrieval_started = time.perf_counter()
+    # Search on the words left once price/stock/warranty phrases are taken out
+    keywords = extract_keywords(constraints.text)
     
     structured_facts = {}
     products = []
 
+    # Served from the in-memory catalog snapshot; falls back to the database when disabled
+    catalog = get_catalog()
+    # Offers and warranties are eager-loaded with the products in the same query
+    fact_options = product_fact_options(intents)
+
     # Handle product ID lookup first
     if 'product_id_lookup' in intents and 'product_id' in context:
-        product = Product.query.get(context['product_id'])
+        if catalog is not None:
+            product = catalog.products_by_id.get(context['product_id'])
+        else:
+            product = Product.query.options(*fact_options).filter(Product.id == context['product_id']).first()
         if product:
             products = [product]
             structured_facts["products"] = [product.to_dict()]
@@ -119,20 +198,33 @@ def chat():
             structured_facts["error"] = f"Product ID {context['product_id']} not found"
     
     # Handle multiple intents intelligently
-    elif 'product_search' in intents or 'general' in intents:
-        query = build_product_query(keywords, context)
-        
-        # Apply warranty filters if warranty intent detected
-        if 'warranty' in intents:
-            msg_lower = message.lower()
-            if "2 year" in msg_lower or "2-year" in msg_lower:
-                query = query.join(WarrantyInfo).filter(WarrantyInfo.warranty_period.ilike("%2 year%"))
-            elif "1 year" in msg_lower or "1-year" in msg_lower:
-                query = query.join(WarrantyInfo).filter(WarrantyInfo.warranty_period.ilike("%1 year%"))
-            elif "6 month" in msg_lower or "6-month" in msg_lower:
-                query = query.join(WarrantyInfo).filter(WarrantyInfo.warranty_period.ilike("%6 month%"))
-        
-        products = query.all()
+    elif referenced or RETRIEVAL_INTENTS.intersection(intents) or constraints.active or context['has_brand'] or context['has_category']:
+        # Numeric filters narrow the candidates before ranking
+        allowed = filtered_product_ids(constraints, catalog)
+        if allowed is not None:
+            structured_facts["filters"] = constraints.to_dict()
+        if allowed is not None and not allowed:
+            products = []
+        elif referenced:
+            # Follow-up: look the earlier turn's products up by id instead of searching again
+            ids = referenced if allowed is None else [pid for pid in referenced if pid in allowed]
+            products = load_products(ids, catalog, fact_options)
+        elif keywords:
+            ids = search_product_ids(keywords, context, allowed)
+            products = load_products(ids, catalog, fact_options)
+            if not products and allowed:
+                # Nothing matched the words; the filters alone still describe what was asked for
+                products = unranked_products(constraints, allowed, catalog, fact_options)
+        else:
+            products = unranked_products(constraints, allowed, catalog, fact_options)
+
+        # Pricing: "cheapest"/"most expensive" order the matches by price
+        if 'pricing' in intents and constraints.sort:
+            products.sort(key=lambda p: p.price, reverse=constraints.sort == 'price_desc')
+
+        # Availability: list what can be bought now first
+        if 'availability' in intents:
+            products.sort(key=lambda p: (p.stock or 0) <= 0)
         
         # Only include products in response for pure product searches
         if 'product_search' in intents and len(intents) == 1:
@@ -141,41 +233,8 @@ def chat():
             # For mixed intents, use products as context only
             structured_facts["_product_context"] = [p.to_dict() for p in products]
     
-    # Handle warranty queries
-    if 'warranty' in intents and products:
-        product_ids = [p.id for p in products]
-        warranties = WarrantyInfo.query.filter(WarrantyInfo.product_id.in_(product_ids)).all()
-        structured_facts["warranty"] = [w.to_dict() for w in warranties]
-    elif 'warranty' in intents and not products:
-        # General warranty query without specific products
-        warranties = WarrantyInfo.query.limit(5).all()
-        structured_facts["warranty"] = [w.to_dict() for w in warranties]
-    
-    # Handle offer queries
-    if 'offer' in intents and products:
-        product_ids = [p.id for p in products]
-        offers = Offer.query.filter(Offer.product_id.in_(product_ids)).all()
-        structured_facts["offers"] = [o.to_dict() for o in offers]
-        # Include product details for offers
-        structured_facts["offer_products"] = [p.to_dict() for p in products]
-    elif 'offer' in intents and not products:
-        # General offer query without specific products
-        offers = Offer.query.limit(5).all()
-        structured_facts["offers"] = [o.to_dict() for o in offers]
-        # Include product details for all offers
-        offer_product_ids = [o.product_id for o in offers]
-        offer_products = Product.query.filter(Product.id.in_(offer_product_ids)).all()
-        structured_facts["offer_products"] = [p.to_dict() for p in offer_products]
-    
-    # Handle pricing queries
-    if 'pricing' in intents and products:
-        # Products already included, AI will focus on pricing
-        pass
-    
-    # Handle availability queries
-    if 'availability' in intents and products:
-        # Products already included with stock info, AI will focus on availability
-        pass
+    # Handle warranty and offer queries from the loaded products
+    structured_facts.update(related_facts(intents, products, catalog))
     
     # Handle comparison queries
     if 'comparison' in intents and products:
@@ -187,43 +246,207 @@ def chat():
             if "_product_context" in structured_facts:
                 structured_facts["_product_context"] = structured_facts["_product_context"][:4]
 
-    # Configure Gemini
-    genai.configure(api_key=current_app.config.get('GEMINI_API_KEY'))
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    # Build enhanced sales-focused prompt
-    intent_context = ", ".join(intents)
-    system_prompt = f"""You are a professional sales assistant helping customers with {intent_context} queries. 
-    
-Guidelines:
-    - Use ONLY the provided structured facts
-    - Be helpful, concise, and sales-oriented
-    - For product searches: highlight key features, pricing, and availability
-    - For warranty queries: explain coverage and claim process clearly
-    - For offer queries: emphasize savings and validity periods, and ALWAYS mention the product name with the offer
-    - For product ID lookups: provide complete product information
-    - For comparisons: highlight differences and recommend based on needs
-    - For pricing: mention value proposition
-    - Always be customer-focused and solution-oriented
-    - When showing offers, always include the product name, not just the ID
-    
-    If no relevant data is found, politely explain and suggest alternatives."""
-    
-    prompt = f"{system_prompt}\n\nCustomer Query: {message}\nAvailable Data: {structured_facts}"
+    if conversation_store is not None:
+        product_ids = [p.id for p in products] or [p["id"] for p in structured_facts.get("offer_products", [])]
+        conversation_store.record(user_id, message, intents, product_ids, context['brands'], context['categories'],
+                                  narrowed=narrowed)
 
-    # Call Gemini
-    try:
-        response = model.generate_content(prompt)
-        ai_reply = response.text
-    except Exception as e:
-        ai_reply = "Sorry, I couldn't contact the AI service right now."
+    record_stage("retrieval", time.perf_counter() - retrieval_started)
+    observe_fact_queries(query_count() - queries_before)
+    return intents, structured_facts, history
 
-    # Save chat history
+def build_prompt(message, intents, structured_facts, history=""):
+    """Build the sales-focused prompt sent to the LLM, within the configured token budget"""
+    return compact_prompt(message, intents, structured_facts, current_app.config.get("PROMPT_TOKEN_BUDGET", 1500),
+                          history=history)
+
+def save_chat(user_id, message, ai_reply):
+    """Persist a completed chat turn.
+
+    With the write-behind queue enabled the turn is only spooled and queued,
+    keeping the database commit off the request path, and None is returned;
+    otherwise it is committed here and its id returned.
+    """
+    writer = get_chat_writer()
+    if writer is not None:
+        writer.enqueue(user_id, message, ai_reply)
+        return None
     chat = ChatHistory(user_id=user_id, query=message, response=ai_reply)
     db.session.add(chat)
+    record_chat_rollup(message, user_id)
     db.session.commit()
+    return chat.id
+
+def sse_event(event, data):
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@chat_bp.route("/", methods=["POST"])
+@require_auth
+@rate_limited
+def chat():
+    data = request.json or {}
+    user_id = request.current_user.id
+    message = data.get("message") if isinstance(data, dict) else None
+    if not message:
+        return jsonify({"error": "message is required"}), 400
+
+    intents, structured_facts, history = gather_facts(message, user_id)
+    with span("prompt"):
+        prompt = build_prompt(message, intents, structured_facts, history)
+
+    # Serve repeated questions over identical facts from the response cache
+    with span("cache"):
+        cache = get_response_cache()
+        cache_key = cache.make_key(message, structured_facts, history)
+        ai_reply = cache.get(cache_key)
+
+    # Return the connection to the pool so it isn't held for the whole LLM call
+    db.session.close()
+
+    # Call Gemini, once a slot is free
+    if ai_reply is None:
+        try:
+            with span("admission"):
+                slot = get_llm_admission().acquire()
+        except Overloaded as e:
+            return too_many_requests(e.retry_after, BUSY_ERROR)
+        with slot, span("llm"):
+            try:
+                ai_reply = get_llm_client().generate(prompt)
+                cache.set(cache_key, ai_reply, facts_product_ids(structured_facts))
+            except Exception as e:
+                ai_reply = FALLBACK_REPLY
+
+    with span("save"):
+        save_chat(user_id, message, ai_reply)
 
     return jsonify({
         "reply": ai_reply,
         "facts": structured_facts
-    })
\ No newline at end of file
+    })
+
+@chat_bp.route("/stream", methods=["POST"])
+@require_auth
+@rate_limited
+def chat_stream():
+    """Streaming variant of chat: sends the facts first, then model tokens as SSE"""
+    data = request.json or {}
+    user_id = request.current_user.id
+    message = data.get("message") if isinstance(data, dict) else None
+    if not message:
+        return jsonify({"error": "message is required"}), 400
+
+    intents, structured_facts, history = gather_facts(message, user_id)
+    with span("prompt"):
+        prompt = build_prompt(message, intents, structured_facts, history)
+    with span("cache"):
+        cache = get_response_cache()
+        cache_key = cache.make_key(message, structured_facts, history)
+        cached_reply = cache.get(cache_key)
+    # Don't hold a pooled connection while the reply streams
+    db.session.close()
+
+    llm = get_llm_client()
+    slot = None
+    if cached_reply is None:
+        # Admit the LLM call before the 200 goes out, so an overload can still answer 429
+        try:
+            with span("admission"):
+                slot = get_llm_admission().acquire()
+        except Overloaded as e:
+            return too_many_requests(e.retry_after, BUSY_ERROR)
+
+    def events():
+        yield sse_event("facts", structured_facts)
+
+        ai_reply = cached_reply
+        if ai_reply is not None:
+            yield sse_event("token", {"text": ai_reply})
+        else:
+            parts = []
+            llm_started = time.perf_counter()
+            try:
+                for text in llm.stream(prompt):
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+                ai_reply = "".join(parts)
+                cache.set(cache_key, ai_reply, facts_product_ids(structured_facts))
+            except Exception as e:
+                # Keep whatever was already streamed; only fall back if nothing arrived
+                ai_reply = "".join(parts)
+                if not ai_reply:
+                    ai_reply = FALLBACK_REPLY
+                    yield sse_event("token", {"text": ai_reply})
+            finally:
+                slot.release()
+                record_stage("llm", time.perf_counter() - llm_started)
+
+        # Persist the complete reply once the stream has finished
+        with span("save"):
+            chat_id = save_chat(user_id, message, ai_reply)
+        yield sse_event("done", {"reply": ai_reply, "chat_id": chat_id})
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if slot is not None:
+        # Also frees the slot if the client disconnects before the stream starts
+        response.call_on_close(slot.release)
+    return response
+
+@chat_bp.route("/cache-stats", methods=["GET"])
+@require_auth
+def cache_stats():
+    """Hit/miss counters for the LLM response cache"""
+    return jsonify(get_response_cache().stats())
+
+@chat_bp.route("/llm-stats", methods=["GET"])
+@require_auth
+def llm_stats():
+    """Call, retry and failure counters of the LLM client and its breaker state"""
+    return jsonify(get_llm_client().stats())
+
+@chat_bp.route("/limit-stats", methods=["GET"])
+@require_auth
+def limit_stats():
+    """Rate limiter counters and LLM admission queue state"""
+    limiter = get_rate_limiter()
+    stats = {
+        "rate_limit": {"enabled": False} if limiter is None else {"enabled": True, **limiter.stats()},
+        "admission": get_llm_admission().stats(),
+    }
+    # The async chat pipeline admits its own calls when served by asgi.py
+    async_admission = current_app.extensions.get("llm_async_admission")
+    if async_admission is not None:
+        stats["async_admission"] = async_admission.stats()
+    return jsonify(stats)
+
+@chat_bp.route("/write-stats", methods=["GET"])
+@require_auth
+def write_stats():
+    """Queue depth and flush latency of the chat history write-behind queue"""
+    writer = get_chat_writer()
+    if writer is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **writer.stats()})
+
+@chat_bp.route("/conversation", methods=["DELETE"])
+@require_auth
+def reset_conversation():
+    """Start a new conversation: later messages no longer refer back to earlier turns"""
+    conversations = get_conversation_store()
+    if conversations is not None:
+        conversations.forget(request.current_user.id)
+    return jsonify({"message": "Conversation reset"})
+
+@chat_bp.route("/conversation-stats", methods=["GET"])
+@require_auth
+def conversation_stats():
+    """Size and hit rate of the per-user conversation memory"""
+    conversations = get_conversation_store()
+    if conversations is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **conversations.stats()})
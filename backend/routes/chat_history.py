@@ -2,7 +2,12 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import ChatHistory, User
 from utils import require_auth
-from sqlalchemy import desc, func
+from utils.intent_engine import primary_intent
+from utils.history_search import search_history
+from utils.pagination import InvalidCursor, encode_cursor, decode_cursor
+from utils.chat_writer import flush_user_chats
+from utils.conversation import get_conversation_store
+from sqlalchemy import desc, func, or_, and_
 from datetime import datetime, timedelta
 
 chat_history_bp = Blueprint('chat_history_bp', __name__)
@@ -47,21 +52,43 @@ def debug_search():
 @chat_history_bp.route('/', methods=['GET'])
 @require_auth
 def get_user_chat_history():
-    """Get user's chat history with pagination"""
+    """Get user's chat history, newest first, with keyset pagination.
+
+    Pages follow next_cursor (?cursor=) along the (user_id, created_at, id)
+    index, so deep pages cost the same as the first. The total is counted
+    once, on the first page.
+    """
+    flush_user_chats(request.current_user.id)
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Simple query first
-        chats = db.session.query(ChatHistory).filter(
-            ChatHistory.user_id == request.current_user.id
-        ).order_by(desc(ChatHistory.created_at)).limit(per_page).all()
-        
-        return jsonify({
-            'chats': [chat.to_dict() for chat in chats],
-            'total': len(chats),
-            'current_page': page
-        })
+        user_id = request.current_user.id
+        limit = request.args.get('limit', None, type=int) or request.args.get('per_page', 20, type=int)
+        limit = min(max(limit, 1), 100)
+        try:
+            position = decode_cursor(request.args.get('cursor'), created_at=datetime.fromisoformat, id=int)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = db.session.query(ChatHistory).filter(ChatHistory.user_id == user_id)
+        if position is not None:
+            query = query.filter(or_(
+                ChatHistory.created_at < position['created_at'],
+                and_(ChatHistory.created_at == position['created_at'], ChatHistory.id < position['id'])
+            ))
+        chats = query.order_by(desc(ChatHistory.created_at), desc(ChatHistory.id)).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(chats) > limit:
+            last = chats[limit - 1]
+            next_cursor = encode_cursor({'created_at': last.created_at.isoformat(), 'id': last.id})
+        
+        response = {
+            'chats': [chat.to_dict() for chat in chats[:limit]],
+            'next_cursor': next_cursor
+        }
+        if position is None:
+            response['total'] = db.session.query(func.count(ChatHistory.id))\
+                .filter(ChatHistory.user_id == user_id).scalar()
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e), 'user_id': request.current_user.id}), 500
 
@@ -69,6 +96,7 @@ def get_user_chat_history():
 @require_auth
 def get_user_analytics():
     """Get user's chat analytics"""
+    flush_user_chats(request.current_user.id)
     try:
         user_id = request.current_user.id
         
@@ -88,15 +116,7 @@ def get_user_analytics():
         
         intent_counts = {'product_search': 0, 'warranty': 0, 'offer': 0, 'general': 0}
         for chat in recent_chats:
-            query_lower = chat.query.lower()
-            if any(word in query_lower for word in ['find', 'search', 'looking', 'tell me about']):
-                intent_counts['product_search'] += 1
-            elif any(word in query_lower for word in ['warranty', 'claim']):
-                intent_counts['warranty'] += 1
-            elif any(word in query_lower for word in ['offer', 'discount', 'coupon']):
-                intent_counts['offer'] += 1
-            else:
-                intent_counts['general'] += 1
+            intent_counts[primary_intent(chat.query)] += 1
         
         return jsonify({
             'total_chats': total_chats,
@@ -110,67 +130,32 @@ def get_user_analytics():
 @chat_history_bp.route('/search', methods=['GET'])
 @require_auth
 def search_chat_history():
-    """Search through user's chat history"""
+    """Ranked full-text search through user's chat history"""
+    flush_user_chats(request.current_user.id)
     try:
-        query = request.args.get('q', '').strip()
+        query = (request.args.get('q') or request.args.get('query') or '').strip()
         if not query:
             # Return empty results if no query provided
             return jsonify({
                 'results': [],
                 'count': 0,
+                'next_cursor': None,
                 'message': 'No search query provided'
             })
         
-        # Simple direct search first
-        from sqlalchemy import or_
-        
-        # Direct search in both query and response
-        chats = db.session.query(ChatHistory).filter(
-            ChatHistory.user_id == request.current_user.id,
-            or_(
-                ChatHistory.query.ilike(f'%{query}%'),
-                ChatHistory.response.ilike(f'%{query}%')
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        try:
+            results, next_cursor = search_history(
+                request.current_user.id, query, cursor=request.args.get('cursor'), limit=limit
             )
-        ).order_by(desc(ChatHistory.created_at)).limit(20).all()
-        
-        # If no direct match, try word-by-word search
-        if not chats:
-            search_words = query.lower().split()
-            word_conditions = []
-            for word in search_words:
-                word_conditions.append(
-                    or_(
-                        ChatHistory.query.ilike(f'%{word}%'),
-                        ChatHistory.response.ilike(f'%{word}%')
-                    )
-                )
-            
-            # Try OR logic (any word matches)
-            chats = db.session.query(ChatHistory).filter(
-                ChatHistory.user_id == request.current_user.id,
-                or_(*word_conditions)
-            ).order_by(desc(ChatHistory.created_at)).limit(20).all()
-        else:
-            search_words = query.lower().split()
-        
-        # Debug info - get all user chats to see what's in the database
-        all_user_chats = db.session.query(ChatHistory).filter(
-            ChatHistory.user_id == request.current_user.id
-        ).all()
-        
-        # Show sample of actual chat queries for debugging
-        sample_queries = [chat.query[:50] + '...' if len(chat.query) > 50 else chat.query 
-                         for chat in all_user_chats[:3]]
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'results': [chat.to_dict() for chat in chats],
-            'count': len(chats),
+            'results': results,
+            'count': len(results),
             'search_query': query,
-            'search_words': search_words,
-            'total_chats': len(all_user_chats),
-            'current_user_id': request.current_user.id,
-            'sample_queries': sample_queries,
-            'debug': f'Searched for "{query}" (words: {search_words}) in {len(all_user_chats)} total chats'
+            'next_cursor': next_cursor
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -179,6 +164,7 @@ def search_chat_history():
 @require_auth
 def delete_chat(chat_id):
     """Delete a specific chat"""
+    flush_user_chats(request.current_user.id)
     try:
         chat = db.session.query(ChatHistory).filter(
             ChatHistory.id == chat_id, 
@@ -199,9 +185,14 @@ def delete_chat(chat_id):
 @require_auth
 def clear_all_chats():
     """Clear all user's chat history"""
+    flush_user_chats(request.current_user.id)
     try:
         db.session.query(ChatHistory).filter(ChatHistory.user_id == request.current_user.id).delete()
         db.session.commit()
+        # Follow-ups shouldn't resolve against the cleared conversation
+        conversations = get_conversation_store()
+        if conversations is not None:
+            conversations.forget(request.current_user.id)
         
         return jsonify({'message': 'All chats cleared successfully'})
     except Exception as e:
@@ -1,22 +1,30 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, abort
 from app.models import Offer
 from app import db
 from datetime import datetime
 
 from utils.auth import require_auth
+from utils.response_cache import get_response_cache
+from utils.catalog import get_catalog, invalidate_catalog
 
 offers_bp = Blueprint("offers_bp", __name__)
 
 @offers_bp.route("/", methods=["GET"])
 @require_auth
 def get_offers():
-    offers = Offer.query.all()
+    catalog = get_catalog()
+    offers = catalog.offers if catalog is not None else Offer.query.all()
     return jsonify([o.to_dict() for o in offers])
 
 @offers_bp.route("/<int:offer_id>", methods=["GET"])
 @require_auth
 def get_offer(offer_id):
-    offer = Offer.query.get_or_404(offer_id)
+    catalog = get_catalog()
+    if catalog is None:
+        return jsonify(Offer.query.get_or_404(offer_id).to_dict())
+    offer = catalog.offers_by_id.get(offer_id)
+    if offer is None:
+        abort(404)
     return jsonify(offer.to_dict())
 
 @offers_bp.route("/", methods=["POST"])
@@ -33,4 +41,7 @@ def add_offer():
     )
     db.session.add(offer)
     db.session.commit()
+    invalidate_catalog()
+    # Cached replies about this product no longer reflect its offers
+    get_response_cache().invalidate_products([offer.product_id])
     return jsonify(offer.to_dict()), 201
\ No newline at end of file
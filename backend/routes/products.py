@@ -1,7 +1,12 @@
-from flask import Blueprint, jsonify, request
+import bisect
+import math
+from flask import Blueprint, jsonify, request, abort
 from app.models import Product
 from app import db
 from utils.auth import require_auth
+from utils.search_index import product_index
+from utils.catalog import get_catalog, invalidate_catalog
+from utils.pagination import encode_cursor, decode_cursor, estimated_count, InvalidCursor
 
 
 products_bp = Blueprint("products_bp", __name__)
@@ -9,25 +14,54 @@ products_bp = Blueprint("products_bp", __name__)
 @products_bp.route("/", methods=["GET"])
 @require_auth
 def get_products():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    """List products by id with keyset pagination.
+
+    Pass the returned next_cursor as ?cursor= for the following page; every
+    page costs the same however deep it is. ?page= is still accepted for
+    the first request of older clients.
+    """
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    try:
+        position = decode_cursor(request.args.get('cursor'), id=int)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    page = request.args.get('page', 1, type=int) if position is None else None
     
-    products = Product.query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    catalog = get_catalog()
+    if catalog is not None:
+        if position is not None:
+            start = bisect.bisect_right(catalog.product_ids, position['id'])
+        else:
+            start = max(page - 1, 0) * per_page
+        items = catalog.products[start:start + per_page + 1]
+        total = len(catalog.products)
+    else:
+        query = Product.query.order_by(Product.id)
+        if position is not None:
+            query = query.filter(Product.id > position['id'])
+        elif page > 1:
+            query = query.offset((page - 1) * per_page)
+        items = query.limit(per_page + 1).all()
+        total = estimated_count(Product)
     
+    next_cursor = encode_cursor({'id': items[per_page - 1].id}) if len(items) > per_page else None
     return jsonify({
-        "products": [p.to_dict() for p in products.items],
-        "total": products.total,
-        "pages": products.pages,
-        "current_page": page,
-        "per_page": per_page
+        "products": [p.to_dict() for p in items[:per_page]],
+        "total": total,
+        "pages": math.ceil(total / per_page),
+        "per_page": per_page,
+        "next_cursor": next_cursor
     })
 
 @products_bp.route("/<int:product_id>", methods=["GET"])
 @require_auth
 def get_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    catalog = get_catalog()
+    if catalog is None:
+        return jsonify(Product.query.get_or_404(product_id).to_dict())
+    product = catalog.products_by_id.get(product_id)
+    if product is None:
+        abort(404)
     return jsonify(product.to_dict())
 
 @products_bp.route("/", methods=["POST"])
@@ -44,13 +78,20 @@ def add_product():
     )
     db.session.add(product)
     db.session.commit()
+    invalidate_catalog()
+    if product_index.ready:
+        product_index.add(product)
     return jsonify(product.to_dict()), 201
 
 @products_bp.route("/load-data", methods=["POST"])
 def load_sample_data():
-    """Load sample data from CSV files"""
+    """Load sample data from CSV files.
+
+    With ?mode=sync only the differences against the current catalog are
+    applied and a summary of inserted/updated/deleted rows is returned.
+    """
     try:
-        from utils.db_utils import load_csv_to_db
+        from utils.db_utils import load_csv_to_db, sync_csv_to_db
         import os
         
         products_csv = os.getenv("PRODUCTS_CSV", "datasets/products.csv")
@@ -58,8 +99,11 @@ def load_sample_data():
         warranty_csv = os.getenv("WARRANTY_CSV", "datasets/warranty_info.csv")
         
         if os.path.exists(products_csv):
-            load_csv_to_db(products_csv, offers_csv, warranty_csv)
-            return jsonify({"message": "Data loaded successfully"}), 200
+            if request.args.get('mode') == 'sync':
+                changes = sync_csv_to_db(products_csv, offers_csv, warranty_csv)
+                return jsonify({"message": "Data synced successfully", "changes": changes}), 200
+            stats = load_csv_to_db(products_csv, offers_csv, warranty_csv)
+            return jsonify({"message": "Data loaded successfully", "stats": stats}), 200
         else:
             return jsonify({"error": f"CSV file not found: {products_csv}"}), 404
     except Exception as e:
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from app.models import WarrantyInfo
 from utils.auth import  require_auth
+from utils.catalog import get_catalog
 
 warranty_bp = Blueprint('warranty_bp', __name__)
 
@@ -9,7 +10,8 @@ warranty_bp = Blueprint('warranty_bp', __name__)
 @require_auth
 def get_all_warranties():
     try:
-        warranties = WarrantyInfo.query.all()
+        catalog = get_catalog()
+        warranties = catalog.warranties if catalog is not None else WarrantyInfo.query.all()
         return jsonify([w.to_dict() for w in warranties]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -20,7 +22,12 @@ def get_all_warranties():
 @require_auth
 def get_warranty_by_product(product_id):
     try:
-        warranty = WarrantyInfo.query.filter_by(product_id=product_id).first()
+        catalog = get_catalog()
+        if catalog is not None:
+            warranties = catalog.warranties_by_product.get(product_id, ())
+            warranty = warranties[0] if warranties else None
+        else:
+            warranty = WarrantyInfo.query.filter_by(product_id=product_id).first()
         if not warranty:
             return jsonify({"message": "No warranty found for this product"}), 404
 
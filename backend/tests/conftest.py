@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a fresh SQLite database with the stub LLM and synchronous chat writes"""
+    from app import create_app, db
+    from app.config import Config
+    from utils.search_index import product_index
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(Config, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(Config, "CHAT_WRITE_BEHIND", False)
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(Config, "CHAT_SPOOL_DIR", str(tmp_path / "spool"))
+
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        # Catalog snapshot and search index are process-wide
+        from utils.catalog import invalidate_catalog
+        invalidate_catalog()
+        product_index.ready = False
+        db.session.remove()
+        db.drop_all()
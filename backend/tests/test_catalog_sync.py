@@ -0,0 +1,89 @@
+from sqlalchemy import inspect, text
+
+from app import db
+from app.models import Offer, Product, WarrantyInfo
+from utils.db_utils import ensure_catalog_schema, load_csv_to_db, sync_csv_to_db
+
+PRODUCTS = """id,name,category,price,description,specs,stock
+1,Bose Headphones Model 1,Headphones,199.99,Over-ear headphones,"{""brand"": ""Bose""}",12
+2,Apple Laptop Model 2,Laptop,1299.0,Thin laptop,"{""brand"": ""Apple""}",3
+3,Sony Speaker Model 3,Speaker,89.5,,,0
+"""
+OFFERS = """id,product_id,discount_percentage,coupon_code,valid_till
+1,1,10,BOS10OFF,2025-12-31
+"""
+# "Lifetime" has no month count, so that row's warranty_months is NULL
+WARRANTY = """id,product_id,warranty_period,claim_process
+1,1,1 Year,Contact support
+2,2,Lifetime,
+3,3,6 Months,Contact support
+"""
+
+
+def write_csvs(tmp_path):
+    paths = []
+    for name, content in (("products", PRODUCTS), ("offers", OFFERS), ("warranty_info", WARRANTY)):
+        path = tmp_path / f"{name}.csv"
+        path.write_text(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_resync_of_unchanged_csv_changes_nothing(app, tmp_path):
+    paths = write_csvs(tmp_path)
+    load_csv_to_db(*paths)
+    assert db.session.get(WarrantyInfo, 2).warranty_months is None
+
+    summary = sync_csv_to_db(*paths)
+
+    for table in ("products", "offers", "warranty"):
+        assert summary[table]["updated"] == 0, table
+        assert summary[table]["inserted"] == 0, table
+
+
+def test_null_integer_cell_only_updates_its_row(app, tmp_path):
+    paths = write_csvs(tmp_path)
+    load_csv_to_db(*paths)
+    db.session.get(Product, 2).stock = None
+    db.session.commit()
+
+    summary = sync_csv_to_db(*paths)
+
+    assert summary["products"]["updated"] == 1
+    assert summary["products"]["unchanged"] == 2
+    assert db.session.get(Product, 2).stock == 3
+
+
+def test_id_repeated_in_a_later_chunk_is_not_inserted_twice(app, tmp_path):
+    paths = write_csvs(tmp_path)
+    load_csv_to_db(*paths)
+    new_rows = ["4,JBL Speaker Model 4,Speaker,59.0,,,5", "5,HP Laptop Model 5,Laptop,899.0,,,1"]
+    (tmp_path / "products.csv").write_text(PRODUCTS + "\n".join(new_rows + new_rows[:1]) + "\n"
+                                           + "4,JBL Speaker Model 4,Speaker,49.0,,,5\n")
+
+    # Chunks of two: [1, 2], [3, 4], [5, 4 again], [4 repriced]
+    summary = sync_csv_to_db(*paths, chunksize=2)
+
+    assert {k: summary["products"][k] for k in ("inserted", "updated", "skipped", "unchanged")} == {
+        "inserted": 2, "updated": 1, "skipped": 1, "unchanged": 3
+    }
+    assert db.session.get(Product, 4).price == 49.0
+
+
+def test_missing_declared_index_is_created_on_an_existing_database(app):
+    db.session.execute(text("DROP INDEX ix_products_price"))
+    db.session.commit()
+
+    assert ensure_catalog_schema() is False
+
+    assert "ix_products_price" in {index["name"] for index in inspect(db.engine).get_indexes("products")}
+
+
+def test_offers_csv_without_coupon_codes_loads(app, tmp_path):
+    paths = write_csvs(tmp_path)
+    (tmp_path / "offers.csv").write_text("id,product_id,discount_percentage,valid_till\n1,1,10,2025-12-31\n")
+
+    load_csv_to_db(*paths)
+
+    assert db.session.get(Offer, 1).coupon_code == ""
+    assert sync_csv_to_db(*paths)["offers"]["unchanged"] == 1
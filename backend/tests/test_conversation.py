@@ -0,0 +1,84 @@
+import pytest
+
+from utils.conversation import (
+    Conversation, ConversationStore, RedisConversationStore, Turn, referenced_product_ids
+)
+from utils.intent_engine import analyze_message
+
+
+@pytest.fixture
+def conversation():
+    conversation = Conversation(max_turns=5)
+    conversation.add(Turn("show me headphones", ("product_search",), (4, 7, 9), (), ("headphones",)))
+    return conversation
+
+
+def resolve(message, conversation):
+    return referenced_product_ids(message, analyze_message(message), conversation)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("what about its warranty?", ([4], True)),
+    ("is it in stock?", ([4], True)),
+    ("how much is it", ([4], True)),
+    ("tell me more about it", ([4], True)),
+    ("is the second one in stock?", ([7], True)),
+    ("what about the last one?", ([9], True)),
+    ("any offers on them?", ([4, 7, 9], False)),
+    ("which of them is cheapest?", ([4, 7, 9], False)),
+    ("are those in stock", ([4, 7, 9], False)),
+    ("compare both", ([4, 7, 9], False)),
+    ("and the warranty?", ([4, 7, 9], False)),
+])
+def test_follow_ups_resolve_to_earlier_products(conversation, message, expected):
+    assert resolve(message, conversation) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "what offers are there this week?",
+    "anything that costs under 100",
+    "show me something that is in stock",
+    "is it possible to pay in installments?",
+    "I think these prices are high, what is on sale?",
+    "what can you do?",
+])
+def test_new_questions_are_not_follow_ups(conversation, message):
+    assert resolve(message, conversation) == ([], False)
+
+
+def test_message_naming_a_brand_starts_over(conversation):
+    assert resolve("what about apple?", conversation) == ([], False)
+
+
+def test_history_reaches_the_prompt_only_for_follow_ups(app, tmp_path):
+    from routes.chat import gather_facts
+    from tests.test_catalog_sync import write_csvs
+    from utils.db_utils import load_csv_to_db
+    load_csv_to_db(*write_csvs(tmp_path))
+
+    assert gather_facts("show me headphones", user_id=1)[2] == ""
+    assert gather_facts("what offers are there this week?", user_id=1)[2] == ""
+    assert "show me headphones" in gather_facts("what about its warranty?", user_id=1)[2]
+
+
+class DictRedis(dict):
+    """The part of the redis-py client the conversation store uses"""
+
+    def set(self, key, value, ex=None):
+        self[key] = value
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
+def test_redis_store_keeps_the_same_conversation():
+    memory, shared = ConversationStore(max_turns=2), RedisConversationStore(DictRedis(), max_turns=2)
+    for store in (memory, shared):
+        store.record(1, "show me headphones", ["product_search"], [4, 7], categories=["headphones"])
+        store.record(1, "any from bose?", ["product_search"], [7], brands=["bose"])
+        store.record(1, "is the first one in stock?", ["availability"], [4], narrowed=True)
+
+    assert shared.get(1).summary() == memory.get(1).summary()
+    assert shared.get(1).last_product_ids(skip_narrowed=True) == [7]
+    shared.forget(1)
+    assert shared.get(1) is None
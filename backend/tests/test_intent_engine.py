@@ -0,0 +1,30 @@
+from utils.intent_engine import intent_engine
+from utils.search_index import CatalogVocabulary
+
+
+def test_entities_come_from_the_vocabulary_in_the_same_pass():
+    vocabulary = CatalogVocabulary.from_terms(["Bang & Olufsen", "Dealmakers"], ["Gaming Consoles"])
+
+    analysis = intent_engine.analyze("any offers on bang-olufsen gaming-console or dealmakers?", vocabulary)
+
+    assert analysis.brands == ("Bang & Olufsen", "Dealmakers")
+    assert analysis.categories == ("Gaming Consoles",)
+    assert analysis.intents == ("offer",)
+
+
+def test_pattern_follows_vocabulary_changes():
+    vocabulary = CatalogVocabulary.from_terms(["Bose"], ["Speakers"])
+    assert intent_engine.analyze("sonos speakers", vocabulary).brands == ()
+
+    vocabulary.add({"id": 1, "name": "Sonos Speaker Model 1", "category": "Speakers", "specs": {"brand": "Sonos"}})
+
+    assert intent_engine.analyze("sonos speakers", vocabulary).brands == ("sonos",)
+
+
+def test_constraints_are_parsed_for_the_cues_the_pass_found():
+    vocabulary = CatalogVocabulary.from_terms(["Bose"], ["Laptops"])
+
+    constraints = intent_engine.analyze("cheap laptops under $500 with at least a 2-year warranty", vocabulary).constraints
+
+    assert (constraints.max_price, constraints.sort, constraints.min_warranty_months) == (500, "price_asc", 24)
+    assert intent_engine.analyze("speakers under the desk", vocabulary).constraints.max_price is None
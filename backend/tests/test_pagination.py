@@ -0,0 +1,19 @@
+from datetime import datetime
+
+import pytest
+
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def test_cursor_values_are_converted():
+    cursor = encode_cursor({"created_at": datetime(2025, 1, 2, 3, 4, 5), "id": 42})
+
+    assert decode_cursor(cursor, created_at=datetime.fromisoformat, id=int) == {
+        "created_at": datetime(2025, 1, 2, 3, 4, 5), "id": 42
+    }
+
+
+@pytest.mark.parametrize("position", [{"id": "x"}, {"id": None}, {"id": [1]}, {"created_at": 1, "id": 1}, {}, [1]])
+def test_cursor_with_wrong_values_is_invalid(position):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(position), created_at=datetime.fromisoformat, id=int)
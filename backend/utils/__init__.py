@@ -1,4 +1,5 @@
-from .db_utils import load_csv_to_db
+from .db_utils import load_csv_to_db, sync_csv_to_db
 from .auth import require_auth
+from .search_index import product_index, get_product_index
 
-__all__ = ["load_csv_to_db", "require_auth"]
\ No newline at end of file
+__all__ = ["load_csv_to_db", "sync_csv_to_db", "require_auth", "product_index", "get_product_index"]
\ No newline at end of file
@@ -0,0 +1,87 @@
+from collections import Counter
+from datetime import datetime
+from app import db
+from app.models import ChatDailyRollup, ChatHistory
+from .intent_engine import analyze_message, primary_intent, PRIMARY_INTENTS
+
+ROLLUP_INTENTS = ['product_search', 'warranty', 'offer', 'general']
+
+
+def classify_query(query):
+    """Primary intent of a chat query as reported by the analytics endpoints"""
+    return primary_intent(query)
+
+
+def chat_dimensions(query, user_id=None):
+    """(dimension, value) pairs a chat contributes to the daily rollup"""
+    analysis = analyze_message(query)
+    intent = next((i for i in PRIMARY_INTENTS if i in analysis.intents), 'general')
+    dimensions = [('chats', ''), ('intent', intent), ('query', query[:255])]
+    if user_id is not None:
+        dimensions.append(('user', str(user_id)))
+    dimensions.extend(('brand', brand) for brand in analysis.brands)
+    dimensions.extend(('category', category) for category in analysis.categories)
+    # Product model mentions like "model 5"
+    dimensions.extend(('model', model[:255]) for model in analysis.models)
+    return dimensions
+
+
+def _upsert_counts(counts):
+    """Add counts to rollup rows, creating them as needed, in the current transaction"""
+    if not counts:
+        return
+    table = ChatDailyRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    rows = [
+        {'day': day, 'dimension': dimension, 'value': value, 'count': count}
+        for (day, dimension, value), count in counts.items()
+    ]
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for start in range(0, len(rows), 1000):
+            stmt = insert(table).values(rows[start:start + 1000])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.day, table.c.dimension, table.c.value],
+                set_={'count': table.c.count + stmt.excluded.count}
+            )
+            db.session.execute(stmt)
+        return
+
+    for row in rows:
+        existing = db.session.get(ChatDailyRollup, (row['day'], row['dimension'], row['value']))
+        if existing:
+            existing.count = ChatDailyRollup.count + row['count']
+        else:
+            db.session.add(ChatDailyRollup(**row))
+
+
+def record_chat_rollup(query, user_id=None, created_at=None):
+    """Count one chat in the daily rollup; committed together with the chat"""
+    record_chat_rollups([(query, user_id, created_at)])
+
+
+def record_chat_rollups(chats):
+    """Count a batch of (query, user_id, created_at) chats with one upsert per chunk"""
+    counts = Counter()
+    for query, user_id, created_at in chats:
+        day = (created_at or datetime.utcnow()).date()
+        counts.update((day, dimension, value) for dimension, value in chat_dimensions(query, user_id))
+    _upsert_counts(counts)
+
+
+def rebuild_chat_rollups(batch_size=5000):
+    """Recompute the rollup from ChatHistory, e.g. after enabling it on existing data"""
+    ChatDailyRollup.query.delete()
+    last_id = 0
+    while True:
+        batch = db.session.query(ChatHistory.id, ChatHistory.query, ChatHistory.user_id, ChatHistory.created_at)\
+            .filter(ChatHistory.id > last_id).order_by(ChatHistory.id).limit(batch_size).all()
+        if not batch:
+            break
+        record_chat_rollups((query, user_id, created_at) for _, query, user_id, created_at in batch)
+        last_id = batch[-1][0]
+    db.session.commit()
@@ -1,7 +1,142 @@
 import jwt
 import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from datetime import datetime
 from flask import request, jsonify, current_app
+from sqlalchemy import event
 from app.models import User
+from .instrumentation import span
+
+
+class CachedUser(NamedTuple):
+    """Detached copy of the fields routes read from request.current_user"""
+    id: int
+    name: str
+    email: str
+    created_at: datetime
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class ExpiringLRU:
+    """Bounded LRU map whose entries carry their own expiry timestamp"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Verified tokens (sha256 of the token -> user id, until the JWT exp) and user rows
+token_cache = ExpiringLRU(max_entries=10000)
+user_cache = ExpiringLRU(max_entries=1000)
+
+
+def configure_auth_cache(app):
+    token_cache.max_entries = app.config.get("AUTH_TOKEN_CACHE_SIZE", 10000)
+    user_cache.max_entries = app.config.get("AUTH_USER_CACHE_SIZE", 1000)
+
+
+def invalidate_user(user_id):
+    """Forget the cached copy of a user after it changes"""
+    user_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+def auth_cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+
+def _load_user(user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        row = User.query.get(user_id)
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.name, row.email, row.created_at)
+        ttl = current_app.config.get("AUTH_USER_CACHE_TTL", 60)
+        user_cache.set(user_id, user, time.time() + ttl)
+    return user
+
+
+def authenticate_token(token):
+    """Verify a JWT and load its user. Returns (user, error message).
+
+    A token that already verified is only looked up by its hash until the
+    JWT expiry, and users are cached for AUTH_USER_CACHE_TTL seconds, so a
+    warm request costs two dictionary lookups instead of a decode and a query.
+    """
+    token_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user_id = token_cache.get(token_key)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return None, "Token expired"
+        except jwt.InvalidTokenError:
+            return None, "Invalid token"
+        user_id = payload.get('user_id')
+        if user_id is None:
+            return None, "Invalid token"
+        token_cache.set(token_key, user_id, payload.get('exp', time.time() + 300))
+
+    user = _load_user(user_id)
+    if not user:
+        return None, "Invalid token"
+    return user, None
+
 
 def require_auth(func):
     """Decorator to protect endpoints with JWT authentication."""
@@ -10,18 +145,13 @@ def require_auth(func):
         auth_header = request.headers.get("Authorization", "")
         if not auth_header.startswith("Bearer "):
             return jsonify({"error": "Authorization header required"}), 401
-        
+
         token = auth_header.split(" ")[1]
-        try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            user = User.query.get(payload['user_id'])
-            if not user:
-                return jsonify({"error": "Invalid token"}), 401
-            request.current_user = user
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
-        
+        with span("auth"):
+            user, error = authenticate_token(token)
+        if error:
+            return jsonify({"error": error}), 401
+        request.current_user = user
+
         return func(*args, **kwargs)
     return wrapper
@@ -0,0 +1,207 @@
+import bisect
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from app import db
+from app.models import Product, Offer, WarrantyInfo, CatalogVersion
+
+
+class OfferRow(NamedTuple):
+    id: int
+    product_id: int
+    discount_percentage: float
+    coupon_code: str
+    valid_till: object
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "discount_percentage": float(self.discount_percentage),
+            "coupon_code": self.coupon_code,
+            "valid_till": self.valid_till.isoformat() if self.valid_till else None
+        }
+
+
+class WarrantyRow(NamedTuple):
+    id: int
+    product_id: int
+    warranty_period: str
+    claim_process: Optional[str]
+    warranty_months: Optional[int] = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "warranty_period": self.warranty_period,
+            "claim_process": self.claim_process
+        }
+
+
+class ProductRow(NamedTuple):
+    """Read-only product with its offers and warranties attached, like the ORM relationships"""
+    id: int
+    name: str
+    category: Optional[str]
+    price: float
+    description: Optional[str]
+    specs: Optional[dict]
+    stock: int
+    offers: tuple = ()
+    warranties: tuple = ()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category,
+            "price": float(self.price) if self.price is not None else None,
+            "description": self.description,
+            "specs": self.specs,
+            "stock": self.stock
+        }
+
+
+class RangeIndex:
+    """Sorted (value, product_id) pairs answering range lookups by bisection"""
+
+    def __init__(self, pairs):
+        pairs = sorted((value, pid) for value, pid in pairs if value is not None)
+        self.values = [value for value, _ in pairs]
+        self.ids = [pid for _, pid in pairs]
+
+    def between(self, low=None, high=None):
+        """Product ids with low <= value <= high (either bound optional), in value order"""
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        end = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        return self.ids[start:end]
+
+
+class CatalogSnapshot:
+    """Immutable in-memory copy of products, offers and warranties with lookup indexes"""
+
+    def __init__(self, version, products, offers, warranties):
+        self.version = version
+        self.offers = tuple(offers)
+        self.warranties = tuple(warranties)
+        self.offers_by_id = {o.id: o for o in self.offers}
+
+        offers_by_product = {}
+        for offer in self.offers:
+            offers_by_product.setdefault(offer.product_id, []).append(offer)
+        warranties_by_product = {}
+        for warranty in self.warranties:
+            warranties_by_product.setdefault(warranty.product_id, []).append(warranty)
+
+        self.offers_by_product = {pid: tuple(rows) for pid, rows in offers_by_product.items()}
+        self.warranties_by_product = {pid: tuple(rows) for pid, rows in warranties_by_product.items()}
+        self.products = tuple(
+            p._replace(
+                offers=self.offers_by_product.get(p.id, ()),
+                warranties=self.warranties_by_product.get(p.id, ())
+            )
+            for p in products
+        )
+        self.products_by_id = {p.id: p for p in self.products}
+        # Products are ordered by id, so a cursor position is a bisect away
+        self.product_ids = [p.id for p in self.products]
+
+        # Range indexes for the numeric filters parsed from chat messages
+        self.by_price = RangeIndex((p.price, p.id) for p in self.products)
+        self.by_stock = RangeIndex((p.stock, p.id) for p in self.products)
+        self.by_warranty_months = RangeIndex((w.warranty_months, w.product_id) for w in self.warranties)
+        self.by_discount = RangeIndex((o.discount_percentage, o.product_id) for o in self.offers)
+
+    def filter_ids(self, constraints):
+        """Ids of the products meeting the range filters in `constraints`, or None if it has none"""
+        matches = []
+        if constraints.min_price is not None or constraints.max_price is not None:
+            matches.append(self.by_price.between(constraints.min_price, constraints.max_price))
+        if constraints.in_stock:
+            matches.append(self.by_stock.between(1))
+        if constraints.min_warranty_months is not None or constraints.max_warranty_months is not None:
+            matches.append(self.by_warranty_months.between(
+                constraints.min_warranty_months, constraints.max_warranty_months))
+        if constraints.min_discount is not None:
+            matches.append(self.by_discount.between(constraints.min_discount))
+        if not matches:
+            return None
+        matches.sort(key=len)
+        return set(matches[0]).intersection(*matches[1:])
+
+    @classmethod
+    def load(cls, version):
+        """Read the whole catalog with one column-only query per table"""
+        products = [ProductRow(*row) for row in db.session.query(
+            Product.id, Product.name, Product.category, Product.price,
+            Product.description, Product.specs, Product.stock
+        ).order_by(Product.id)]
+        offers = [OfferRow(*row) for row in db.session.query(
+            Offer.id, Offer.product_id, Offer.discount_percentage, Offer.coupon_code, Offer.valid_till
+        ).order_by(Offer.id)]
+        warranties = [WarrantyRow(*row) for row in db.session.query(
+            WarrantyInfo.id, WarrantyInfo.product_id, WarrantyInfo.warranty_period, WarrantyInfo.claim_process,
+            WarrantyInfo.warranty_months
+        ).order_by(WarrantyInfo.id)]
+        return cls(version, products, offers, warranties)
+
+
+_lock = threading.Lock()
+_snapshot = None
+_local_version = 0
+_last_version_check = 0.0
+
+
+def _shared_version():
+    row = db.session.get(CatalogVersion, 1)
+    return row.version if row else 0
+
+
+def get_catalog():
+    """Return the current catalog snapshot, or None when the catalog cache is disabled.
+
+    The snapshot is loaded on first use and after invalidate_catalog(). With
+    CATALOG_VERSION_CHECK_SECONDS set, the shared version row is polled at
+    that interval so a write handled by another worker also triggers a reload.
+    """
+    global _snapshot, _last_version_check
+    if not current_app.config.get("CATALOG_CACHE_ENABLED", True):
+        return None
+
+    snapshot = _snapshot
+    interval = current_app.config.get("CATALOG_VERSION_CHECK_SECONDS", 0)
+    if snapshot is not None and interval and time.monotonic() - _last_version_check >= interval:
+        _last_version_check = time.monotonic()
+        version = _shared_version()
+        if version != snapshot.version:
+            snapshot = None
+            # Another worker changed the catalog, so the local search index is stale too
+            from .search_index import product_index
+            product_index.ready = False
+
+    if snapshot is None:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or (interval and snapshot.version != _shared_version()):
+                version = _shared_version() if interval else _local_version
+                snapshot = CatalogSnapshot.load(version)
+                _snapshot = snapshot
+    return snapshot
+
+
+def invalidate_catalog():
+    """Drop the snapshot after a catalog write; call after the write is committed"""
+    global _snapshot, _local_version
+    with _lock:
+        _snapshot = None
+        _local_version += 1
+    if current_app.config.get("CATALOG_VERSION_CHECK_SECONDS", 0):
+        row = db.session.get(CatalogVersion, 1)
+        if row is None:
+            db.session.add(CatalogVersion(id=1, version=1))
+        else:
+            row.version = CatalogVersion.version + 1
+        db.session.commit()
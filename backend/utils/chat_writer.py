@@ -0,0 +1,352 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from app import db
+from app.models import ChatHistory
+from .analytics import record_chat_rollups
+
+# Rows that failed both in their batch and on their own; not replayed on start
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+
+class ChatWriteBehind:
+    """Queue of chat turns persisted by a background thread in batched inserts.
+
+    Each turn is appended to a local spool file before it is queued, so turns
+    not yet in the database survive a crash and are replayed on the next
+    start. A flush writes the queued rows with one multi-row insert plus the
+    analytics rollup in a single transaction, whenever `batch_size` rows are
+    waiting or the oldest has waited `flush_interval` seconds, and once more
+    on shutdown. Delivery is at-least-once: a crash between the commit and
+    the removal of the spool segment replays that segment.
+
+    When a batch insert fails its rows are retried one at a time, so a single
+    bad row can't hold up the rest: rows the database rejects again are
+    appended to the dead-letter file in the spool directory, and if the
+    database itself is unreachable the remaining rows wait for the next flush.
+    """
+
+    def __init__(self, app, batch_size=100, flush_interval=1.0, spool_dir="spool", fsync=False):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+
+        self._queue = deque()
+        self._pending_users = Counter()
+        self._segments = []          # spool files whose rows are queued
+        self._spool = None
+        self._spool_path = None
+        self._segment_seq = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+        self._pid = None
+
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # Spool files --------------------------------------------------------
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        self._spool_path = os.path.join(self.spool_dir, f"chats-{os.getpid()}-{self._segment_seq}.jsonl")
+        self._spool = open(self._spool_path, "a", encoding="utf-8")
+
+    def _write_segment(self, records):
+        """Spool records that stay queued after their segment is retired; call with the lock held"""
+        self._segment_seq += 1
+        path = os.path.join(self.spool_dir, f"chats-{os.getpid()}-{self._segment_seq}.jsonl")
+        with open(path, "w", encoding="utf-8") as spool:
+            for record in records:
+                spool.write(json.dumps(record, default=str) + "\n")
+        return path
+
+    def _dead_letter(self, rejected):
+        with open(os.path.join(self.spool_dir, DEAD_LETTER_FILE), "a", encoding="utf-8") as dead:
+            for record, error in rejected:
+                dead.write(json.dumps({**record, "error": str(error)}, default=str) + "\n")
+        self.dead_lettered += len(rejected)
+        print(f"Moved {len(rejected)} chat history rows the database rejected to {DEAD_LETTER_FILE}: "
+              f"{rejected[-1][1]}")
+
+    def _rotate_segment(self):
+        """Close the current spool file and hand it to the flush that takes its rows"""
+        if self._spool is None:
+            return None
+        self._spool.close()
+        path = self._spool_path
+        self._spool = None
+        self._spool_path = None
+        return path
+
+    def _recover(self):
+        """Queue rows left in spool files by an exited process (or an earlier run)"""
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "*.jsonl"))):
+            # chats-<pid>-<seq>.jsonl, or recovered-<pid>-... once claimed by a worker
+            try:
+                owner = int(os.path.basename(path).split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if owner != os.getpid() and _process_alive(owner):
+                continue
+            # Claim the file so a concurrently starting worker skips it
+            claimed = os.path.join(self.spool_dir, f"recovered-{os.getpid()}-{os.path.basename(path)}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            self._load_segment(claimed)
+
+    def _load_segment(self, path):
+        rows = 0
+        with open(path, encoding="utf-8") as spool:
+            for line in spool:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed write
+                record["created_at"] = datetime.fromisoformat(record["created_at"])
+                self._queue.append(record)
+                self._pending_users[record["user_id"]] += 1
+                rows += 1
+        self._segments.append(path)
+        if rows:
+            print(f"Recovered {rows} unsaved chats from {path}")
+
+    # Queue --------------------------------------------------------------
+
+    def _ensure_started(self):
+        """Start the flush thread in this process on first use.
+
+        Started lazily rather than in create_app so a preloading server
+        master never owns the thread; each forked worker starts its own.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # State inherited from a parent process belongs to the parent
+            self._queue.clear()
+            self._pending_users.clear()
+            self._segments = []
+            self._spool = None
+            self._spool_path = None
+            self._stopped = False
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._recover()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def enqueue(self, user_id, query, response):
+        """Spool and queue one chat turn; returns immediately"""
+        self._ensure_started()
+        record = {"user_id": user_id, "query": query, "response": response, "created_at": datetime.utcnow()}
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._spool is None:
+                self._open_segment()
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._queue.append(record)
+            self._pending_users[user_id] += 1
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+
+    def has_pending(self, user_id):
+        return self._pending_users.get(user_id, 0) > 0
+
+    def flush_user(self, user_id):
+        """Read-your-writes within this process: persist queued turns before reading a user's history"""
+        self._ensure_started()
+        if self.has_pending(user_id):
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far; safe to call from any thread"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._queue:
+                    return 0
+                batch = list(self._queue)
+                self._queue.clear()
+                segment = self._rotate_segment()
+                if segment:
+                    self._segments.append(segment)
+                segments = list(self._segments)
+
+            started = time.perf_counter()
+            try:
+                self._insert(batch)
+                kept, rejected = [], []
+            except Exception as e:
+                self.failures += 1
+                print(f"Chat history flush of {len(batch)} rows failed, retrying them one by one: {e}")
+                kept, rejected = self._insert_each(batch)
+
+            if rejected:
+                self._dead_letter(rejected)
+            # kept is always the tail of the batch
+            done = len(batch) - len(kept)
+            with self._lock:
+                if kept:
+                    self._queue.extendleft(reversed(kept))
+                if not done:
+                    # Nothing could be written; the spool files stay for the next attempt
+                    return 0
+                for record in batch[:done]:
+                    self._pending_users[record["user_id"]] -= 1
+                    if self._pending_users[record["user_id"]] <= 0:
+                        del self._pending_users[record["user_id"]]
+                self._segments = [s for s in self._segments if s not in segments]
+                if kept:
+                    # Retire the old segments but keep the unsaved rows on disk
+                    self._segments.append(self._write_segment(kept))
+            for path in segments:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.rows_flushed += done - len(rejected)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return done
+
+    def _insert(self, rows):
+        """Insert rows and their analytics rollup in one transaction"""
+        with self.app.app_context():
+            try:
+                db.session.execute(ChatHistory.__table__.insert(), rows)
+                record_chat_rollups((r["query"], r["user_id"], r["created_at"]) for r in rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _insert_each(self, batch):
+        """Insert a failed batch row by row; returns (rows kept for retry, (row, error) pairs rejected)"""
+        rejected = []
+        for i, record in enumerate(batch):
+            try:
+                self._insert([record])
+            except (OperationalError, InterfaceError):
+                # The database, not the row: keep this row and the rest for the next flush
+                return batch[i:], rejected
+            except DBAPIError as e:
+                if e.connection_invalidated:
+                    return batch[i:], rejected
+                rejected.append((record, e))
+            except Exception as e:
+                rejected.append((record, e))
+        return [], rejected
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                oldest = self._queue[0]["created_at"] if self._queue else None
+                if len(self._queue) < self.batch_size:
+                    if oldest is None:
+                        timeout = self.flush_interval
+                    else:
+                        waited = (datetime.utcnow() - oldest).total_seconds()
+                        timeout = max(self.flush_interval - waited, 0)
+                    if timeout > 0:
+                        self._wakeup.wait(timeout)
+                due = len(self._queue) >= self.batch_size or (
+                    self._queue and (datetime.utcnow() - self._queue[0]["created_at"]).total_seconds()
+                    >= self.flush_interval
+                )
+            if due and not self.flush():
+                # Database unavailable: back off instead of retrying in a tight loop
+                time.sleep(self.flush_interval)
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        with self._lock:
+            if self._stopped or self._pid != os.getpid():
+                return
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._lock:
+            if self._spool is not None and not self._queue:
+                os.remove(self._rotate_segment())
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "spool_segments": len(self._segments) + (1 if self._spool is not None else 0),
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def init_chat_writer(app):
+    """Set up the write-behind queue when CHAT_WRITE_BEHIND is enabled"""
+    if not app.config.get("CHAT_WRITE_BEHIND", True):
+        return None
+    writer = ChatWriteBehind(
+        app,
+        batch_size=app.config.get("CHAT_FLUSH_BATCH_SIZE", 100),
+        flush_interval=app.config.get("CHAT_FLUSH_INTERVAL", 1.0),
+        spool_dir=app.config.get("CHAT_SPOOL_DIR", "spool"),
+        fsync=app.config.get("CHAT_SPOOL_FSYNC", False),
+    )
+    app.extensions["chat_writer"] = writer
+    return writer
+
+
+def get_chat_writer():
+    """The app's write-behind queue, or None when chats are written synchronously"""
+    return current_app.extensions.get("chat_writer")
+
+
+def flush_user_chats(user_id):
+    """Make a user's queued chats visible to the queries that follow"""
+    writer = get_chat_writer()
+    if writer is not None:
+        writer.flush_user(user_id)
@@ -0,0 +1,196 @@
+import re
+from typing import NamedTuple, Optional
+
+from app.models import Product, Offer, WarrantyInfo
+
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "ten": 10, "twelve": 12}
+_UNIT_MONTHS = {"y": 12, "m": 1}
+
+# A number must be taken whole ("20%" must not match as "2" followed by "0%")
+_NUMBER = r"(\d+(?:[.,]\d+)*)(?![\d.,])\s*(k\b)?"
+_CURRENCY = r"(?:\$|₹|rs\.?\s*|inr\s*|usd\s*)?"
+# Units that make a number something other than a price
+_NOT_PRICE = r"(?!\s*(?:%|percent|years?|yrs?|months?|mos?|gb|tb|mah|mp|hours?|hrs?|inch|\"))"
+
+_BETWEEN_RE = re.compile(
+    rf"\bbetween\s+{_CURRENCY}{_NUMBER}\s*(?:and|to|-)\s*{_CURRENCY}{_NUMBER}{_NOT_PRICE}"
+)
+_PRICE_RE = re.compile(
+    r"(?:\b(?:(?P<max>under|below|less than|cheaper than|within|up ?to|at most|no more than|max(?:imum)?)"
+    r"|(?P<min>over|above|more than|at least|starting (?:at|from)|min(?:imum)?))|(?P<op><=?|>=?))"
+    rf"\s*{_CURRENCY}{_NUMBER}{_NOT_PRICE}"
+)
+_WARRANTY_RE = re.compile(
+    r"\b(\d+|a|an|one|two|three|four|five|six|ten|twelve)(\+)?\s*-?\s*(y(?:ears?|rs?)?|m(?:onths?|os?)?)\b"
+)
+# Looked for just before a warranty length rather than as an optional prefix of it, which
+# would be tried at every position of the message
+_WARRANTY_COMPARATOR_RE = re.compile(
+    r"\b(at least|min(?:imum)?|over|more than|above|under|below|less than|at most|up ?to)\s+$"
+)
+_DISCOUNT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:%|percent\b)")
+_DISCOUNT_MAX_RE = re.compile(r"\bup ?to\s*$")
+# Word cues, matched as whole words with a space or "-" between them
+CUE_PHRASES = {
+    "in_stock": ["in stock", "available now"],
+    "cheap": ["cheap", "cheapest", "lowest price", "lowest prices", "lowest priced", "least expensive", "budget",
+              "affordable"],
+    "pricey": ["most expensive", "priciest", "highest price", "highest prices", "highest priced", "premium",
+               "high end"],
+    "warranty": ["warranty", "warranties", "guarantee"],
+}
+CUE_SEPARATOR = "[- ]"
+
+
+def _cue_pattern(phrases):
+    return "|".join(phrase.replace(" ", CUE_SEPARATOR) for phrase in phrases)
+
+
+# Found in one pass
+_CUES_RE = re.compile(
+    r"\b(?:" + "|".join(f"(?P<{cue}>{_cue_pattern(phrases)})" for cue, phrases in CUE_PHRASES.items()) + r")\b"
+)
+_IN_STOCK_RE = re.compile(rf"\b(?:{_cue_pattern(CUE_PHRASES['in_stock'])})\b")
+_DIGIT_RE = re.compile(r"\d")
+
+# The number patterns parse_constraints can be limited to
+NUMERIC_KINDS = frozenset({"price", "discount"})
+
+
+class Constraints(NamedTuple):
+    """Numeric filters stated in a message, plus the message with them removed"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: bool = False
+    min_warranty_months: Optional[int] = None
+    max_warranty_months: Optional[int] = None
+    min_discount: Optional[float] = None
+    sort: Optional[str] = None  # 'price_asc' or 'price_desc'
+    text: str = ""
+
+    @property
+    def active(self):
+        """True when any filter (not just an ordering) was requested"""
+        return any(value not in (None, False) for value in self[:6])
+
+    def to_dict(self):
+        return {field: value for field, value in zip(self._fields[:7], self[:7]) if value not in (None, False)}
+
+
+def _amount(number, thousands):
+    value = float(number.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+def _months(count, unit):
+    count = _NUMBER_WORDS.get(count) or int(count)
+    return count * _UNIT_MONTHS[unit[0]]
+
+
+def parse_warranty_months(period):
+    """Warranty length in months from text such as '1 Year' or '6 Months'; None if not stated"""
+    match = _WARRANTY_RE.search(str(period or "").lower())
+    return _months(match.group(1), match.group(3)) if match else None
+
+
+def parse_constraints(message, kinds=NUMERIC_KINDS, cues=None):
+    """Extract price, stock, warranty and discount constraints from a message.
+
+    "under $500", "between 200 and 400", "in stock", "at least 2 years
+    warranty" and "20% off" become range bounds; "cheapest"/"most
+    expensive" become a price ordering. Warranty lengths only count when the
+    message talks about a warranty. `text` is the message without the
+    matched phrases, for keyword search.
+
+    Callers that have already scanned the message (utils.intent_engine)
+    pass the word cues of CUE_PHRASES it contains as `cues`, and as `kinds`
+    only the number patterns ("price", "discount") it has cue words for.
+    """
+    text = message.lower()
+    found = {}
+    spans = []
+
+    if cues is None:
+        cues = {match.lastgroup for match in _CUES_RE.finditer(text)}
+
+    # Prices and percentages need a digit; most messages have none
+    if kinds and _DIGIT_RE.search(text):
+        if "price" in kinds:
+            if "between" in text:
+                for match in _BETWEEN_RE.finditer(text):
+                    low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+                    found["min_price"], found["max_price"] = min(low, high), max(low, high)
+                    spans.append(match.span())
+            if "max_price" not in found:
+                for match in _PRICE_RE.finditer(text):
+                    amount = _amount(*match.group(4, 5))
+                    is_max = match.group("max") or (match.group("op") or "").startswith("<")
+                    found["max_price" if is_max else "min_price"] = amount
+                    spans.append(match.span())
+
+        if "discount" in kinds and ("%" in text or "percent" in text):
+            for match in _DISCOUNT_RE.finditer(text):
+                before = text[max(0, match.start() - 16):match.start()]
+                # "up to 20% off" sets no lower bound
+                if not _DISCOUNT_MAX_RE.search(before):
+                    found["min_discount"] = float(match.group(1))
+                spans.append(match.span())
+
+    if "warranty" in cues:
+        for match in _WARRANTY_RE.finditer(text):
+            count, plus, unit = match.groups()
+            start = match.start()
+            before = _WARRANTY_COMPARATOR_RE.search(text, max(0, start - 20), start)
+            comparator = before.group(1) if before else None
+            months = _months(count, unit)
+            if plus or comparator in ("at least", "min", "minimum"):
+                found["min_warranty_months"] = months
+            elif comparator in ("over", "more than", "above"):
+                found["min_warranty_months"] = months + 1
+            elif comparator in ("under", "below", "less than"):
+                found["max_warranty_months"] = months - 1
+            elif comparator in ("at most", "up to", "upto"):
+                found["max_warranty_months"] = months
+            else:
+                found["min_warranty_months"] = found["max_warranty_months"] = months
+            spans.append((before.start() if before else start, match.end()))
+
+    if "in_stock" in cues:
+        found["in_stock"] = True
+        match = _IN_STOCK_RE.search(text)
+        if match:
+            spans.append(match.span())
+    if "cheap" in cues:
+        found["sort"] = "price_asc"
+    elif "pricey" in cues:
+        found["sort"] = "price_desc"
+
+    if spans:
+        parts, last = [], 0
+        for start, end in sorted(spans):
+            parts.append(text[last:max(start, last)])
+            last = max(last, end)
+        parts.append(text[last:])
+        text = "".join(parts)
+    return Constraints(text=" ".join(text.split()), **found)
+
+
+def constraint_filters(constraints):
+    """SQL predicates on Product for the constraints; each maps to an indexed range scan"""
+    filters = []
+    if constraints.min_price is not None:
+        filters.append(Product.price >= constraints.min_price)
+    if constraints.max_price is not None:
+        filters.append(Product.price <= constraints.max_price)
+    if constraints.in_stock:
+        filters.append(Product.stock > 0)
+    months = []
+    if constraints.min_warranty_months is not None:
+        months.append(WarrantyInfo.warranty_months >= constraints.min_warranty_months)
+    if constraints.max_warranty_months is not None:
+        months.append(WarrantyInfo.warranty_months <= constraints.max_warranty_months)
+    if months:
+        filters.append(Product.warranties.any(*months))
+    if constraints.min_discount is not None:
+        filters.append(Product.offers.any(Offer.discount_percentage >= constraints.min_discount))
+    return filters
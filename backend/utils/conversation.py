@@ -0,0 +1,305 @@
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import NamedTuple
+
+from flask import current_app
+
+from .auth import ExpiringLRU
+
+# Where a pronoun stands in for a product: opening the message, possibly after a
+# question word or auxiliary ("is it ...", "what about its ...", "which of them ..."),
+# or as the object that ends it ("... offers on them?")
+_LEAD = (
+    r"^(?:(?:and|also|so|ok|okay|then|but)\W+)?"
+    r"(?:(?:what|how|which|where|when|why)(?:'s|\s+much|\s+long|\s+many)?(?:\s+(?:is|are|does|do|about|of))?\s+"
+    r"|(?:is|are|does|do|did|can|could|will|would|has|have|should)\s+)?"
+)
+_OBJECT = r"\b(?:on|for|of|about|with|between|compare|buy|get|order|recommend|choose|pick)\s+"
+_END = r"\s*[?.!]*$"
+
+# Phrases that point back at products from an earlier turn, by kind. A bare "this",
+# "that" or "it" elsewhere ("offers this week", "anything that costs ...") is not one.
+_REFERENCES = {
+    "ordinal": re.compile(r"\b(?:the\s+)?(first|second|third|fourth|fifth|last)\s+one\b"),
+    "one": re.compile(
+        r"\b(?:this|that)\s+one\b"
+        r"|" + _LEAD + r"(?:it|its|it's)\b(?!\s+(?:possible|ok|okay|true|necessary|fine)\b)"
+        r"|" + _OBJECT + r"it" + _END
+    ),
+    "many": re.compile(
+        r"\bboth\b"
+        r"|" + _LEAD + r"(?:they|them|their|these|those)\b"
+        r"|" + _OBJECT + r"(?:them|these|those)" + _END
+    ),
+    "continue": re.compile(r"^(?:and|also|what about|how about)\b"),
+}
+_ORDINALS = {"first": 0, "second": 1, "third": 2, "fourth": 3, "fifth": 4, "last": -1}
+
+# Longest stored message excerpt, and how many entities the summary keeps per kind
+MESSAGE_EXCERPT_CHARS = 80
+SUMMARY_ITEMS = 8
+
+
+class Turn(NamedTuple):
+    """What one chat turn was about: a message excerpt and the entities it resolved"""
+    message: str
+    intents: tuple
+    product_ids: tuple
+    brands: tuple
+    categories: tuple
+    narrowed: bool = False  # a follow-up that picked one product out of an earlier list
+
+
+def _remember(recent, items, limit):
+    """Move items to the newest end of an ordered set capped at `limit` entries"""
+    for item in items:
+        recent.pop(item, None)
+        recent[item] = None
+    while len(recent) > limit:
+        recent.popitem(last=False)
+
+
+class Conversation:
+    """One user's last `max_turns` turns, with older turns folded into a summary.
+
+    The summary only keeps counts and the most recent few brands, categories
+    and product ids, so neither memory use nor the prompt text it renders
+    grows with the length of the conversation.
+    """
+
+    def __init__(self, max_turns=5):
+        self.turns = deque()
+        self.max_turns = max_turns
+        self.older_turns = 0
+        self.older_intents = Counter()
+        self.older_brands = OrderedDict()
+        self.older_categories = OrderedDict()
+        self.older_products = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, turn):
+        with self._lock:
+            self.turns.append(turn)
+            while len(self.turns) > self.max_turns:
+                self._roll_up(self.turns.popleft())
+
+    def _roll_up(self, turn):
+        self.older_turns += 1
+        self.older_intents.update(turn.intents)
+        _remember(self.older_brands, turn.brands, SUMMARY_ITEMS)
+        _remember(self.older_categories, turn.categories, SUMMARY_ITEMS)
+        _remember(self.older_products, turn.product_ids, SUMMARY_ITEMS)
+
+    def to_dict(self):
+        """JSON-serializable state, for stores outside the process"""
+        with self._lock:
+            return {
+                "turns": [list(turn) for turn in self.turns],
+                "older_turns": self.older_turns,
+                "older_intents": dict(self.older_intents),
+                "older_brands": list(self.older_brands),
+                "older_categories": list(self.older_categories),
+                "older_products": list(self.older_products),
+            }
+
+    @classmethod
+    def from_dict(cls, data, max_turns=5):
+        conversation = cls(max_turns)
+        conversation.turns.extend(Turn(message, tuple(intents), tuple(product_ids), tuple(brands),
+                                       tuple(categories), narrowed)
+                                  for message, intents, product_ids, brands, categories, narrowed in data["turns"])
+        conversation.older_turns = data["older_turns"]
+        conversation.older_intents.update(data["older_intents"])
+        for name in ("older_brands", "older_categories", "older_products"):
+            _remember(getattr(conversation, name), data[name], SUMMARY_ITEMS)
+        return conversation
+
+    def last_product_ids(self, skip_narrowed=False):
+        """Product ids of the most recent turn that resolved any"""
+        with self._lock:
+            for turn in reversed(self.turns):
+                if turn.product_ids and not (skip_narrowed and turn.narrowed):
+                    return list(turn.product_ids)
+        return []
+
+    def summary(self):
+        """Short text describing the conversation so far, for the prompt"""
+        with self._lock:
+            parts = []
+            if self.older_turns:
+                older = f"{self.older_turns} earlier turns"
+                if self.older_intents:
+                    older += " about " + ", ".join(i for i, _ in self.older_intents.most_common(3))
+                for label, items in (("brands", self.older_brands), ("categories", self.older_categories),
+                                     ("products", self.older_products)):
+                    if items:
+                        older += f"; {label} " + ", ".join(str(i) for i in reversed(items))
+                parts.append(older)
+            for turn in self.turns:
+                line = f'"{turn.message}"'
+                if turn.product_ids:
+                    line += " -> products " + ", ".join(str(pid) for pid in turn.product_ids)
+                parts.append(line)
+            return " | ".join(parts)
+
+
+def referenced_product_ids(message, analysis, conversation):
+    """Earlier products a follow-up message refers to, and whether it singles one out.
+
+    A message counts as a follow-up when it names no product, brand,
+    category or model of its own but refers back to one ("is it ...",
+    "offers on them?", "the second one", "both") or opens as a continuation
+    ("what about ..."). Pronouns only count where they stand in for a
+    product: leading the message or ending it as an object. "It" means
+    the product last talked about; "them" and "the second one" point into
+    the last list of results, even after a turn about just one of them.
+    Returns ([], False) for a new question.
+    """
+    if conversation is None:
+        return [], False
+    if analysis.product_id is not None or analysis.brands or analysis.categories or analysis.has_model:
+        return [], False
+    text = message.lower().strip()
+    references = {kind: match for kind, pattern in _REFERENCES.items() if (match := pattern.search(text))}
+    if not references:
+        return [], False
+    # The most specific reference wins: "what about the second one?" means one product
+    if "ordinal" in references:
+        ids = conversation.last_product_ids(skip_narrowed=True)
+        position = _ORDINALS[references["ordinal"].group(1)]
+        return (ids[position:][:1] if position < len(ids) else []), True
+    if "one" in references:
+        return conversation.last_product_ids()[:1], True
+    return conversation.last_product_ids(skip_narrowed=True), False
+
+
+def _turn(message, intents, product_ids, brands, categories, narrowed):
+    return Turn(
+        message=message[:MESSAGE_EXCERPT_CHARS],
+        intents=tuple(intents),
+        product_ids=tuple(product_ids),
+        brands=tuple(brands),
+        categories=tuple(categories),
+        narrowed=narrowed,
+    )
+
+
+class ConversationStore:
+    """Per-user conversation memory, evicted after `ttl` seconds idle and capped at `max_users`.
+
+    Kept in the process, so with several workers a follow-up served by
+    another worker than the earlier turns does not see them; use
+    RedisConversationStore there.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_turns=5, ttl=1800, max_users=10000):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._conversations = ExpiringLRU(max_entries=max_users)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """The user's live conversation, or None when there is none"""
+        return self._conversations.get(user_id)
+
+    def record(self, user_id, message, intents, product_ids, brands=(), categories=(), narrowed=False):
+        """Append a turn to the user's conversation, starting one if needed"""
+        with self._lock:
+            conversation = self._conversations.get(user_id) or Conversation(self.max_turns)
+            self._conversations.set(user_id, conversation, time.time() + self.ttl)
+        conversation.add(_turn(message, intents, product_ids, brands, categories, narrowed))
+
+    def forget(self, user_id):
+        self._conversations.pop(user_id)
+
+    def stats(self):
+        return {"store": self.name, "max_turns": self.max_turns, "ttl": self.ttl, **self._conversations.stats()}
+
+
+class RedisConversationStore:
+    """Per-user conversation memory in Redis, shared by every worker and host using the same server.
+
+    Each conversation is one JSON value that expires after `ttl` seconds
+    idle. A turn is recorded by reading, extending and writing it back, so
+    of two turns of one user handled at the same moment one can be lost.
+    If the store fails the turn is treated as the start of a conversation.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, max_turns=5, ttl=1800, prefix="conversation:"):
+        self.client = client
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.store_errors = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=0.25), **kwargs)
+
+    def get(self, user_id):
+        """The user's live conversation, or None when there is none"""
+        try:
+            data = self.client.get(f"{self.prefix}{user_id}")
+        except Exception as e:
+            self.store_errors += 1
+            current_app.logger.warning("conversation store unavailable: %s", e)
+            return None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Conversation.from_dict(json.loads(data), self.max_turns)
+
+    def record(self, user_id, message, intents, product_ids, brands=(), categories=(), narrowed=False):
+        """Append a turn to the user's conversation, starting one if needed"""
+        conversation = self.get(user_id) or Conversation(self.max_turns)
+        conversation.add(_turn(message, intents, product_ids, brands, categories, narrowed))
+        try:
+            self.client.set(f"{self.prefix}{user_id}", json.dumps(conversation.to_dict()), ex=self.ttl)
+        except Exception as e:
+            self.store_errors += 1
+            current_app.logger.warning("conversation store unavailable: %s", e)
+
+    def forget(self, user_id):
+        self.client.delete(f"{self.prefix}{user_id}")
+
+    def stats(self):
+        return {"store": self.name, "max_turns": self.max_turns, "ttl": self.ttl, "hits": self.hits,
+                "misses": self.misses, "store_errors": self.store_errors}
+
+
+def create_conversation_store(config):
+    """Redis conversations when CONVERSATION_STORAGE_URL is set, otherwise in-process ones"""
+    max_turns = config.get("CONVERSATION_TURNS", 5)
+    ttl = config.get("CONVERSATION_TTL", 1800)
+    url = config.get("CONVERSATION_STORAGE_URL")
+    if url:
+        try:
+            return RedisConversationStore.from_url(url, max_turns=max_turns, ttl=ttl)
+        except Exception as e:
+            print(f"Could not use conversation store {url!r}, using in-process memory: {e}")
+    return ConversationStore(max_turns=max_turns, ttl=ttl, max_users=config.get("CONVERSATION_MAX_USERS", 10000))
+
+
+def init_conversation_store(app):
+    """Set up conversation memory when CONVERSATION_MEMORY is enabled"""
+    if not app.config.get("CONVERSATION_MEMORY", True):
+        return None
+    store = create_conversation_store(app.config)
+    app.extensions["conversations"] = store
+    return store
+
+
+def get_conversation_store():
+    """The app's conversation memory, or None when every chat turn stands alone"""
+    return current_app.extensions.get("conversations")
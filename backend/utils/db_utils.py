@@ -1,66 +1,369 @@
+import io
+import json
+import time
 import pandas as pd
+from flask import current_app
+from sqlalchemy import Integer, Numeric, text, select, bindparam, inspect, update
 from app import db
 from app.models import Product, Offer, WarrantyInfo
-import json
+from .search_index import product_index, get_product_index
+from .response_cache import get_response_cache
+from .catalog import invalidate_catalog
+from .constraints import parse_warranty_months
+
+
+def _parse_specs(value):
+    if isinstance(value, str) and value.strip():
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {}
+    return {}
+
+
+def _optional(series):
+    """Replace NaN with None so nullable columns are stored as NULL"""
+    return series.astype(object).where(series.notna(), None)
+
+
+def _prepare_products(df):
+    df = df.assign(
+        id=pd.to_numeric(df['id'], errors='coerce'),
+        price=pd.to_numeric(df['price'], errors='coerce').fillna(0.0),
+        stock=pd.to_numeric(df['stock'], errors='coerce').fillna(0),
+    )
+    df = df[df['id'].notna() & df['name'].notna()]
+    return pd.DataFrame({
+        'id': df['id'].astype('int64'),
+        'name': df['name'].astype(str),
+        'category': _optional(df['category']) if 'category' in df else None,
+        'price': df['price'].astype(float),
+        'description': _optional(df['description']) if 'description' in df else None,
+        'specs': df['specs'].map(_parse_specs) if 'specs' in df else [{}] * len(df),
+        'stock': df['stock'].astype('int64'),
+    })
+
+
+def _prepare_offers(df):
+    df = df.assign(
+        id=pd.to_numeric(df['id'], errors='coerce'),
+        product_id=pd.to_numeric(df['product_id'], errors='coerce'),
+        discount_percentage=pd.to_numeric(df['discount_percentage'], errors='coerce').fillna(0.0),
+        valid_till=pd.to_datetime(df['valid_till'], errors='coerce'),
+    )
+    df = df[df['id'].notna() & df['product_id'].notna() & df['valid_till'].notna()]
+    return pd.DataFrame({
+        'id': df['id'].astype('int64'),
+        'product_id': df['product_id'].astype('int64'),
+        'discount_percentage': df['discount_percentage'].astype(float),
+        'coupon_code': df['coupon_code'].fillna('').astype(str) if 'coupon_code' in df else '',
+        'valid_till': df['valid_till'].dt.date,
+    })
+
+
+def _prepare_warranty(df):
+    df = df.assign(
+        id=pd.to_numeric(df['id'], errors='coerce'),
+        product_id=pd.to_numeric(df['product_id'], errors='coerce'),
+    )
+    df = df[df['id'].notna() & df['product_id'].notna() & df['warranty_period'].notna()]
+    return pd.DataFrame({
+        'id': df['id'].astype('int64'),
+        'product_id': df['product_id'].astype('int64'),
+        'warranty_period': df['warranty_period'].astype(str),
+        'claim_process': _optional(df['claim_process']) if 'claim_process' in df else None,
+        'warranty_months': pd.Series(
+            [parse_warranty_months(period) for period in df['warranty_period']], index=df.index, dtype=object
+        ),
+    })
+
+
+def _copy_rows(table, df):
+    """Stream a prepared chunk into PostgreSQL with COPY on the session's connection"""
+    if 'specs' in df:
+        df = df.assign(specs=df['specs'].map(json.dumps))
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(df.columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(table, df):
+    """Multi-row Core insert of a prepared chunk"""
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    db.session.execute(table.insert(), records)
+
+
+def _ingest(path, table, prepare, chunksize):
+    """Read a CSV in chunks, validate each chunk column-wise and bulk load it"""
+    use_copy = db.engine.dialect.name == 'postgresql'
+    rows = 0
+    skipped = 0
+    started = time.perf_counter()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        prepared = prepare(chunk)
+        skipped += len(chunk) - len(prepared)
+        if prepared.empty:
+            continue
+        if use_copy:
+            _copy_rows(table, prepared)
+        else:
+            _insert_rows(table, prepared)
+        rows += len(prepared)
+    seconds = time.perf_counter() - started
+    if use_copy:
+        # Explicit ids bypass the serial sequence; move it past the loaded rows
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+        ))
+    return {
+        'rows': rows,
+        'skipped': skipped,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds) if seconds > 0 else rows,
+    }
+
+
+def ensure_catalog_schema():
+    """Bring a database created by an older version up to date.
+
+    db.create_all() only creates missing tables and the migrations directory
+    is not tracked, so this runs at startup. It adds warranty_info.warranty_months
+    and fills it in, one UPDATE per distinct warranty_period, then creates any
+    index declared on the models that an existing table lacks. Returns True
+    when the column was added.
+    """
+    inspector = inspect(db.engine)
+    existing = [table for table in db.metadata.sorted_tables if inspector.has_table(table.name)]
+    added = (WarrantyInfo.__table__ in existing and "warranty_months" not in
+             {column["name"] for column in inspector.get_columns(WarrantyInfo.__tablename__)})
+
+    if added:
+        table = WarrantyInfo.__table__
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN warranty_months INTEGER"))
+            periods = conn.execute(select(table.c.warranty_period).distinct()).scalars().all()
+            for period in periods:
+                months = parse_warranty_months(period)
+                if months is not None:
+                    conn.execute(update(table).where(table.c.warranty_period == period).values(warranty_months=months))
+        print(f"Added warranty_info.warranty_months and filled it for {len(periods)} warranty periods")
+
+    with db.engine.begin() as conn:
+        for table in existing:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    return added
+
+
+def load_csv_to_db(products_csv, offers_csv, warranty_csv, chunksize=None):
+    """Load CSV files into the database. Existing records for these tables are removed first.
+
+    Files are streamed in chunks of `chunksize` rows (CSV_CHUNK_SIZE by
+    default), parsed and validated column-wise with pandas, and written with
+    multi-row inserts, or COPY on PostgreSQL. Rows missing required values are
+    skipped. Returns per-table row counts and rows/sec.
+    """
+    chunksize = chunksize or current_app.config.get("CSV_CHUNK_SIZE", 10000)
 
-def load_csv_to_db(products_csv, offers_csv, warranty_csv):
-    """Load CSV files into the database. Existing records for these tables are removed first."""
     # Remove existing
     Offer.query.delete()
     WarrantyInfo.query.delete()
     Product.query.delete()
     db.session.commit()
 
-    # Load Products
-    df_products = pd.read_csv(products_csv)
-    for _, row in df_products.iterrows():
-        specs = row.get('specs')
-        try:
-            specs_parsed = json.loads(specs) if isinstance(specs, str) and specs.strip() else {}
-        except Exception:
-            specs_parsed = {}
-        p = Product(
-            id=int(row['id']),
-            name=row['name'],
-            category=row.get('category'),
-            price=float(row.get('price') or 0.0),
-            description=row.get('description'),
-            specs=specs_parsed,
-            stock=int(row.get('stock') or 0)
-        )
-        db.session.add(p)
-    
-    # Commit products first to satisfy foreign key constraints
-    db.session.commit()
+    stats = {'products': _ingest(products_csv, Product.__table__, _prepare_products, chunksize)}
 
     # Load Offers
     try:
-        df_off = pd.read_csv(offers_csv)
-        for _, row in df_off.iterrows():
-            offer = Offer(
-                id=int(row['id']),
-                product_id=int(row['product_id']),
-                discount_percentage=float(row.get('discount_percentage') or 0),
-                coupon_code=row.get('coupon_code'),
-                valid_till=row.get('valid_till')
-            )
-            db.session.add(offer)
+        stats['offers'] = _ingest(offers_csv, Offer.__table__, _prepare_offers, chunksize)
     except FileNotFoundError:
         pass
 
     # Load Warranty
     try:
-        df_w = pd.read_csv(warranty_csv)
-        for _, row in df_w.iterrows():
-            w = WarrantyInfo(
-                id=int(row['id']),
-                product_id=int(row['product_id']),
-                warranty_period=row.get('warranty_period'),
-                claim_process=row.get('claim_process')
-            )
-            db.session.add(w)
+        stats['warranty'] = _ingest(warranty_csv, WarrantyInfo.__table__, _prepare_warranty, chunksize)
     except FileNotFoundError:
         pass
 
     db.session.commit()
-    print("CSV data loaded.")
\ No newline at end of file
+
+    # Reload the catalog snapshot and rebuild the search index from it
+    invalidate_catalog()
+    product_index.ready = False
+    get_product_index()
+    get_response_cache().clear()
+    for table, table_stats in stats.items():
+        print(f"Loaded {table_stats['rows']} {table} rows ({table_stats['rows_per_sec']} rows/sec, "
+              f"{table_stats['skipped']} skipped)")
+    print("CSV data loaded.")
+    return stats
+
+
+def _canonical_column(series, column_type):
+    """Column as strings that compare equal whether read from the CSV or the database.
+
+    A NULL turns an integer column read back from the database into floats
+    (12 -> 12.0) and missing values come back as None rather than NaN, so
+    numbers go through nullable dtypes and every missing value prints as <NA>.
+    """
+    if isinstance(column_type, Integer):
+        return pd.to_numeric(series, errors='coerce').astype('Int64').astype(str)
+    if isinstance(column_type, Numeric):
+        return pd.to_numeric(series, errors='coerce').astype('Float64').astype(str)
+    return series.astype(object).where(series.notna(), pd.NA).astype(str)
+
+
+def _row_hashes(df, table):
+    """Content hash per row of a prepared frame, as {id: hash}"""
+    canonical = pd.DataFrame({
+        column: df[column].map(lambda v: json.dumps(v or {}, sort_keys=True)) if column == 'specs'
+        else _canonical_column(df[column], table.c[column].type)
+        for column in df.columns if column != 'id'
+    })
+    hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return dict(zip(df['id'].tolist(), hashes.tolist()))
+
+
+def _current_hashes(table, prepare_columns):
+    """Content hashes of the rows already in the table, computed like the incoming ones"""
+    columns = [table.c[name] for name in prepare_columns]
+    rows = db.session.execute(select(*columns)).all()
+    if not rows:
+        return {}
+    current = pd.DataFrame(rows, columns=prepare_columns)
+    if 'valid_till' in current:
+        current['valid_till'] = pd.to_datetime(current['valid_till']).dt.date
+    return _row_hashes(current, table)
+
+
+def _sync_table(path, table, prepare, chunksize, changed_product_ids):
+    """Apply only the inserts, updates and deletes needed to match the CSV.
+
+    Returns the per-table summary and the ids to delete, which the caller
+    removes once dependent tables are in sync.
+    """
+    columns = [column.name for column in table.columns]
+    current = _current_hashes(table, columns)
+    seen = set()
+    summary = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0}
+    # Bind names are prefixed because SQLAlchemy reserves plain column names
+    update = table.update().where(table.c.id == bindparam('_id')).values(
+        {name: bindparam(f'_{name}') for name in columns if name != 'id'}
+    )
+
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        prepared = prepare(chunk).drop_duplicates('id', keep='last')
+        summary['skipped'] += len(chunk) - len(prepared)
+        if prepared.empty:
+            continue
+        hashes = _row_hashes(prepared, table)
+        is_new = []
+        is_changed = []
+        repeated = 0
+        for row_id, row_hash in hashes.items():
+            known = current.get(row_id)
+            is_new.append(known is None)
+            is_changed.append(known is not None and known != row_hash)
+            # A copy of a row from an earlier chunk; a different one is applied as an update
+            repeated += known == row_hash and row_id in seen
+        seen.update(hashes)
+        # Later chunks compare against what this one wrote
+        current.update(hashes)
+        summary['skipped'] += repeated
+        summary['unchanged'] += len(is_new) - sum(is_new) - sum(is_changed) - repeated
+
+        inserts = prepared[is_new]
+        if not inserts.empty:
+            _insert_rows(table, inserts)
+            summary['inserted'] += len(inserts)
+        updates = prepared[is_changed]
+        if not updates.empty:
+            records = updates.astype(object).where(updates.notna(), None).to_dict('records')
+            db.session.execute(update, [{f'_{k}': v for k, v in record.items()} for record in records])
+            summary['updated'] += len(updates)
+
+        key = 'id' if table.name == Product.__tablename__ else 'product_id'
+        changed_product_ids.update(inserts[key].tolist())
+        changed_product_ids.update(updates[key].tolist())
+
+    stale_ids = [row_id for row_id in current if row_id not in seen]
+    summary['deleted'] = len(stale_ids)
+    return summary, stale_ids
+
+
+def _delete_rows(table, ids, changed_product_ids, batch_size=1000):
+    key = table.c.id if table.name == Product.__tablename__ else table.c.product_id
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        changed_product_ids.update(
+            db.session.execute(select(key).where(table.c.id.in_(batch))).scalars()
+        )
+        db.session.execute(table.delete().where(table.c.id.in_(batch)))
+
+
+def _refresh_index(product_ids):
+    """Re-index only the products touched by a sync"""
+    if not product_index.ready:
+        return
+    ids = list(product_ids)
+    found = set()
+    for start in range(0, len(ids), 1000):
+        for product in Product.query.filter(Product.id.in_(ids[start:start + 1000])):
+            product_index.add(product)
+            found.add(product.id)
+    for product_id in product_ids - found:
+        product_index.remove(product_id)
+
+def sync_csv_to_db(products_csv, offers_csv, warranty_csv, chunksize=None):
+    """Incrementally sync the catalog tables with the CSV files.
+
+    Each incoming row is compared with the stored one by content hash and only
+    inserts, updates and deletes are written, all in one transaction, so the
+    catalog is never empty mid-refresh and the cost follows the size of the
+    change. Returns a per-table summary of the changes.
+    """
+    chunksize = chunksize or current_app.config.get("CSV_CHUNK_SIZE", 10000)
+    changed_product_ids = set()
+    summary = {}
+
+    try:
+        # Products first so new offers/warranties can reference them
+        summary['products'], stale_products = _sync_table(
+            products_csv, Product.__table__, _prepare_products, chunksize, changed_product_ids)
+
+        stale = {}
+        for name, path, table, prepare in (
+            ('offers', offers_csv, Offer.__table__, _prepare_offers),
+            ('warranty', warranty_csv, WarrantyInfo.__table__, _prepare_warranty),
+        ):
+            try:
+                summary[name], stale[name] = _sync_table(path, table, prepare, chunksize, changed_product_ids)
+            except FileNotFoundError:
+                pass
+
+        # Delete dependents before the products they reference
+        if 'offers' in stale:
+            _delete_rows(Offer.__table__, stale['offers'], changed_product_ids)
+        if 'warranty' in stale:
+            _delete_rows(WarrantyInfo.__table__, stale['warranty'], changed_product_ids)
+        _delete_rows(Product.__table__, stale_products, changed_product_ids)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if changed_product_ids:
+        invalidate_catalog()
+        _refresh_index(changed_product_ids)
+        get_response_cache().invalidate_products(changed_product_ids)
+    print(f"CSV sync applied: {summary}")
+    return summary
+
@@ -0,0 +1,52 @@
+from sqlalchemy.orm import joinedload
+from app.models import Product, Offer, WarrantyInfo
+
+
+def product_fact_options(intents):
+    """Eager-load options so one product query also returns the offers and warranties the intents need"""
+    options = []
+    if 'offer' in intents:
+        options.append(joinedload(Product.offers))
+    if 'warranty' in intents:
+        options.append(joinedload(Product.warranties))
+    return options
+
+
+def related_facts(intents, products, catalog=None):
+    """Build warranty and offer facts for a chat turn.
+
+    When products were found their offers and warranties are read from the
+    eager-loaded relationships (or the catalog snapshot rows), so no further
+    queries are issued. Without products we fall back to a general listing,
+    taken from the catalog snapshot when given or else loaded in one query.
+    """
+    facts = {}
+
+    if 'warranty' in intents:
+        if products:
+            facts["warranty"] = [w.to_dict() for p in products for w in p.warranties]
+        else:
+            # General warranty query without specific products
+            warranties = catalog.warranties[:5] if catalog is not None else WarrantyInfo.query.limit(5).all()
+            facts["warranty"] = [w.to_dict() for w in warranties]
+
+    if 'offer' in intents:
+        if products:
+            facts["offers"] = [o.to_dict() for p in products for o in p.offers]
+            # Include product details for offers
+            facts["offer_products"] = [p.to_dict() for p in products]
+        elif catalog is not None:
+            # General offer query without specific products
+            offers = catalog.offers[:5]
+            facts["offers"] = [o.to_dict() for o in offers]
+            offer_products = {o.product_id: catalog.products_by_id[o.product_id]
+                              for o in offers if o.product_id in catalog.products_by_id}
+            facts["offer_products"] = [p.to_dict() for p in offer_products.values()]
+        else:
+            # General offer query: load the offers together with their products
+            offers = Offer.query.options(joinedload(Offer.product)).limit(5).all()
+            facts["offers"] = [o.to_dict() for o in offers]
+            offer_products = {o.product.id: o.product for o in offers if o.product}
+            facts["offer_products"] = [p.to_dict() for p in offer_products.values()]
+
+    return facts
@@ -0,0 +1,166 @@
+import re
+import threading
+from sqlalchemy import select, func, cast, Float, or_, and_, text, literal_column
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.models import ChatHistory
+from .pagination import encode_cursor, decode_cursor
+
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+SNIPPET_START = "<mark>"
+SNIPPET_STOP = "</mark>"
+
+# SQLite keeps an external-content FTS5 table in sync with chat_history via triggers
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_history_fts USING fts5("
+    "query, response, content='chat_history', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS chat_history_fts_ai AFTER INSERT ON chat_history BEGIN "
+    "INSERT INTO chat_history_fts(rowid, query, response) VALUES (new.id, new.query, new.response); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_history_fts_ad AFTER DELETE ON chat_history BEGIN "
+    "INSERT INTO chat_history_fts(chat_history_fts, rowid, query, response) "
+    "VALUES ('delete', old.id, old.query, old.response); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_history_fts_au AFTER UPDATE ON chat_history BEGIN "
+    "INSERT INTO chat_history_fts(chat_history_fts, rowid, query, response) "
+    "VALUES ('delete', old.id, old.query, old.response); "
+    "INSERT INTO chat_history_fts(rowid, query, response) VALUES (new.id, new.query, new.response); END",
+]
+
+_lock = threading.Lock()
+_engine_modes = {}
+
+
+def search_terms(query):
+    """Alphanumeric terms of a search string; anything else is dropped so it can't break the query syntax"""
+    return list(dict.fromkeys(SEARCH_TOKEN_RE.findall(query.lower())))
+
+
+def ensure_search_index():
+    """Create the full-text index for the current database if missing.
+
+    PostgreSQL gets the GIN expression index declared on ChatHistory; SQLite
+    gets the FTS5 table and triggers, populated from existing chats when it
+    is first created. Runs once per engine and returns the search mode:
+    'postgresql', 'sqlite', or 'fallback' when neither is available.
+    """
+    engine = db.engine
+    mode = _engine_modes.get(engine.url)
+    if mode is not None:
+        return mode
+    with _lock:
+        mode = _engine_modes.get(engine.url)
+        if mode is None:
+            mode = engine.dialect.name
+            try:
+                with engine.begin() as conn:
+                    if mode == "postgresql":
+                        for index in ChatHistory.__table__.indexes:
+                            if index.name == "ix_chat_history_fts":
+                                index.create(conn, checkfirst=True)
+                    elif mode == "sqlite":
+                        existed = conn.execute(text(
+                            "SELECT 1 FROM sqlite_master WHERE name = 'chat_history_fts'"
+                        )).first()
+                        for statement in SQLITE_FTS_DDL:
+                            conn.execute(text(statement))
+                        if not existed:
+                            conn.execute(text("INSERT INTO chat_history_fts(chat_history_fts) VALUES ('rebuild')"))
+                    else:
+                        mode = "fallback"
+            except OperationalError as e:
+                # e.g. SQLite built without FTS5
+                print(f"Full-text history search unavailable, using unindexed search: {e}")
+                mode = "fallback"
+            _engine_modes[engine.url] = mode
+    return mode
+
+
+def _postgres_search(user_id, terms, position, limit):
+    # Any term may match; the last one also as a prefix for search-as-you-type
+    tsquery = func.to_tsquery(literal_column("'english'"), " | ".join(terms[:-1] + [terms[-1] + ":*"]))
+    vector = ChatHistory.search_vector()
+    rank = cast(func.ts_rank_cd(vector, tsquery), Float)
+
+    ranked = select(ChatHistory.id, rank.label("rank"))\
+        .where(ChatHistory.user_id == user_id, vector.op("@@")(tsquery))
+    if position:
+        ranked = ranked.where(or_(rank < position["rank"], and_(rank == position["rank"], ChatHistory.id < position["id"])))
+    ranked = ranked.order_by(rank.desc(), ChatHistory.id.desc()).limit(limit + 1).subquery()
+
+    # Headlines are only computed for the rows of the page
+    headline = func.ts_headline(
+        literal_column("'english'"), ChatHistory.query + literal_column("' '") + ChatHistory.response, tsquery,
+        f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords=30, MinWords=10"
+    )
+    return db.session.execute(
+        select(ChatHistory, ranked.c.rank, headline)
+        .join(ranked, ranked.c.id == ChatHistory.id)
+        .order_by(ranked.c.rank.desc(), ChatHistory.id.desc())
+    ).all()
+
+
+def _sqlite_search(user_id, terms, position, limit):
+    match = " OR ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+    # bm25() is lower-is-better; the ranked rows are paged in an outer query
+    sql = (
+        "SELECT id, rank, snippet FROM ("
+        "  SELECT c.id AS id, bm25(chat_history_fts) AS rank,"
+        "         snippet(chat_history_fts, -1, :start, :stop, '...', 16) AS snippet"
+        "  FROM chat_history_fts JOIN chat_history c ON c.id = chat_history_fts.rowid"
+        "  WHERE chat_history_fts MATCH :match AND c.user_id = :user_id"
+        ")"
+    )
+    params = {"match": match, "user_id": user_id, "start": SNIPPET_START, "stop": SNIPPET_STOP, "limit": limit + 1}
+    if position:
+        sql += " WHERE rank > :rank OR (rank = :rank AND id < :id)"
+        params.update(rank=position["rank"], id=position["id"])
+    sql += " ORDER BY rank, id DESC LIMIT :limit"
+    hits = db.session.execute(text(sql), params).all()
+
+    chats = {chat.id: chat for chat in db.session.query(ChatHistory).filter(ChatHistory.id.in_([h.id for h in hits]))}
+    return [(chats[h.id], h.rank, h.snippet) for h in hits if h.id in chats]
+
+
+def _fallback_search(user_id, terms, position, limit):
+    """Unindexed any-term match for databases without full-text support, newest first"""
+    conditions = []
+    for term in terms:
+        conditions += [ChatHistory.query.ilike(f"%{term}%"), ChatHistory.response.ilike(f"%{term}%")]
+    query = db.session.query(ChatHistory).filter(ChatHistory.user_id == user_id, or_(*conditions))
+    if position:
+        query = query.filter(ChatHistory.id < position["id"])
+    chats = query.order_by(ChatHistory.id.desc()).limit(limit + 1).all()
+    return [(chat, 0.0, None) for chat in chats]
+
+
+def search_history(user_id, query, cursor=None, limit=20):
+    """Ranked full-text search over one user's chats.
+
+    Returns (results, next_cursor); each result is the chat's dict with a
+    `rank` and a `snippet` marking matches with <mark> tags. Pass
+    next_cursor back to get the following page. Raises InvalidCursor for a
+    malformed cursor.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], None
+    position = decode_cursor(cursor, rank=float, id=int)
+
+    mode = ensure_search_index()
+    if mode == "postgresql":
+        rows = _postgres_search(user_id, terms, position, limit)
+    elif mode == "sqlite":
+        rows = _sqlite_search(user_id, terms, position, limit)
+    else:
+        rows = _fallback_search(user_id, terms, position, limit)
+
+    results = []
+    for chat, rank, snippet in rows[:limit]:
+        result = chat.to_dict()
+        result["rank"] = rank
+        result["snippet"] = snippet
+        results.append(result)
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = encode_cursor({"rank": last["rank"], "id": last["id"]})
+    return results, next_cursor
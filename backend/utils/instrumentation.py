@@ -0,0 +1,361 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 1500, 2000, 4000, 8000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join('{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered in the Prometheus text format"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to produce a response (streamed bodies excluded)",
+                            labelnames=("method", "endpoint", "status"))
+STAGE_SECONDS = Histogram("chat_stage_duration_seconds", "Time spent in each stage of handling a request",
+                          labelnames=("stage",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement execution time", buckets=QUERY_BUCKETS)
+LLM_SECONDS = Histogram("llm_request_duration_seconds", "LLM call time, retries included",
+                        labelnames=("backend", "mode", "outcome"))
+LLM_PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Estimated prompt tokens per LLM call", buckets=TOKEN_BUCKETS,
+                              labelnames=("backend",))
+LLM_COMPLETION_TOKENS = Histogram("llm_completion_tokens", "Estimated reply tokens per LLM call",
+                                  buckets=TOKEN_BUCKETS, labelnames=("backend",))
+FACT_QUERIES = Histogram("chat_fact_db_queries", "SQL statements run to gather the facts for a chat message",
+                         buckets=COUNT_BUCKETS)
+PROMPT_TOKENS = Histogram("chat_prompt_tokens", "Estimated tokens of each prompt built, cached replies included",
+                          buckets=TOKEN_BUCKETS)
+PROMPT_FACT_RECORDS = Histogram("chat_prompt_fact_records", "Fact records per prompt, kept within the token "
+                                "budget or dropped past it", buckets=COUNT_BUCKETS, labelnames=("outcome",))
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS",
+                        labelnames=("endpoint",))
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, DB_QUERY_SECONDS, LLM_SECONDS, LLM_PROMPT_TOKENS,
+           LLM_COMPLETION_TOKENS, FACT_QUERIES, PROMPT_TOKENS, PROMPT_FACT_RECORDS, SLOW_REQUESTS]
+
+
+def record_stage(stage, seconds):
+    """Add time spent in a stage to the request's breakdown and the stage histogram"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if has_app_context():
+        stages = g.setdefault("stage_timings", {})
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as a request stage, e.g. `with span("llm"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def stage_timings():
+    """Seconds per stage recorded so far in the current app context"""
+    return dict(g.get("stage_timings", {})) if has_app_context() else {}
+
+
+def observe_prompt(tokens, kept, dropped):
+    """Record the size of a built prompt and how many fact records fit its budget"""
+    PROMPT_TOKENS.observe(tokens)
+    PROMPT_FACT_RECORDS.observe(kept, outcome="kept")
+    PROMPT_FACT_RECORDS.observe(dropped, outcome="dropped")
+
+
+def observe_llm_call(backend, mode, outcome, seconds, prompt, reply=None):
+    """Record an LLM call's latency and (estimated) token counts"""
+    from .prompt import estimate_tokens
+    LLM_SECONDS.observe(seconds, backend=backend, mode=mode, outcome=outcome)
+    LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt), backend=backend)
+    if reply:
+        LLM_COMPLETION_TOKENS.observe(estimate_tokens(reply), backend=backend)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+    if has_app_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+
+
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    DB_QUERY_SECONDS.observe(seconds)
+    if has_app_context():
+        g.db_seconds = g.get("db_seconds", 0.0) + seconds
+
+
+def _discard_query_start(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def query_count():
+    """Number of SQL statements executed in the current app context"""
+    return g.get("db_queries", 0)
+
+
+def observe_fact_queries(count):
+    """Record how many SQL statements gathering one message's facts took"""
+    FACT_QUERIES.observe(count)
+
+
+def init_query_counter(app):
+    """Count and time SQL statements per request and report the count in an X-DB-Queries header"""
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+        event.listen(Engine, "after_cursor_execute", _time_query)
+        event.listen(Engine, "handle_error", _discard_query_start)
+
+    @app.after_request
+    def add_query_count(response):
+        response.headers["X-DB-Queries"] = str(query_count())
+        return response
+
+
+def observe_request(method, endpoint, status, seconds):
+    REQUEST_SECONDS.observe(seconds, method=method, endpoint=endpoint, status=status)
+
+
+def init_request_metrics(app):
+    """Time every request, add a Server-Timing header with its stages and log slow ones.
+
+    Requests slower than SLOW_REQUEST_SECONDS (0 disables the log) are logged
+    with their stage breakdown and SQL time. Streamed bodies are produced
+    after the response is returned, so their stages only reach the histograms.
+    """
+    slow_after = app.config.get("SLOW_REQUEST_SECONDS", 0)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        observe_request(request.method, endpoint, response.status_code, seconds)
+
+        stages = stage_timings()
+        db_seconds = g.get("db_seconds", 0.0)
+        if db_seconds:
+            stages["db"] = db_seconds
+        if stages:
+            response.headers["Server-Timing"] = ", ".join(
+                f"{stage};dur={value * 1000:.1f}" for stage, value in stages.items()
+            )
+        if slow_after and seconds >= slow_after:
+            SLOW_REQUESTS.inc(endpoint=endpoint)
+            app.logger.warning(
+                "slow request %s %s -> %d in %.3fs (%d SQL queries); stages: %s",
+                request.method, request.path, response.status_code, seconds, query_count(),
+                ", ".join(f"{stage}={value * 1000:.1f}ms" for stage, value in stages.items()) or "none",
+            )
+        return response
+
+
+def component_stats(app):
+    """Snapshot of the stats the app's components keep, keyed by metric prefix"""
+    from app import db
+    from .auth import auth_cache_stats
+    from .response_cache import get_response_cache
+
+    stats = {
+        "db_pool": pool_stats(db.engine),
+        "llm_client": app.extensions["llm_client"].stats(),
+        "llm_cache": get_response_cache().stats(),
+        "auth_token_cache": auth_cache_stats()["tokens"],
+        "auth_user_cache": auth_cache_stats()["users"],
+    }
+    for prefix, extension in (("chat_writer", "chat_writer"), ("conversations", "conversations"),
+                              ("rate_limit", "rate_limiter"), ("llm_admission", "llm_admission"),
+                              ("llm_async_admission", "llm_async_admission")):
+        component = app.extensions.get(extension)
+        if component is not None:
+            stats[prefix] = component.stats()
+    return stats
+
+
+def render_metrics(snapshots=None):
+    """All metrics in the Prometheus text exposition format.
+
+    Histograms and counters are cumulative for this process. Component
+    stats are exported as untyped samples: numbers as they are, booleans
+    as 0/1 and strings (such as the breaker state) as a `value` label.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, stats in (snapshots or {}).items():
+        for key, value in stats.items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name} {_format_value(value)}")
+            elif isinstance(value, str):
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name}{_format_labels(('value',), (value,))} 1")
+    return "\n".join(lines) + "\n"
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how often they time out"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                # Count checkouts that had to wait for a connection to come back
+                if waited > 0.001:
+                    self.waits += 1
+
+
+def configure_pool(app):
+    """Use TimedQueuePool for the app's engine unless the database needs a special pool"""
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if uri.startswith("sqlite") and (":memory:" in uri or uri.rstrip("/") in ("sqlite:", "sqlite:/")):
+        # In-memory SQLite relies on its single-connection pool
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    else:
+        options.setdefault("poolclass", TimedQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def pool_stats(engine):
+    """Checked-out connections, overflow and checkout wait times of an engine's pool"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    }
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "waits": pool.waits,
+            "timeouts": pool.timeouts,
+            "avg_wait_ms": round(pool.total_wait / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            "max_wait_ms": round(pool.max_wait * 1000, 3),
+        })
+        capacity = stats["size"] + stats["max_overflow"]
+        stats["saturation"] = round(stats["checked_out"] / capacity, 3) if capacity > 0 else 0.0
+    return stats
@@ -0,0 +1,250 @@
+import functools
+import itertools
+import re
+from typing import NamedTuple, Optional
+
+from flask import has_app_context
+from .search_index import CatalogVocabulary, get_vocabulary, normalize_token
+from .constraints import CUE_PHRASES, CUE_SEPARATOR, Constraints, parse_constraints
+
+# Intent vocabularies, in the order intents are reported
+INTENT_VOCABULARY = {
+    'warranty': ['warranty', 'claim', 'guarantee', 'repair', 'replace'],
+    'offer': ['offer', 'discount', 'coupon', 'deal', 'sale', 'promo'],
+    'product_search': ['find', 'search', 'looking', 'want', 'need', 'show', 'tell', 'about', 'info', 'tell me about'],
+    'comparison': ['compare', 'vs', 'versus', 'difference', 'better'],
+    'pricing': ['price', 'cost', 'expensive', 'cheap', 'budget', 'affordable', 'premium', 'priciest'],
+    'availability': ['stock', 'available', 'inventory', 'in stock'],
+}
+INTENT_ORDER = ['product_id_lookup'] + list(INTENT_VOCABULARY)
+# Every price and discount phrase utils.constraints parses contains one of these terms, so
+# its number patterns (see NUMERIC_KINDS there) only run for messages the pass found them in
+NUMERIC_CUES = {
+    'price': ['under', 'below', 'less than', 'cheaper than', 'within', 'up to', 'upto', 'at most', 'max', 'over',
+              'above', 'more than', 'at least', 'starting', 'min', 'between', '<', '>'],
+    'discount': ['%', 'percent'],
+}
+
+# Used only when no catalog vocabulary is available (e.g. outside the app)
+BRANDS = ['bose', 'apple', 'samsung', 'lenovo', 'hp', 'asus', 'oneplus', 'xiaomi', 'jbl', 'sennheiser', 'garmin', 'fitbit']
+CATEGORIES = ['laptop', 'smartphone', 'headphones', 'smartwatch']
+PRODUCT_ID_MARKERS = ('product id', 'product-id')
+
+# Priority used when a chat is counted under a single intent in analytics
+PRIMARY_INTENTS = ['product_search', 'warranty', 'offer']
+
+# What separates the words of a multi-word brand or category, as in tokenize()
+_SEPARATOR = r"[^a-z0-9]+"
+_SEPARATOR_RE = re.compile(_SEPARATOR)
+
+
+def trie_pattern(terms, separator=None):
+    """Regex alternation for `terms` factored into a prefix trie.
+
+    A flat "a|b|c" alternation is retried term by term at every position; the
+    factored form branches on one character at a time, so a position that
+    starts no term is rejected after a single character test. With a
+    `separator` pattern, spaces in the terms match it instead of a space.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        end = '' in node
+        branches = [(separator if char == ' ' and separator else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Longer terms are tried before the term that ends here
+        return f'(?:{body})?' if end else body
+
+    return build(trie)
+
+
+class MessageAnalysis(NamedTuple):
+    intents: tuple
+    brands: tuple
+    categories: tuple
+    models: tuple
+    product_id: Optional[int]
+    constraints: Constraints
+    has_model: bool
+    has_digit: bool
+
+
+class IntentEngine:
+    """Detects intents and entities in one regex pass over a message.
+
+    Every intent term is compiled into a single trie-factored alternation,
+    so the message is scanned once instead of once per term. Matching is
+    substring based, like the `word in message` checks it replaces; a term
+    carries the labels of the terms it contains ("in stock", "stock").
+    Brands and categories of the catalog vocabulary, and the stock, price
+    order and warranty cue words of utils.constraints, are compiled into the
+    same pattern as whole words, so they come out of the same match; the
+    pattern is recompiled when the vocabulary changes. utils.constraints
+    gets those cues and runs only the number patterns the pass found a cue
+    term for, and is not called at all for most messages.
+    """
+
+    def __init__(self, intent_vocabulary=INTENT_VOCABULARY, numeric_cues=NUMERIC_CUES, cue_phrases=CUE_PHRASES):
+        self._labels = {}
+        for intent, words in intent_vocabulary.items():
+            for word in words:
+                self._add(word, 'intent', intent)
+        for kind, terms in numeric_cues.items():
+            for term in terms:
+                self._add(term, 'numeric', kind)
+        # The pass consumes the longest term at a position, so it carries the ones inside it
+        for term, labels in self._labels.items():
+            labels.extend(label for other, other_labels in self._labels.items() if other != term and other in term
+                          for label in other_labels if label not in labels)
+        self._cues = {phrase: [('cue', cue)] + self._contained_labels(phrase)
+                      for cue, phrases in cue_phrases.items() for phrase in phrases}
+
+        self._terms = (r"(?P<text>product.?id.?(?P<number>\d+)|model(?=\s+(?P<model>\S+)|)|"
+                       + trie_pattern(self._labels) + r"|\d+)")
+        self._words = r"|(?P<cue>" + trie_pattern(self._cues, separator=CUE_SEPARATOR) + ")"
+        self._compiled = None
+
+    def _add(self, term, kind, value):
+        self._labels.setdefault(term, []).append((kind, value))
+
+    def _contained_labels(self, phrase):
+        """Labels of the terms inside a phrase matched as a whole word, which the pass then skips"""
+        labels = [label for term, term_labels in self._labels.items() if term in phrase for label in term_labels]
+        if any(char.isdigit() for char in phrase):
+            labels.append(('digit', True))
+        return labels
+
+    def _compile(self, vocabulary):
+        """Pattern and surface form -> labels for a vocabulary, at its current version"""
+        compiled = self._compiled
+        version = vocabulary.version
+        if compiled is not None and compiled[0] is vocabulary and compiled[1] == version:
+            return compiled[2], compiled[3]
+
+        entities = {}
+        for term, entries in vocabulary.lookup_map().items():
+            # Each word as written: the normalized token, or its plural where tokenize() folds it
+            forms = [[form for form in (word, word + 's') if normalize_token(form) == word]
+                     for word in term.split(' ')]
+            for words in itertools.product(*forms):
+                surface = ' '.join(words)
+                entities[surface] = list(entries) + self._contained_labels(surface)
+
+        # Whole words are tried first, so a position inside a word fails at once
+        entity = trie_pattern(entities, separator=_SEPARATOR) or '(?!)'
+        pattern = re.compile(rf"(?<![a-z0-9])(?:(?P<entity>{entity}){self._words})(?![a-z0-9])|{self._terms}")
+        self._compiled = (vocabulary, version, pattern, entities)
+        return pattern, entities
+
+    def analyze(self, message, vocabulary=None):
+        msg_lower = message.lower()
+        pattern, entity_labels = self._compile(vocabulary or default_vocabulary)
+        intents = set()
+        entities = {kind: [] for kind in CatalogVocabulary.KINDS}
+        models = []
+        product_id = None
+        has_model = False
+        has_digit = False
+        cues = set()
+        numeric = set()
+
+        for entity, cue, text, number, model in pattern.findall(msg_lower):
+            if entity:
+                labels = entity_labels.get(entity) or entity_labels[_SEPARATOR_RE.sub(' ', entity)]
+            elif cue:
+                labels = self._cues[cue.replace('-', ' ')]
+            else:
+                labels = self._labels.get(text)
+            if labels:
+                for kind, value in labels:
+                    if kind == 'intent':
+                        intents.add(value)
+                    elif kind == 'numeric':
+                        numeric.add(value)
+                    elif kind == 'cue':
+                        cues.add(value)
+                    elif kind == 'digit':
+                        has_digit = True
+                    elif value not in entities[kind]:
+                        entities[kind].append(value)
+            elif number:
+                product_id = int(number)
+                has_digit = True
+                if text.startswith(PRODUCT_ID_MARKERS):
+                    intents.add('product_id_lookup')
+            elif text == 'model':
+                has_model = True
+                if model:
+                    models.append(f"model {model}")
+                    has_digit = has_digit or any(c.isdigit() for c in model)
+            else:
+                has_digit = True
+
+        # The product id only counts when the message explicitly asks for one
+        if 'product_id_lookup' not in intents:
+            for marker in PRODUCT_ID_MARKERS:
+                if marker in msg_lower:
+                    intents.add('product_id_lookup')
+                    break
+            else:
+                product_id = None
+
+        # Prices and discounts are numbers
+        if not has_digit:
+            numeric.clear()
+
+        return MessageAnalysis(
+            intents=tuple(intent for intent in INTENT_ORDER if intent in intents),
+            brands=tuple(entities['brand']),
+            categories=tuple(entities['category']),
+            models=tuple(models),
+            product_id=product_id,
+            # Skip the constraint regexes for messages that cannot contain any
+            constraints=parse_constraints(message, numeric, cues) if numeric or cues
+            else Constraints(text=msg_lower),
+            has_model=has_model,
+            has_digit=has_digit,
+        )
+
+
+intent_engine = IntentEngine()
+default_vocabulary = CatalogVocabulary.from_terms(BRANDS, CATEGORIES)
+
+
+def current_vocabulary():
+    """The catalog vocabulary inside the app, the fixed fallback lists outside it"""
+    if has_app_context():
+        return get_vocabulary()
+    return default_vocabulary
+
+
+@functools.lru_cache(maxsize=4096)
+def _analyze_cached(message, vocabulary, version):
+    return intent_engine.analyze(message, vocabulary)
+
+
+def analyze_message(message):
+    """Intents and entities of a message using the shared engine.
+
+    Memoized per vocabulary version, as the chat route and the analytics
+    rollup look at the same message.
+    """
+    vocabulary = current_vocabulary()
+    return _analyze_cached(message, vocabulary, vocabulary.version)
+
+
+def primary_intent(message):
+    """Single intent a message is counted under in analytics"""
+    intents = analyze_message(message).intents
+    for intent in PRIMARY_INTENTS:
+        if intent in intents:
+            return intent
+    return 'general'
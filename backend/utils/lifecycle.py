@@ -0,0 +1,49 @@
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+
+
+def warm_up(app):
+    """Build the catalog snapshot, search indexes and intent matcher ahead of the first request.
+
+    A preloading server calls this in its master process, so the forked
+    workers share the result copy-on-write instead of each building its own
+    on its first chat. Pooled connections are closed afterwards so no worker
+    inherits a socket opened by the master. A database without the catalog
+    tables is not fatal: workers then build everything lazily as before.
+    """
+    from utils.search_index import get_product_index
+    from utils.intent_engine import analyze_message
+
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            index = get_product_index()
+            analyze_message("warm up")
+        except SQLAlchemyError as e:
+            print(f"Warm-up skipped, the catalog will be loaded on first use: {e}")
+            return
+        finally:
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    print(f"Warmed up in {time.perf_counter() - started:.2f}s: {len(index)} products indexed")
+
+
+def after_fork(app):
+    """Drop the connection pool copied from the parent without closing the parent's connections"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def shutdown(app):
+    """Flush queued chat history and close database connections; safe to call more than once"""
+    writer = app.extensions.get("chat_writer")
+    if writer is not None:
+        writer.stop()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from flask import current_app
+
+from .instrumentation import observe_llm_call
+
+
+class LLMUnavailable(Exception):
+    """Raised without calling the model while the circuit breaker is open"""
+
+
+# Returned by CircuitBreaker.allow() for the trial call of a half-open breaker
+TRIAL = "trial"
+
+
+class CircuitBreaker:
+    """Fail fast after repeated LLM failures instead of stacking up timeouts.
+
+    After `failure_threshold` consecutive failed calls the breaker opens and
+    every call is rejected for `reset_timeout` seconds. The first call after
+    that is let through as a trial: success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """False while open; TRIAL for the one call let through when half open, else True"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return TRIAL
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def abandon(self, admitted):
+        """Settle a call that ended without success or failure (cancelled, client gone).
+
+        Nothing was learned about the model, so if it was the trial the next
+        call becomes the trial instead of every call being rejected from now on.
+        """
+        if admitted is TRIAL:
+            with self._lock:
+                self._trial_running = False
+
+
+class GeminiBackend:
+    """google-generativeai model, configured once and reused across requests.
+
+    The model (and the gRPC channel behind it) is built on first use in each
+    process, so a preloading server master never shares a channel with its
+    forked workers.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name="gemini-1.5-flash", timeout=20.0):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self._model = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                    self._pid = os.getpid()
+        return self._model
+
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+        return response.text
+
+    def stream(self, prompt):
+        chunks = self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout})
+        for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+    async def generate_async(self, prompt):
+        response = await self.model.generate_content_async(prompt, request_options={"timeout": self.timeout})
+        return response.text
+
+    @staticmethod
+    def is_retryable(error):
+        from google.api_core import exceptions
+        return isinstance(error, (
+            exceptions.TooManyRequests,
+            exceptions.InternalServerError,
+            exceptions.ServiceUnavailable,
+            exceptions.GatewayTimeout,
+            exceptions.DeadlineExceeded,
+            ConnectionError,
+            TimeoutError,
+        ))
+
+
+class StubBackend:
+    """Offline stand-in for the model, for load tests of the chat path.
+
+    Replies after `latency` seconds with a canned answer that mentions the
+    prompt size; streaming yields it word by word.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _reply(self, prompt):
+        return f"[stub reply to a {len(prompt)} character prompt]"
+
+    def generate(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(prompt)
+
+    def stream(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        words = self._reply(prompt).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+
+    async def generate_async(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(prompt)
+
+    @staticmethod
+    def is_retryable(error):
+        return False
+
+
+class LLMClient:
+    """Calls the model with retries and a circuit breaker.
+
+    Retryable errors are retried up to `max_retries` times with full-jitter
+    exponential backoff; a call that still fails counts against the breaker.
+    Callers catch the exception and answer with their fallback reply.
+    """
+
+    def __init__(self, backend, max_retries=2, retry_base_delay=0.5, retry_max_delay=4.0, breaker=None):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _admit(self):
+        admitted = self.breaker.allow()
+        if not admitted:
+            self.rejected += 1
+            raise LLMUnavailable("LLM circuit breaker is open")
+        self.calls += 1
+        return admitted
+
+    def _should_retry(self, error, attempt):
+        if attempt < self.max_retries and self.backend.is_retryable(error):
+            self.retries += 1
+            return True
+        self._record_failure()
+        return False
+
+    def _record_failure(self):
+        self.failures += 1
+        self.breaker.record_failure()
+
+    def generate(self, prompt):
+        admitted = self._admit()
+        started = time.perf_counter()
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                try:
+                    reply = self.backend.generate(prompt)
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        settled = True
+                        observe_llm_call(self.backend.name, "generate", "error", time.perf_counter() - started, prompt)
+                        raise
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                settled = True
+                observe_llm_call(self.backend.name, "generate", "ok", time.perf_counter() - started, prompt, reply)
+                return reply
+        finally:
+            if not settled:
+                self.breaker.abandon(admitted)
+
+    def stream(self, prompt):
+        """Yield reply chunks; only retried while nothing has been yielded yet"""
+        admitted = self._admit()
+        started_at = time.perf_counter()
+        parts = []
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                started = False
+                try:
+                    for chunk in self.backend.stream(prompt):
+                        started = True
+                        parts.append(chunk)
+                        yield chunk
+                except Exception as e:
+                    if started:
+                        self._record_failure()
+                    if started or not self._should_retry(e, attempt):
+                        settled = True
+                        observe_llm_call(self.backend.name, "stream", "error", time.perf_counter() - started_at,
+                                         prompt, "".join(parts))
+                        raise
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                settled = True
+                observe_llm_call(self.backend.name, "stream", "ok", time.perf_counter() - started_at,
+                                 prompt, "".join(parts))
+                return
+        finally:
+            # GeneratorExit when the SSE client disconnects mid-reply
+            if not settled:
+                self.breaker.abandon(admitted)
+                observe_llm_call(self.backend.name, "stream", "cancelled", time.perf_counter() - started_at,
+                                 prompt, "".join(parts))
+
+    async def generate_async(self, prompt):
+        admitted = self._admit()
+        started = time.perf_counter()
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                try:
+                    reply = await self.backend.generate_async(prompt)
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        settled = True
+                        observe_llm_call(self.backend.name, "async", "error", time.perf_counter() - started, prompt)
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                settled = True
+                observe_llm_call(self.backend.name, "async", "ok", time.perf_counter() - started, prompt, reply)
+                return reply
+        finally:
+            # Cancelled by CHAT_TIMEOUT or a client disconnect
+            if not settled:
+                self.breaker.abandon(admitted)
+                observe_llm_call(self.backend.name, "async", "cancelled", time.perf_counter() - started, prompt)
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "breaker": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+
+def init_llm_client(app):
+    """Build the app's LLM client from the LLM_* settings"""
+    if app.config.get("LLM_BACKEND", "gemini") == "stub":
+        backend = StubBackend(latency=app.config.get("LLM_STUB_LATENCY", 0.0))
+    else:
+        backend = GeminiBackend(
+            app.config.get("GEMINI_API_KEY"),
+            model_name=app.config.get("GEMINI_MODEL", "gemini-1.5-flash"),
+            timeout=app.config.get("LLM_TIMEOUT", 20.0),
+        )
+    client = LLMClient(
+        backend,
+        max_retries=app.config.get("LLM_MAX_RETRIES", 2),
+        retry_base_delay=app.config.get("LLM_RETRY_BASE_DELAY", 0.5),
+        retry_max_delay=app.config.get("LLM_RETRY_MAX_DELAY", 4.0),
+        breaker=CircuitBreaker(
+            failure_threshold=app.config.get("LLM_BREAKER_THRESHOLD", 5),
+            reset_timeout=app.config.get("LLM_BREAKER_RESET", 30.0),
+        ),
+    )
+    app.extensions["llm_client"] = client
+    return client
+
+
+def get_llm_client():
+    return current_app.extensions["llm_client"]
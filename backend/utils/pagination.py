@@ -0,0 +1,49 @@
+import base64
+import json
+from sqlalchemy import text
+from app import db
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    """Opaque, URL-safe cursor for a position such as {'id': 42}"""
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, **fields):
+    """Position encoded by encode_cursor; None for an empty cursor.
+
+    `fields` maps each key the position must have to a function converting
+    its value, e.g. id=int or created_at=datetime.fromisoformat. Raises
+    InvalidCursor when the cursor is malformed, lacks a key or has a value
+    its function rejects.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return {key: convert(position[key]) for key, convert in fields.items()}
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def estimated_count(model):
+    """Row count of a model's table, from the planner statistics on PostgreSQL.
+
+    The estimate is refreshed by (auto)vacuum/analyze and costs a catalog
+    lookup instead of a full scan; other databases, or tables never analyzed,
+    get an exact count.
+    """
+    if db.engine.dialect.name == "postgresql":
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": model.__tablename__}
+        ).scalar()
+        if estimate is not None and estimate > 0:
+            return int(estimate)
+    return db.session.query(model).count()
@@ -0,0 +1,146 @@
+import json
+
+from .instrumentation import observe_prompt
+
+SYSTEM_PROMPT = """You are a professional sales assistant helping customers with {intents} queries.
+Guidelines:
+- Use ONLY the provided structured facts
+- Be helpful, concise, and sales-oriented
+- For product searches: highlight key features, pricing, and availability
+- For warranty queries: explain coverage and claim process clearly
+- For offer queries: emphasize savings and validity periods, and ALWAYS mention the product name with the offer
+- For product ID lookups: provide complete product information
+- For comparisons: highlight differences and recommend based on needs
+- For pricing: mention value proposition
+- Always be customer-focused and solution-oriented
+- When showing offers, always include the product name, not just the ID
+If no relevant data is found, politely explain and suggest alternatives."""
+
+# Short keys used in the facts, spelled out once in the prompt
+FIELD_LEGEND = {
+    "id": "product id",
+    "n": "name",
+    "c": "category",
+    "b": "brand",
+    "m": "model",
+    "col": "color",
+    "p": "price",
+    "st": "stock",
+    "d": "description",
+    "w": "warranty",
+    "cl": "claim process",
+    "of": "offers as [discount %, coupon, valid till]",
+}
+
+DETAIL_INTENTS = {"product_search", "product_id_lookup", "comparison", "general"}
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def fields_for_intents(intents):
+    """Short keys worth sending for the detected intents"""
+    fields = {"id", "n", "p"}
+    if DETAIL_INTENTS.intersection(intents):
+        fields.update(("c", "b", "m", "col", "st"))
+    if "product_id_lookup" in intents:
+        fields.update(("d", "w"))
+    if "comparison" in intents:
+        fields.add("w")
+    if "availability" in intents:
+        fields.add("st")
+    if "warranty" in intents:
+        fields.update(("w", "cl"))
+    if "offer" in intents or "pricing" in intents:
+        fields.add("of")
+    return fields
+
+
+def compact_facts(intents, structured_facts):
+    """One compact record per product, best-ranked first.
+
+    Products listed under several fact keys are merged into a single record
+    that also carries their offers and warranties; offers and warranties of
+    products that were not matched become records of their own.
+    """
+    fields = fields_for_intents(intents)
+    records = {}
+    for key in ("products", "_product_context", "offer_products"):
+        for product in structured_facts.get(key, []):
+            if product["id"] in records:
+                continue
+            specs = product.get("specs") or {}
+            record = {
+                "id": product["id"],
+                "n": product.get("name"),
+                "c": product.get("category"),
+                "b": specs.get("brand"),
+                "m": specs.get("model"),
+                "col": specs.get("color"),
+                "p": product.get("price"),
+                "st": product.get("stock"),
+                "d": product.get("description"),
+                "w": specs.get("warranty_period"),
+            }
+            records[product["id"]] = {k: v for k, v in record.items() if k in fields and v is not None}
+
+    for warranty in structured_facts.get("warranty", []):
+        record = records.setdefault(warranty["product_id"], {"id": warranty["product_id"]})
+        record["w"] = warranty["warranty_period"]
+        if "cl" in fields and warranty.get("claim_process"):
+            record["cl"] = warranty["claim_process"]
+
+    for offer in structured_facts.get("offers", []):
+        record = records.setdefault(offer["product_id"], {"id": offer["product_id"]})
+        record.setdefault("of", []).append(
+            [offer["discount_percentage"], offer["coupon_code"], offer["valid_till"]]
+        )
+
+    return list(records.values())
+
+
+def build_prompt(message, intents, structured_facts, token_budget=1500, history=""):
+    """Compact prompt for a chat turn, kept within `token_budget` tokens.
+
+    Facts are serialized as short-key JSON records in rank order; once the
+    budget is reached the remaining, lowest-ranked records are dropped and
+    the prompt says how many were left out. `history` is the bounded
+    summary of the user's earlier turns.
+    """
+    records = compact_facts(intents, structured_facts)
+    used_keys = [k for k in FIELD_LEGEND if any(k in r for r in records)]
+
+    header = SYSTEM_PROMPT.format(intents=", ".join(intents))
+    if history:
+        header += f"\n\nConversation so far: {history}"
+    header += f"\n\nCustomer Query: {message}"
+    if "error" in structured_facts:
+        header += f"\nNote: {structured_facts['error']}"
+    if structured_facts.get("filters"):
+        # Tell the model why the list may be short or empty
+        header += "\nFilters applied: " + ", ".join(f"{k}={v}" for k, v in structured_facts["filters"].items())
+    if used_keys:
+        header += "\nFacts (one JSON record per product; " + ", ".join(
+            f"{k}={FIELD_LEGEND[k]}" for k in used_keys) + "):"
+    else:
+        header += "\nFacts: none found"
+
+    lines = [header]
+    used = estimate_tokens(header)
+    for record in records:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+        cost = estimate_tokens(line) + 1
+        # Always keep the best match, even if it alone exceeds the budget
+        if used + cost > token_budget and len(lines) > 1:
+            break
+        lines.append(line)
+        used += cost
+    dropped = len(records) - (len(lines) - 1)
+    if dropped:
+        lines.append(f"({dropped} lower-ranked matches omitted)")
+
+    prompt = "\n".join(lines)
+    observe_prompt(estimate_tokens(prompt), len(records) - dropped, dropped)
+    return prompt
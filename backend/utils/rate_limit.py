@@ -0,0 +1,364 @@
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+from .instrumentation import span
+
+
+class Overloaded(Exception):
+    """Raised when no LLM slot frees up in time or the admission queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM admission queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """One admitted LLM call; releasing it more than once is harmless"""
+
+    def __init__(self, admission):
+        self._admission = admission
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._admission.release(time.monotonic() - self._started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MemoryBucketStore:
+    """Token buckets in this process, in an LRU capped at `max_keys`.
+
+    Evicting an idle bucket is harmless: it would have refilled anyway.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost=1.0):
+        """Spend `cost` tokens from every (key, rate, burst) bucket, or from none of them.
+
+        Returns (0.0, None) if allowed, else the seconds until every bucket
+        would allow it and the key of the first bucket that is short.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, rate, burst in buckets:
+                tokens, updated = self._buckets.pop(key, (burst, now))
+                levels.append(min(burst, tokens + (now - updated) * rate))
+            short = [((cost - tokens) / rate, key)
+                     for (key, rate, _), tokens in zip(buckets, levels) if tokens < cost]
+            spent = 0.0 if short else cost
+            for (key, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - spent, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if short:
+            return max(wait for wait, _ in short), short[0][1]
+        return 0.0, None
+
+    def stats(self):
+        return {"store": self.name, "keys": len(self._buckets)}
+
+
+# Refill every bucket and spend from all of them only if all allow, atomically on the
+# server; each bucket expires once it would be full again. ARGV: cost, then rate and
+# burst per key. Returns {wait, 1-based index of the first short bucket or 0}.
+_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait, short = 0, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+        if short == 0 then
+            short = i
+        end
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if short == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {tostring(wait), short}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by every worker and host using the same server.
+
+    Each check is one round trip running a Lua script, so concurrent
+    requests cannot both spend the last token. Works with any client that
+    provides redis-py's `register_script`. The keys of one check are touched
+    together, so on Redis Cluster they must hash to the same slot.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=0.25), **kwargs)
+
+    def take(self, buckets, cost=1.0):
+        args = [cost]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        wait, short = self._take(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        return float(wait), buckets[int(short) - 1][0] if int(short) else None
+
+    def stats(self):
+        return {"store": self.name}
+
+
+class RateLimiter:
+    """Per-user and per-IP token buckets in front of the chat routes.
+
+    Rates are in requests per second and bursts in requests. The IP bucket
+    catches a client cycling through accounts; the user bucket one account
+    spread over many addresses. If the store fails the request is let
+    through, so an outage of a shared store doesn't take chat down with it.
+    """
+
+    def __init__(self, store, user_rate, user_burst, ip_rate, ip_burst):
+        self.store = store
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+
+        self.allowed = 0
+        self.limited_user = 0
+        self.limited_ip = 0
+        self.store_errors = 0
+
+    def check(self, user_id=None, ip=None):
+        """Seconds the caller must wait before retrying, or 0.0 when the request may proceed.
+
+        Both buckets are charged only when both allow the request, so a user
+        over their own limit doesn't use up the quota of others behind the
+        same address.
+        """
+        buckets = []
+        if ip:
+            buckets.append((f"ip:{ip}", self.ip_rate, self.ip_burst))
+        if user_id is not None:
+            buckets.append((f"user:{user_id}", self.user_rate, self.user_burst))
+        try:
+            wait, short = self.store.take(buckets) if buckets else (0.0, None)
+        except Exception as e:
+            self.store_errors += 1
+            current_app.logger.warning("rate limit store unavailable, allowing request: %s", e)
+            wait = 0.0
+        if wait:
+            if short.startswith("ip:"):
+                self.limited_ip += 1
+            else:
+                self.limited_user += 1
+            return wait
+        self.allowed += 1
+        return 0.0
+
+    def stats(self):
+        return {
+            **self.store.stats(),
+            "allowed": self.allowed,
+            "limited_user": self.limited_user,
+            "limited_ip": self.limited_ip,
+            "store_errors": self.store_errors,
+        }
+
+
+class AdmissionControl:
+    """Caps the LLM calls in flight in this process.
+
+    Up to `max_in_flight` calls run at once; up to `max_queue` more requests
+    wait at most `queue_timeout` seconds for a slot. Past that a request is
+    refused at once with `Overloaded`, instead of piling up in the workers
+    until it times out, and its Retry-After is the recent average call time.
+    """
+
+    def __init__(self, max_in_flight=100, max_queue=50, queue_timeout=10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._avg_seconds = 1.0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self):
+        return max(1, math.ceil(self._avg_seconds))
+
+    def acquire(self):
+        """Wait for a slot, or raise Overloaded; release the returned slot when the call ends"""
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded(self.retry_after())
+                self.waiting += 1
+                try:
+                    if not self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, self.queue_timeout):
+                        self.timed_out += 1
+                        raise Overloaded(self.retry_after())
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+        return AdmissionSlot(self)
+
+    def release(self, seconds=None):
+        with self._cond:
+            self.in_flight -= 1
+            if seconds is not None:
+                # Moving average of call time, for Retry-After
+                self._avg_seconds += 0.1 * (seconds - self._avg_seconds)
+            self._cond.notify()
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_call_seconds": round(self._avg_seconds, 3),
+        }
+
+
+class AsyncAdmissionControl(AdmissionControl):
+    """AdmissionControl for coroutines on one event loop (the async chat in asgi.py)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = None
+
+    async def acquire_async(self):
+        # Created lazily so the semaphore binds to the server's running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.retry_after())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(self.retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        return AdmissionSlot(self)
+
+    def release(self, seconds=None):
+        self.in_flight -= 1
+        if seconds is not None:
+            self._avg_seconds += 0.1 * (seconds - self._avg_seconds)
+        self._slots.release()
+
+
+def create_bucket_store(config):
+    """Redis buckets when RATE_LIMIT_STORAGE_URL is set, otherwise in-process ones"""
+    url = config.get("RATE_LIMIT_STORAGE_URL")
+    if url:
+        try:
+            return RedisBucketStore.from_url(url)
+        except Exception as e:
+            print(f"Could not use rate limit store {url!r}, using in-process buckets: {e}")
+    return MemoryBucketStore()
+
+
+def init_rate_limiting(app):
+    """Set up the chat rate limiter (when RATE_LIMIT_ENABLED) and the LLM admission control"""
+    if app.config.get("RATE_LIMIT_ENABLED", True):
+        app.extensions["rate_limiter"] = RateLimiter(
+            create_bucket_store(app.config),
+            user_rate=app.config.get("RATE_LIMIT_USER_PER_MINUTE", 30) / 60.0,
+            user_burst=app.config.get("RATE_LIMIT_USER_BURST", 10),
+            ip_rate=app.config.get("RATE_LIMIT_IP_PER_MINUTE", 120) / 60.0,
+            ip_burst=app.config.get("RATE_LIMIT_IP_BURST", 40),
+        )
+    app.extensions["llm_admission"] = AdmissionControl(
+        max_in_flight=app.config.get("LLM_MAX_CONCURRENCY", 100),
+        max_queue=app.config.get("LLM_MAX_QUEUE", 50),
+        queue_timeout=app.config.get("LLM_QUEUE_TIMEOUT", 10.0),
+    )
+
+
+def get_rate_limiter():
+    """The app's rate limiter, or None when rate limiting is off"""
+    return current_app.extensions.get("rate_limiter")
+
+
+def get_llm_admission():
+    return current_app.extensions["llm_admission"]
+
+
+def too_many_requests(retry_after, error="Too many requests"):
+    """429 response telling the client when to retry"""
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({"error": error, "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def rate_limited(func):
+    """Decorator rejecting requests over the user's or client IP's rate; goes below require_auth"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            with span("rate_limit"):
+                retry_after = limiter.check(user_id=request.current_user.id, ip=request.remote_addr)
+            if retry_after:
+                return too_many_requests(retry_after)
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_query(message):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION_RE.sub(" ", (message or "").lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def facts_product_ids(facts):
+    """Collect every product id referenced by a structured facts payload"""
+    product_ids = set()
+    for items in facts.values():
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if "product_id" in item:
+                product_ids.add(item["product_id"])
+            elif "id" in item:
+                product_ids.add(item["id"])
+    return product_ids
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM replies keyed on (normalized query, facts hash).
+
+    Because the key hashes the facts themselves, a reply stops matching as
+    soon as any product, offer or warranty it was built from changes. Entries
+    are also tracked per product id so writes can evict them eagerly. When a
+    path is given, entries are mirrored to an SQLite file so they survive
+    restarts.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_product = {}
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, reply TEXT NOT NULL, "
+                "product_ids TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(message, facts, history=""):
+        """Key on everything the prompt is built from; the conversation summary is per user"""
+        facts_hash = hashlib.sha256(
+            json.dumps([facts, history] if history else facts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{normalize_query(message)}|{facts_hash}"
+
+    def get(self, key):
+        """Return the cached reply for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < now:
+                self._drop(key)
+                entry = None
+            if entry is None and self._disk is not None:
+                entry = self._load_from_disk(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, reply, product_ids=()):
+        expires_at = time.time() + self.ttl
+        product_ids = set(product_ids)
+        with self._lock:
+            self._store(key, reply, expires_at, product_ids)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, reply, product_ids, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, reply, json.dumps(sorted(product_ids)), expires_at),
+                )
+                self._disk.commit()
+
+    def invalidate_products(self, product_ids):
+        """Evict every reply built from facts about the given products"""
+        with self._lock:
+            keys = set()
+            for product_id in product_ids:
+                keys.update(self._by_product.get(product_id, ()))
+            for key in keys:
+                self._drop(key)
+            if self._disk is not None:
+                # Disk entries may not be loaded yet, so match on the stored id list
+                for product_id in product_ids:
+                    self._disk.execute(
+                        "DELETE FROM llm_cache WHERE EXISTS "
+                        "(SELECT 1 FROM json_each(product_ids) WHERE value = ?)",
+                        (product_id,),
+                    )
+                self._disk.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_product.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "disk_enabled": self._disk is not None,
+        }
+
+    def _store(self, key, reply, expires_at, product_ids):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (reply, expires_at, product_ids)
+        for product_id in product_ids:
+            self._by_product.setdefault(product_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for product_id in entry[2]:
+            keys = self._by_product.get(product_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_product[product_id]
+
+    def _load_from_disk(self, key, now):
+        row = self._disk.execute(
+            "SELECT reply, product_ids, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        reply, product_ids, expires_at = row
+        if expires_at < now:
+            self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._disk.commit()
+            return None
+        self._store(key, reply, expires_at, set(json.loads(product_ids)))
+        return self._entries[key]
+
+
+def get_response_cache():
+    """Return the app's response cache, creating it from config on first use"""
+    cache = current_app.extensions.get("response_cache")
+    if cache is None:
+        cache = ResponseCache(
+            max_entries=current_app.config.get("LLM_CACHE_MAX_ENTRIES", 1024),
+            ttl=current_app.config.get("LLM_CACHE_TTL", 3600),
+            path=current_app.config.get("LLM_CACHE_PATH") or None,
+        )
+        cache = current_app.extensions.setdefault("response_cache", cache)
+    return cache
@@ -0,0 +1,441 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Field boosts used when a search spans several fields
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "specs": 1.5,
+    "description": 1.0,
+}
+
+# How many entries per term (times the requested limit) are considered as candidates
+CANDIDATE_DEPTH = 10
+
+
+def normalize_token(token):
+    """Fold simple plurals so 'laptops' and 'laptop' share a posting list"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, split on non-alphanumerics and normalize each token"""
+    if not text:
+        return []
+    return [normalize_token(t) for t in TOKEN_RE.findall(str(text).lower())]
+
+
+def _product_fields(product):
+    """Return the searchable text of a Product (or product dict) per field"""
+    if not isinstance(product, dict):
+        product = product.to_dict()
+    specs = product.get("specs") or {}
+    spec_text = " ".join(str(v) for v in specs.values()) if isinstance(specs, dict) else str(specs)
+    return {
+        "name": product.get("name"),
+        "category": product.get("category"),
+        "description": product.get("description"),
+        "specs": spec_text,
+    }
+
+
+def _vocabulary_terms(product):
+    """(kind, label) pairs a product contributes to the catalog vocabulary"""
+    if not isinstance(product, dict):
+        product = product.to_dict()
+    specs = product.get("specs") or {}
+    brand = specs.get("brand") if isinstance(specs, dict) else None
+    if not brand and product.get("name"):
+        # Catalog names lead with the brand, e.g. "Bose Headphones Model 1"
+        brand = str(product["name"]).split()[0]
+    terms = []
+    if brand:
+        terms.append(("brand", str(brand).strip().lower()))
+    if product.get("category"):
+        terms.append(("category", str(product["category"]).strip().lower()))
+    return terms
+
+
+class CatalogVocabulary:
+    """Brand and category terms found in the catalog, with the products carrying each.
+
+    Terms are stored normalized like search tokens (so "headphones" matches
+    "headphone") in a dict for exact lookups and a sorted list for prefix
+    lookups, and are maintained incrementally as products are added or removed.
+    """
+
+    KINDS = ("brand", "category")
+    PREFIX_MIN_LENGTH = 4
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = 0
+        self._reset()
+
+    def _reset(self):
+        self._products = {}      # (kind, term) -> {product_id}
+        self._labels = {}        # (kind, term) -> label as written in the catalog
+        self._sorted = []        # sorted (term, kind) pairs for prefix lookups
+        self._product_terms = {}
+        self._match_cache = None
+        self.max_words = 1
+
+    @classmethod
+    def from_terms(cls, brands=(), categories=()):
+        """Vocabulary from fixed term lists, used when no catalog is available"""
+        vocabulary = cls()
+        for kind, labels in (("brand", brands), ("category", categories)):
+            for label in labels:
+                vocabulary._add_term(kind, label, None)
+        vocabulary.version += 1
+        return vocabulary
+
+    def build(self, products):
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(product)
+            self.version += 1
+
+    def add(self, product):
+        with self._lock:
+            self._add(product)
+            self.version += 1
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+            self.version += 1
+
+    def _add(self, product):
+        product_id = product["id"] if isinstance(product, dict) else product.id
+        self._remove(product_id)
+        terms = _vocabulary_terms(product)
+        for kind, label in terms:
+            self._add_term(kind, label, product_id)
+        self._product_terms[product_id] = terms
+
+    def _add_term(self, kind, label, product_id):
+        term = " ".join(tokenize(label))
+        if not term:
+            return
+        key = (kind, term)
+        if key not in self._products:
+            self._products[key] = set()
+            self._labels[key] = label
+            bisect.insort(self._sorted, (term, kind))
+            self.max_words = max(self.max_words, term.count(" ") + 1)
+        if product_id is not None:
+            self._products[key].add(product_id)
+
+    def _remove(self, product_id):
+        for kind, label in self._product_terms.pop(product_id, ()):
+            key = (kind, " ".join(tokenize(label)))
+            products = self._products.get(key)
+            if products is None:
+                continue
+            products.discard(product_id)
+            if not products:
+                del self._products[key]
+                del self._labels[key]
+                index = bisect.bisect_left(self._sorted, (key[1], kind))
+                if index < len(self._sorted) and self._sorted[index] == (key[1], kind):
+                    del self._sorted[index]
+
+    def labels(self, kind):
+        """Every label of a kind, e.g. all brands in the catalog"""
+        with self._lock:
+            return sorted(label for (k, _), label in self._labels.items() if k == kind)
+
+    def lookup(self, kind, term):
+        """Label for an exact (normalized) term, or None"""
+        return self._labels.get((kind, term))
+
+    def prefix(self, prefix, kind=None, limit=10):
+        """Labels of terms starting with `prefix`, in term order"""
+        with self._lock:
+            index = bisect.bisect_left(self._sorted, (prefix,))
+            found = []
+            while index < len(self._sorted) and len(found) < limit:
+                term, term_kind = self._sorted[index]
+                if not term.startswith(prefix):
+                    break
+                if kind is None or term_kind == kind:
+                    found.append((term_kind, self._labels[(term_kind, term)]))
+                index += 1
+            return found
+
+    def product_ids(self, kind, labels):
+        """Ids of the products carrying any of the given labels"""
+        ids = set()
+        with self._lock:
+            for label in labels:
+                ids |= self._products.get((kind, " ".join(tokenize(label))), set())
+        return ids
+
+    def lookup_map(self):
+        """term or unambiguous prefix -> [(kind, label)], rebuilt after changes.
+
+        Keys are normalized like search tokens, multi-word terms joined by
+        single spaces; prefixes are at least PREFIX_MIN_LENGTH characters.
+        """
+        cached = self._match_cache
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        with self._lock:
+            lookup = {}
+            prefixes = {}
+            for (kind, term), label in self._labels.items():
+                lookup.setdefault(term, []).append((kind, label))
+                if " " not in term:
+                    for end in range(self.PREFIX_MIN_LENGTH, len(term)):
+                        prefixes.setdefault(term[:end], set()).add((kind, label))
+            for prefix, entries in prefixes.items():
+                if len(entries) == 1 and prefix not in lookup:
+                    lookup[prefix] = list(entries)
+            self._match_cache = (self.version, lookup)
+        return lookup
+
+
+class ProductSearchIndex:
+    """In-memory inverted index over the product catalog with BM25 ranking.
+
+    Each field keeps its own posting lists (term -> {product_id: term frequency})
+    so searches can be restricted to e.g. product names, and scores are summed
+    across fields using FIELD_WEIGHTS.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, impact_cache_size=4096):
+        self.k1 = k1
+        self.b = b
+        self.impact_cache_size = impact_cache_size
+        self.vocabulary = CatalogVocabulary()
+        # Optional ProductVectorIndex kept in step with the keyword index
+        self.vectors = None
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+
+    def _reset(self):
+        self._postings = {field: defaultdict(dict) for field in FIELD_WEIGHTS}
+        self._doc_lengths = {field: {} for field in FIELD_WEIGHTS}
+        self._total_lengths = {field: 0 for field in FIELD_WEIGHTS}
+        self._doc_terms = {}
+        # (field, term) -> impact-ordered product ids, least recently searched first
+        self._impact_cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def build(self, products):
+        """Rebuild the whole index from an iterable of products"""
+        with self._lock:
+            self._reset()
+            products = list(products)
+            for product in products:
+                self._add(product)
+            self.vocabulary.build(products)
+            if self.vectors is not None:
+                self.vectors.build(products)
+            self.ready = True
+
+    def add(self, product):
+        """Add or replace a single product in the index"""
+        with self._lock:
+            self._add(product)
+            self.vocabulary.add(product)
+            if self.vectors is not None:
+                self.vectors.add(product)
+
+    def remove(self, product_id):
+        """Drop a product from the index if present"""
+        with self._lock:
+            self._remove(product_id)
+            self.vocabulary.remove(product_id)
+            if self.vectors is not None:
+                self.vectors.remove(product_id)
+
+    def _add(self, product):
+        fields = _product_fields(product)
+        product_id = product["id"] if isinstance(product, dict) else product.id
+        self._remove(product_id)
+
+        doc_terms = {}
+        for field, text in fields.items():
+            counts = Counter(tokenize(text))
+            if not counts:
+                continue
+            length = sum(counts.values())
+            self._doc_lengths[field][product_id] = length
+            self._total_lengths[field] += length
+            postings = self._postings[field]
+            for term, tf in counts.items():
+                postings[term][product_id] = tf
+                self._insert_impact(field, term, product_id)
+            doc_terms[field] = list(counts)
+        self._doc_terms[product_id] = doc_terms
+
+    def _remove(self, product_id):
+        doc_terms = self._doc_terms.pop(product_id, None)
+        if doc_terms is None:
+            return
+        for field, terms in doc_terms.items():
+            postings = self._postings[field]
+            for term in terms:
+                impacts = self._impact_cache.get((field, term))
+                if impacts is not None:
+                    impacts.remove(product_id)
+                docs = postings.get(term)
+                if docs is not None:
+                    docs.pop(product_id, None)
+                    if not docs:
+                        del postings[term]
+                        self._impact_cache.pop((field, term), None)
+            self._total_lengths[field] -= self._doc_lengths[field].pop(product_id, 0)
+
+    def _term_score(self, field, term, product_id, n_docs):
+        docs = self._postings[field].get(term)
+        tf = docs.get(product_id) if docs else None
+        if not tf:
+            return 0.0
+        lengths = self._doc_lengths[field]
+        avg_length = self._total_lengths[field] / len(lengths)
+        idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths[product_id] / avg_length)
+        return FIELD_WEIGHTS[field] * idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _insert_impact(self, field, term, product_id):
+        """Keep a cached impact list ordered when a product is added to its term"""
+        impacts = self._impact_cache.get((field, term))
+        if impacts is None:
+            return
+        n_docs = len(self._doc_terms) + 1
+        sort_key = lambda pid: (-self._term_score(field, term, pid, n_docs), pid)
+        bisect.insort(impacts, product_id, key=sort_key)
+
+    def _impacts(self, field, term, n_docs):
+        """Product ids in a posting list, best-scoring first.
+
+        Lists of the `impact_cache_size` most recently searched terms are
+        cached and kept ordered on incremental adds; the small idf drift from
+        later catalog changes is ignored until rebuild. Terms in no product
+        are not cached, so arbitrary query words can't fill the cache.
+        """
+        key = (field, term)
+        impacts = self._impact_cache.get(key)
+        if impacts is not None:
+            self._impact_cache.move_to_end(key)
+            return impacts
+        docs = self._postings[field].get(term)
+        if not docs:
+            return []
+        impacts = sorted(docs, key=lambda pid: (-self._term_score(field, term, pid, n_docs), pid))
+        self._impact_cache[key] = impacts
+        if len(self._impact_cache) > self.impact_cache_size:
+            self._impact_cache.popitem(last=False)
+        return impacts
+
+    def search(self, keywords, fields=None, limit=8, require_all=False, allowed=None):
+        """Return up to `limit` (product_id, score) pairs ranked by BM25.
+
+        Candidates are drawn from the head of each term's impact-ordered
+        posting list and then scored exactly, so common terms don't force a
+        walk over their whole posting list. With require_all=True every
+        keyword has to appear in at least one of the searched fields,
+        mirroring an AND of per-keyword matches. `allowed` restricts results
+        to a set of product ids, e.g. those of a brand.
+        """
+        fields = fields or tuple(FIELD_WEIGHTS)
+        terms = list(dict.fromkeys(t for kw in keywords for t in tokenize(kw)))
+        if not terms:
+            return []
+        if allowed is not None:
+            allowed = set(allowed)
+
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+
+            if require_all:
+                # Start from the rarest term and keep docs containing every other term
+                per_term = []
+                for term in terms:
+                    docs = set()
+                    for field in fields:
+                        docs.update(self._postings[field].get(term, ()))
+                    per_term.append(docs)
+                per_term.sort(key=len)
+                candidates = per_term[0].intersection(*per_term[1:])
+            else:
+                depth = max(limit * CANDIDATE_DEPTH, 50)
+                candidates = set()
+                if allowed is not None and len(allowed) <= depth:
+                    # A small filter is cheaper to score in full
+                    candidates = set(allowed)
+                else:
+                    for field in fields:
+                        for term in terms:
+                            candidates.update(self._impacts(field, term, n_docs)[:depth])
+            if allowed is not None:
+                candidates &= allowed
+                if len(candidates) < limit and not require_all:
+                    # The filter is authoritative; top up from it when the heads miss
+                    candidates.update(heapq.nsmallest(limit * CANDIDATE_DEPTH, allowed))
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for field in fields:
+                lengths = self._doc_lengths[field]
+                if not lengths:
+                    continue
+                avg_length = self._total_lengths[field] / len(lengths)
+                weight = FIELD_WEIGHTS[field]
+                for term in terms:
+                    docs = self._postings[field].get(term)
+                    if not docs:
+                        continue
+                    idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for pid in candidates:
+                        tf = docs.get(pid)
+                        if tf:
+                            norm = self.k1 * (1 - self.b + self.b * lengths[pid] / avg_length)
+                            scores[pid] += weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+product_index = ProductSearchIndex()
+
+
+def get_product_index():
+    """Return the shared product index, building it on first use.
+
+    The catalog snapshot is used as the source when enabled, so building the
+    index doesn't need another full product query.
+    """
+    if not product_index.ready:
+        from flask import current_app
+        from .catalog import get_catalog
+        if product_index.vectors is None and current_app.config.get("RETRIEVAL_MODE", "hybrid") != "keyword":
+            from .vector_index import create_vector_index
+            product_index.vectors = create_vector_index(current_app.config)
+        catalog = get_catalog()
+        if catalog is not None:
+            product_index.build(catalog.products)
+        else:
+            from app.models import Product
+            product_index.build(Product.query.all())
+    return product_index
+
+
+def get_vocabulary():
+    """Catalog vocabulary kept alongside the shared product index"""
+    return get_product_index().vocabulary
@@ -0,0 +1,318 @@
+import math
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from .search_index import TOKEN_RE, normalize_token, tokenize, _product_fields
+
+# Everyday words for catalog terms the product text never uses; applied to queries
+QUERY_ALIASES = {
+    "cans": "headphones",
+    "headset": "headphones",
+    "earphone": "headphones",
+    "earbud": "headphones",
+    "phone": "smartphone",
+    "mobile": "smartphone",
+    "cellphone": "smartphone",
+    "notebook": "laptop",
+    "watch": "smartwatch",
+    "wearable": "smartwatch",
+    "tv": "television",
+}
+
+# Rank constant for reciprocal rank fusion; larger values flatten the head of each list
+RRF_K = 60
+
+
+def _bucket(feature, dim):
+    """Stable hash bucket and sign of a feature (crc32, unlike hash(), is the same in every process)"""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashedTfidfEmbedder:
+    """Hashed bag of words and character trigrams, weighted by TF-IDF at query time.
+
+    Needs no model download or fitting: every feature is hashed into one of
+    `dim` signed buckets, and trigrams let "cancelling" meet "cancel". The
+    index derives idf from the bucket document frequencies when it is built.
+    """
+
+    weighted = True
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    @lru_cache(maxsize=65536)
+    def _token_features(self, token):
+        """Buckets and signed weights of one token's word and trigram features"""
+        features = [("w:" + token, 1.0)]
+        padded = f"<{token}>"
+        features += [("t:" + padded[i:i + 3], 0.3) for i in range(len(padded) - 2)]
+        buckets = np.empty(len(features), dtype=np.int64)
+        weights = np.empty(len(features), dtype=np.float32)
+        for i, (feature, weight) in enumerate(features):
+            buckets[i], sign = _bucket(feature, self.dim)
+            weights[i] = sign * weight
+        return buckets, weights
+
+    def embed(self, texts):
+        """Raw (unweighted) feature vectors, one row per text"""
+        buckets, weights, lengths = [], [], []
+        for text in texts:
+            length = 0
+            for token in tokenize(text):
+                token_buckets, token_weights = self._token_features(token)
+                buckets.append(token_buckets)
+                weights.append(token_weights)
+                length += len(token_buckets)
+            lengths.append(length)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if buckets:
+            rows = np.repeat(np.arange(len(texts)), lengths)
+            np.add.at(vectors.reshape(-1), rows * self.dim + np.concatenate(buckets), np.concatenate(weights))
+        # Sublinear term frequency
+        np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a locally installed sentence-transformers model"""
+
+    weighted = False
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        return self.model.encode(list(texts), batch_size=256, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def expand_query(text):
+    """Append catalog terms for everyday words, e.g. 'cans' -> 'headphones'"""
+    extra = []
+    for word in TOKEN_RE.findall(text.lower()):
+        # Checked before plural folding so "cans" doesn't become the verb "can"
+        alias = QUERY_ALIASES.get(word) or QUERY_ALIASES.get(normalize_token(word))
+        if alias:
+            extra.append(alias)
+    return f"{text} {' '.join(extra)}" if extra else text
+
+
+def _product_text(product):
+    fields = _product_fields(product)
+    # Name twice so it outweighs the boilerplate description
+    return " ".join(str(fields[f] or "") for f in ("name", "name", "category", "specs", "description"))
+
+
+def _product_attrs(product):
+    if not isinstance(product, dict):
+        product = product.to_dict()
+    price = product.get("price")
+    return (
+        product["id"],
+        math.nan if price is None else float(price),
+        product.get("stock") or 0,
+        str(product.get("category") or "").strip().lower(),
+    )
+
+
+class ProductVectorIndex:
+    """Product embeddings in a NumPy matrix, searched by matrix products and top-k.
+
+    Rows are stored unit-length (and, for hashed TF-IDF, idf-weighted), so a
+    query is scored against the whole catalog with one matrix product. Rows
+    are appended in place (the arrays grow by doubling) and removed rows are
+    masked out until enough of them pile up to compact, so catalog writes
+    update the index incrementally; the idf is fixed at build time and its
+    small drift from later writes is ignored until the next rebuild. Price,
+    stock and category sit in parallel arrays so filters become boolean
+    masks over all rows at once.
+    """
+
+    def __init__(self, embedder=None, batch_size=1024):
+        self.embedder = embedder or HashedTfidfEmbedder()
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self._reset(0)
+
+    def _reset(self, capacity):
+        dim = self.embedder.dim
+        capacity = max(capacity, 64)
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._price = np.full(capacity, np.nan, dtype=np.float32)
+        self._stock = np.zeros(capacity, dtype=np.int64)
+        self._category = np.full(capacity, -1, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._idf = np.ones(dim, dtype=np.float32) if self.embedder.weighted else None
+        self._rows = {}
+        self._categories = {}
+        self._size = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _category_code(self, category):
+        return self._categories.setdefault(category, len(self._categories))
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self._ids)
+        self._matrix = np.vstack([self._matrix, np.zeros((extra, self._matrix.shape[1]), dtype=np.float32)])
+        self._ids = np.concatenate([self._ids, np.zeros(extra, dtype=np.int64)])
+        self._price = np.concatenate([self._price, np.full(extra, np.nan, dtype=np.float32)])
+        self._stock = np.concatenate([self._stock, np.zeros(extra, dtype=np.int64)])
+        self._category = np.concatenate([self._category, np.full(extra, -1, dtype=np.int32)])
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+
+    def _normalize(self, vectors):
+        """Apply idf (hashed TF-IDF only) and scale rows to unit length, in place"""
+        if self._idf is not None:
+            vectors *= self._idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        vectors /= norms
+        return vectors
+
+    def _append(self, products, vectors):
+        start = self._size
+        self._grow(start + len(products))
+        self._matrix[start:start + len(products)] = vectors
+        for offset, product in enumerate(products):
+            product_id, price, stock, category = _product_attrs(product)
+            row = start + offset
+            self._ids[row] = product_id
+            self._price[row] = price
+            self._stock[row] = stock
+            self._category[row] = self._category_code(category)
+            self._alive[row] = True
+            self._rows[product_id] = row
+        self._size += len(products)
+
+    def _remove(self, product_id):
+        row = self._rows.pop(product_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    def build(self, products):
+        """Embed the whole catalog in batches"""
+        products = list(products)
+        with self._lock:
+            self._reset(len(products))
+            for start in range(0, len(products), self.batch_size):
+                batch = products[start:start + self.batch_size]
+                self._append(batch, self.embedder.embed([_product_text(p) for p in batch]))
+            rows = self._matrix[:self._size]
+            if self._idf is not None and self._size:
+                df = np.count_nonzero(rows, axis=0)
+                self._idf = (np.log((1 + self._size) / (1 + df)) + 1).astype(np.float32)
+            for start in range(0, self._size, self.batch_size):
+                self._normalize(rows[start:start + self.batch_size])
+
+    def add(self, product):
+        """Add or replace a single product"""
+        with self._lock:
+            product_id = product["id"] if isinstance(product, dict) else product.id
+            self._remove(product_id)
+            self._append([product], self._normalize(self.embedder.embed([_product_text(product)])))
+            self._maybe_compact()
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = self._size - len(self._rows)
+        if dead < 64 or dead * 2 < self._size:
+            return
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._matrix[:len(keep)] = self._matrix[keep]
+        for name in ("_ids", "_price", "_stock", "_category", "_alive"):
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        self._alive[len(keep):] = False
+        self._size = len(keep)
+        self._rows = {int(pid): row for row, pid in enumerate(self._ids[:self._size])}
+
+    def mask(self, allowed=None, min_price=None, max_price=None, categories=None, in_stock=False):
+        """Boolean mask over rows for the given filters"""
+        size = self._size
+        mask = self._alive[:size].copy()
+        if allowed is not None:
+            allowed_mask = np.zeros(size, dtype=bool)
+            rows = [self._rows[pid] for pid in allowed if pid in self._rows]
+            allowed_mask[rows] = True
+            mask &= allowed_mask
+        if min_price is not None:
+            mask &= self._price[:size] >= min_price
+        if max_price is not None:
+            mask &= self._price[:size] <= max_price
+        if categories:
+            codes = [self._categories[c.lower()] for c in categories if c.lower() in self._categories]
+            mask &= np.isin(self._category[:size], codes)
+        if in_stock:
+            mask &= self._stock[:size] > 0
+        return mask
+
+    def search_many(self, queries, limit=8, min_score=0.15, **filters):
+        """Top `limit` (product_id, cosine score) pairs for each query.
+
+        All queries are scored in one matrix product; rows failing the
+        filters (see `mask`) are then excluded before the top-k selection.
+        """
+        if not queries:
+            return []
+        with self._lock:
+            mask = self.mask(**filters)
+            candidates = int(mask.sum())
+            if not candidates:
+                return [[] for _ in queries]
+            query_vectors = self._normalize(self.embedder.embed([expand_query(q) for q in queries]))
+            scores = query_vectors @ self._matrix[:self._size].T
+            scores[:, ~mask] = -np.inf
+            ids = self._ids[:self._size].copy()
+
+        results = []
+        k = min(limit, candidates)
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top], kind="stable")]
+            results.append([(int(ids[i]), float(row[i])) for i in top if row[i] >= min_score])
+        return results
+
+    def search(self, query, limit=8, **filters):
+        return self.search_many([query], limit=limit, **filters)[0]
+
+
+def reciprocal_rank_fusion(*rankings, limit=8, k=RRF_K):
+    """Merge ranked id lists, scoring each id by the sum of 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, product_id in enumerate(ranking):
+            scores[product_id] = scores.get(product_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda pid: (-scores[pid], pid))[:limit]
+
+
+def create_vector_index(config):
+    """Vector index for the configured embedder; hashed TF-IDF unless VECTOR_MODEL names a local model"""
+    model_name = config.get("VECTOR_MODEL")
+    embedder = None
+    if model_name:
+        try:
+            embedder = SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Could not load embedding model {model_name!r}, using hashed TF-IDF: {e}")
+    if embedder is None:
+        embedder = HashedTfidfEmbedder(dim=config.get("VECTOR_DIM", 384))
+    return ProductVectorIndex(embedder)
@@ -2,6 +2,13 @@ import React, { useEffect, useState } from "react";
 import { useLocation } from "react-router-dom";
 import { sendMessage, getHistory, deleteChat, searchChatHistory } from "../services/chat";
 
+// Search snippets mark matches with <mark> tags; render them as elements, never as HTML
+function renderSnippet(snippet) {
+  return snippet.split(/<mark>(.*?)<\/mark>/g).map((part, i) =>
+    i % 2 === 1 ? <mark key={i}>{part}</mark> : part
+  );
+}
+
 export default function Chat() {
   const location = useLocation();
   const [messages, setMessages] = useState([]);
@@ -21,7 +28,7 @@ export default function Chat() {
 
   const loadHistory = async () => {
     try {
-      const data = await getHistory(1, 20);
+      const data = await getHistory({ limit: 20 });
       setHistory(data.chats || []);
     } catch (e) {
       console.error('Failed to load history:', e);
@@ -40,7 +47,7 @@ export default function Chat() {
       console.log('Searching for:', query);
       const data = await searchChatHistory(query);
       console.log('Search results:', data);
-      setSearchResults(data.chats || []);
+      setSearchResults(data.results || []);
     } catch (e) {
       console.error('Search failed:', e);
       setSearchResults([]);
@@ -79,8 +86,18 @@ export default function Chat() {
     setLoading(true);
     
     try {
-      const data = await sendMessage(userMessage);
-      setMessages(m => [...m, { role: "agent", text: data.reply }]);
+      // Stream the reply into a single agent message as tokens arrive
+      let started = false;
+      const data = await sendMessage(userMessage, {
+        onToken: (_, reply) => {
+          setLoading(false);
+          setMessages(m => started
+            ? [...m.slice(0, -1), { role: "agent", text: reply }]
+            : [...m, { role: "agent", text: reply }]);
+          started = true;
+        },
+      });
+      if (!started) setMessages(m => [...m, { role: "agent", text: data.reply }]);
       loadHistory(); // Refresh history
     } catch (e) {
       setMessages(m => [...m, { role: "agent", text: "Sorry, failed to get reply." }]);
@@ -237,7 +254,9 @@ export default function Chat() {
                   </div>
                   <div onClick={() => loadHistoryChat(chat)}>
                     <p className="text-sm font-medium truncate text-gray-900 dark:text-white">{chat.query}</p>
-                    <p className="text-xs text-gray-600 dark:text-gray-300 mt-1 line-clamp-2">{chat.response}</p>
+                    <p className="text-xs text-gray-600 dark:text-gray-300 mt-1 line-clamp-2">
+                      {chat.snippet ? renderSnippet(chat.snippet) : chat.response}
+                    </p>
                   </div>
                 </div>
               ))
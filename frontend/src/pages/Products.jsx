@@ -4,19 +4,28 @@ import ProductCard from "../components/ProductCard";
 
 export default function Products() {
   const [products, setProducts] = useState([]);
-  const [meta, setMeta] = useState({ page:1, total_pages:1 });
+  const [meta, setMeta] = useState({ total_pages: 1, next_cursor: null });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [currentPage, setCurrentPage] = useState(1);
+  // cursors[i] fetches page i + 1; the first page needs none
+  const [cursors, setCursors] = useState([null]);
 
   const fetchProducts = async (page) => {
     try {
       setLoading(true);
       setError(null);
-      const data = await getProducts(page, 20);
-      const { products: list, page: currentPage, total_pages } = data;
+      const data = await getProducts({ cursor: cursors[page - 1], per_page: 20 });
+      const { products: list, pages, next_cursor } = data;
       setProducts(list || []);
-      setMeta({ page: currentPage, total_pages });
+      setMeta({ total_pages: pages, next_cursor });
+      if (next_cursor) {
+        setCursors(prev => {
+          const next = prev.slice(0, page);
+          next[page] = next_cursor;
+          return next;
+        });
+      }
     } catch (e) {
       console.error('Error fetching products:', e);
       setError(e.message || 'Failed to fetch products');
@@ -56,8 +65,8 @@ export default function Products() {
                 Page {currentPage} of {meta.total_pages}
               </span>
               <button 
-                onClick={() => setCurrentPage(p => Math.min(meta.total_pages, p + 1))}
-                disabled={currentPage === meta.total_pages}
+                onClick={() => setCurrentPage(p => p + 1)}
+                disabled={!meta.next_cursor}
                 className="px-3 py-1 bg-blue-600 text-white rounded disabled:bg-gray-300"
               >
                 Next
@@ -1,12 +1,67 @@
 import api from "./api";
 
-export const sendMessage = async (message) => {
-  const res = await api.post("/chat", { message });
-  return res.data; // { reply, facts }
+// Parse one "event: x\ndata: {...}" block from the SSE stream
+const parseEvent = (block) => {
+  let event = "message";
+  let data = "";
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  }
+  return { event, data: data ? JSON.parse(data) : null };
 };
 
-export const getHistory = async (page = 1, per_page = 20) => {
-  const res = await api.get("/chat-history", { params: { page, per_page } });
+// Without handlers this posts to /chat and returns { reply, facts }.
+// With { onFacts, onToken } it consumes /chat/stream, calling the handlers
+// as events arrive, and resolves with the same { reply, facts } shape.
+export const sendMessage = async (message, { onFacts, onToken } = {}) => {
+  if (!onFacts && !onToken) {
+    const res = await api.post("/chat", { message });
+    return res.data; // { reply, facts }
+  }
+
+  const token = localStorage.getItem("token");
+  const res = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify({ message }),
+  });
+  if (!res.ok) throw new Error(`Chat stream failed with status ${res.status}`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let facts = {};
+  let reply = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const { event, data } = parseEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      if (event === "facts") {
+        facts = data;
+        onFacts?.(data);
+      } else if (event === "token") {
+        reply += data.text;
+        onToken?.(data.text, reply);
+      } else if (event === "done") {
+        reply = data.reply;
+      }
+    }
+  }
+  return { reply, facts };
+};
+
+export const getHistory = async ({ cursor, limit = 20 } = {}) => {
+  const res = await api.get("/chat-history", { params: { cursor, limit } });
   return res.data;
 };
 
@@ -20,7 +75,7 @@ export const clearAllChats = async () => {
   return res.data;
 };
 
-export const searchChatHistory = async (query, page = 1, per_page = 20) => {
-  const res = await api.get("/chat-history/search", { params: { query, page, per_page } });
+export const searchChatHistory = async (q, { cursor, limit = 20 } = {}) => {
+  const res = await api.get("/chat-history/search", { params: { q, cursor, limit } });
   return res.data;
 };
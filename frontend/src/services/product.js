@@ -1,7 +1,7 @@
 import api from "./api";
 
-export const getProducts = async (page = 1, per_page = 20) => {
-  const res = await api.get("/products", { params: { page, per_page } });
+export const getProducts = async ({ cursor, per_page = 20 } = {}) => {
+  const res = await api.get("/products", { params: { cursor, per_page } });
   return res.data;
 };
 